@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of the hot paths, each runnable as a script.
+"""
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare the two ways the BatchLoader workers can hand decoded batches back to the consumer: pickling the
+images through the pool's result queue, or writing them into the shared memory ring. A small set of random
+JPEG images is created in a temporary directory, so this doesn't need any downloaded data.
+
+Run from the project root:
+    python -m benchmarks.bench_batch_transfer -n 256 -s 1024
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+from modules.batch_loader import BatchLoader
+from modules.settings import ProjectSettings
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--n_images", default=256, type=int, help="Number of images in the test set.")
+    parser.add_argument("-s", "--image_size", default=1024, type=int, help="Width of the batch images.")
+    parser.add_argument("-b", "--batch_size", default=16, type=int, help="Images per batch.")
+    parser.add_argument("-w", "--n_workers", default=4, type=int, help="Number of decode workers.")
+    parser.add_argument("-e", "--epochs", default=3, type=int, help="Epochs to run for each mode.")
+    return parser.parse_args()
+
+
+def create_test_set(root: str, n_images: int, image_size: int):
+    """ Write a sample set of random JPEG images into the root directory, and point the settings at it. """
+    samples_directory = os.path.join(root, "samples")
+    image_directory = os.path.join(root, "storage", "sample_images", "set_0")
+    os.makedirs(samples_directory)
+    os.makedirs(image_directory)
+
+    # Smooth noise, so the JPEGs are a realistic size to decode.
+    random_state = np.random.RandomState(0)
+    height = image_size * 3 // 4
+    samples = []
+    for i in range(n_images):
+        noise = random_state.randint(0, 255, (height // 16, image_size // 16, 3), dtype=np.uint8)
+        image = cv2.resize(noise, (image_size, height), interpolation=cv2.INTER_CUBIC)
+        key = f"bench_{i}"
+        cv2.imwrite(os.path.join(image_directory, f"{key}.jpg"), image)
+        samples.append({"key": key, "remote_path": "", "detect_regions": []})
+
+    with open(os.path.join(samples_directory, "sample_set_0.json"), "w") as f:
+        json.dump({"set_index": 0, "samples": samples}, f)
+
+    settings_path = os.path.join(root, "settings.yaml")
+    with open(settings_path, "w") as f:
+        f.write(f"SAMPLES_DIRECTORY: \"{samples_directory}\"\n")
+        f.write(f"STORAGE_DIRECTORY: \"{os.path.join(root, 'storage')}\"\n")
+    ProjectSettings(settings_path)
+
+
+def run(shared_memory: bool, args) -> float:
+    """ Run the loader for a few epochs and return the best images/s. """
+    image_size = (args.image_size, args.image_size * 3 // 4)
+    batch_loader = BatchLoader([0], batch_size=args.batch_size, n_workers=args.n_workers,
+                               image_size=image_size, shared_memory=shared_memory)
+    best = 0.0
+    for _ in range(args.epochs):
+        for batch in batch_loader:
+            # Touch the pixels, like a real consumer would.
+            np.asarray(batch.images[0]).sum()
+        best = max(best, batch_loader.images_per_second)
+
+    batch_loader.close()
+    return best
+
+
+if __name__ == "__main__":
+
+    args = get_args()
+    Logger.log_special("Running Batch Transfer Benchmark", with_gap=True)
+
+    with tempfile.TemporaryDirectory() as root:
+        create_test_set(root, args.n_images, args.image_size)
+
+        pickled_speed = run(False, args)
+        shared_speed = run(True, args)
+
+    Logger.log_special("Results", with_gap=True)
+    Logger.log_field("Pickled", "{:.1f} images/s".format(pickled_speed))
+    Logger.log_field("Shared Memory", "{:.1f} images/s".format(shared_speed))
+    Logger.log_field("Speed-Up", "{:.2f}x".format(shared_speed / pickled_speed if pickled_speed > 0 else 0.0))
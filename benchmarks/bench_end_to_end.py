@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Run the whole pipeline on a synthetic dataset (see benchmarks/synthetic.py) and time each stage: CSV
+ingest and box association, sample set export, sample set loading, image download (from the local image
+server), visualization and analysis. For each stage, the time, throughput and peak memory so far are
+reported (for this process, and for the largest of its finished worker processes).
+
+The results can be saved as a baseline, and later runs compared against it: any stage that got slower
+by more than the tolerance is flagged as a regression, and the benchmark exits with an error.
+
+Run from the project root:
+    python -m benchmarks.bench_end_to_end -n 20000 --save_baseline
+    python -m benchmarks.bench_end_to_end -n 20000
+"""
+
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+from typing import Callable, Dict, Tuple
+
+from benchmarks import synthetic
+from modules.loader import Loader
+from modules.session import Session
+from tools.util import metrics
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Stages that changed by less than this many seconds are never flagged (too small to measure reliably).
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--n_images", default=10000, type=int, help="Number of images in the dataset.")
+    parser.add_argument("-c", "--n_classes", default=100, type=int, help="Number of classes.")
+    parser.add_argument("-s", "--set_size", default=2000, type=int, help="Samples per exported set.")
+    parser.add_argument("-w", "--n_workers", default=4, type=int, help="Worker processes/threads for each stage.")
+    parser.add_argument("-b", "--baseline", default=DEFAULT_BASELINE, type=str, help="The baseline file.")
+    parser.add_argument("--save_baseline", action="store_true", help="Save these results as the baseline.")
+    parser.add_argument("-t", "--tolerance", default=0.25, type=float,
+                        help="How much slower (as a fraction) a stage can get before it is a regression.")
+    return parser.parse_args()
+
+
+def get_peak_memory_mb() -> Tuple[float, float]:
+    """ The peak resident memory of this process, and of the largest of its finished children (Linux
+    reports KB). The children aren't summed: the OS only keeps the peak of the largest one. """
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    largest_child = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, largest_child / 1024
+
+
+def time_stage(results: Dict[str, dict], name: str, function: Callable[[], int]):
+    """ Run the stage function (which returns the number of items it processed) and record the result. """
+    Logger.log_special(f"Stage: {name}", with_gap=True)
+    start = time.perf_counter()
+    n_items = function()
+    seconds = time.perf_counter() - start
+    peak_memory_mb, peak_child_memory_mb = get_peak_memory_mb()
+    results[name] = {
+        "seconds": seconds,
+        "items": n_items,
+        "per_second": n_items / seconds if seconds > 0 else 0.0,
+        "peak_memory_mb": peak_memory_mb,
+        "peak_child_memory_mb": peak_child_memory_mb,
+    }
+
+
+def compare_to_baseline(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> int:
+    """ Log the change of each stage against the baseline, and return the number of regressions. """
+    n_regressions = 0
+    Logger.log_special("Compared to Baseline", with_gap=True)
+    for name, result in results.items():
+        if name not in baseline:
+            Logger.log_field(name, "(not in the baseline)")
+            continue
+
+        old_seconds = baseline[name]["seconds"]
+        ratio = result["seconds"] / old_seconds if old_seconds > 0 else 1.0
+        message = "{:.3f}s -> {:.3f}s ({:+.1f}%)".format(old_seconds, result["seconds"], 100 * (ratio - 1.0))
+        if ratio > 1.0 + tolerance and result["seconds"] - old_seconds > MIN_REGRESSION_SECONDS:
+            n_regressions += 1
+            Logger.log_field_red(f"{name} REGRESSION", message)
+        else:
+            Logger.log_field(name, message)
+    return n_regressions
+
+
+if __name__ == "__main__":
+
+    args = get_args()
+    Logger.log_special("Running End to End Benchmark", with_gap=True)
+
+    with tempfile.TemporaryDirectory() as root:
+
+        # Create the dataset, and point the project at it.
+        server, base_url = synthetic.start_image_server(synthetic.create_images())
+        n_boxes = synthetic.write_dataset(root, base_url, args.n_images, args.n_classes)
+        session = Session(synthetic.write_settings(root))
+        settings = session.settings
+        os.makedirs(settings.SAMPLES_DIRECTORY)
+
+        # The commands are imported here, as their scripts expect the project root to be importable.
+        import cmd_load_sample_images
+        import cmd_sample_analysis
+        import cmd_visualize_samples
+
+        loader = Loader()
+        state = {}
+        results = {}
+
+        def ingest():
+            state["samples"] = loader.create_samples(settings.IMAGE_URL_FILE)
+            loader.associate_boxes_with_samples(state["samples"], settings.GROUND_TRUTH_FILE)
+            return n_boxes
+
+        def export():
+            # Count the samples that were actually written to the sets.
+            counters = metrics.Metrics.instance().counters
+            n_written = counters.get("loader.samples_written", 0)
+            loader.export_samples(state["samples"], path=settings.SAMPLES_DIRECTORY, size=args.set_size)
+            return counters.get("loader.samples_written", 0) - n_written
+
+        def load_sets():
+            n_samples = 0
+            for file_name in os.listdir(settings.SAMPLES_DIRECTORY):
+                n_samples += len(Loader.load_sample_set_from_file(os.path.join(settings.SAMPLES_DIRECTORY, file_name)))
+            return n_samples
+
+        def download():
+            cmd_load_sample_images.run(cmd_load_sample_images.get_args(["-i", "0", "-m", str(4 * args.n_workers)]))
+            return len(session.load_sample_set(0))
+
+        def visualize():
+            cmd_visualize_samples.run(cmd_visualize_samples.get_args(
+                ["-i", "0", "-n", "0", "-f", "-w", str(args.n_workers)]))
+            return len(session.load_sample_set(0))
+
+        def analyze():
+            cmd_sample_analysis.run(cmd_sample_analysis.get_args([]))
+            return state["n_exported"]
+
+        time_stage(results, "ingest", ingest)
+        time_stage(results, "export", export)
+        time_stage(results, "load_sets", load_sets)
+        state["n_exported"] = results["load_sets"]["items"]
+        time_stage(results, "download", download)
+        time_stage(results, "visualize", visualize)
+        time_stage(results, "analyze", analyze)
+        server.shutdown()
+
+    Logger.log_special("Results", with_gap=True)
+    Logger.log_field("Dataset", f"{args.n_images} images, {n_boxes} boxes, {args.n_classes} classes")
+    for name, result in results.items():
+        Logger.log_field(name, "{:.3f}s, {} items, {:.1f} items/s, {:.0f} MB peak, {:.0f} MB largest worker".format(
+            result["seconds"], result["items"], result["per_second"], result["peak_memory_mb"],
+            result["peak_child_memory_mb"]))
+
+    n_regressions = 0
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"n_images": args.n_images, "n_classes": args.n_classes, "stages": results}, f, indent=2)
+        Logger.log_field("Baseline Saved", args.baseline)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline["n_images"] != args.n_images or baseline["n_classes"] != args.n_classes:
+            Logger.log_field_red("Baseline", "It was made with a different dataset size, so it can't be compared.")
+        else:
+            n_regressions = compare_to_baseline(results, baseline["stages"], args.tolerance)
+
+    if n_regressions > 0:
+        Logger.log_field_red("Regressions", n_regressions)
+        raise SystemExit(1)
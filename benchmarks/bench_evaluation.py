@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare evaluation.evaluate with a straightforward implementation of the challenge metric that matches
+one detection at a time, with its own overlap and AP code, on random ground truth (with group-of boxes)
+and noisy predictions. The class APs are checked to be the same, and the vectorized version is timed with
+one and with several workers.
+
+Run from the project root:
+    python -m benchmarks.bench_evaluation -n 20000 -c 500 -w 8
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from modules import evaluation
+from modules.detect_region import (BOX_BOTTOM, BOX_CLASS, BOX_COLUMNS, BOX_CONFIDENCE, BOX_IS_GROUP_OF, BOX_LEFT,
+                                   BOX_RIGHT, BOX_TOP)
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--n_images", default=5000, type=int, help="Number of images.")
+    parser.add_argument("-c", "--n_classes", default=100, type=int, help="Number of classes.")
+    parser.add_argument("-b", "--boxes_per_image", default=8.0, type=float, help="Average boxes per image.")
+    parser.add_argument("-w", "--n_workers", default=4, type=int, help="Number of worker processes.")
+    return parser.parse_args()
+
+
+def create_boxes(random_state: np.random.RandomState, n: int, n_classes: int) -> np.array:
+    boxes = np.zeros((n, BOX_COLUMNS), dtype=np.float32)
+    corners = random_state.uniform(0.0, 1.0, (n, 2, 2))
+    boxes[:, [BOX_LEFT, BOX_RIGHT]] = np.sort(corners[:, 0], axis=1)
+    boxes[:, [BOX_TOP, BOX_BOTTOM]] = np.sort(corners[:, 1], axis=1)
+    boxes[:, BOX_CLASS] = random_state.randint(0, n_classes, n)
+    boxes[:, BOX_CONFIDENCE] = 1.0
+    return boxes
+
+
+def create_dataset(n_images: int, n_classes: int, boxes_per_image: float, seed: int = 0):
+    """ Ground truth boxes (10% of them group-of) and predictions: jittered copies of most boxes (some
+    of them duplicated), plus some random false positives. """
+    random_state = np.random.RandomState(seed)
+    ground_truth = {}
+    predictions = {}
+    for i in range(n_images):
+        gt = create_boxes(random_state, random_state.poisson(boxes_per_image), n_classes)
+        gt[:, BOX_IS_GROUP_OF] = random_state.uniform(0.0, 1.0, len(gt)) < 0.1
+
+        copies = gt[random_state.uniform(0.0, 1.0, len(gt)) < 0.8]
+        copies = np.concatenate([copies, copies[random_state.uniform(0.0, 1.0, len(copies)) < 0.3]])
+        copies[:, :4] += random_state.normal(0.0, 0.03, (len(copies), 4))
+        noise = create_boxes(random_state, random_state.poisson(boxes_per_image / 2), n_classes)
+        pred = np.concatenate([copies, noise])
+        pred[:, BOX_CONFIDENCE] = random_state.uniform(0.0, 1.0, len(pred))
+        pred[:, BOX_IS_GROUP_OF] = 0
+
+        ground_truth[f"{i:016x}"] = gt
+        predictions[f"{i:016x}"] = pred
+    return ground_truth, predictions
+
+
+def reference_iou(box: np.array, other: np.array) -> float:
+    """ The intersection over union of two (left, top, right, bottom) boxes. """
+    intersection = reference_intersection(box, other)
+    union = reference_area(box) + reference_area(other) - intersection
+    return intersection / union if union > 0.0 else 0.0
+
+
+def reference_ioa(box: np.array, other: np.array) -> float:
+    """ The intersection of two boxes, over the area of the first one. """
+    area = reference_area(box)
+    return reference_intersection(box, other) / area if area > 0.0 else 0.0
+
+
+def reference_intersection(box: np.array, other: np.array) -> float:
+    width = min(float(box[2]), float(other[2])) - max(float(box[0]), float(other[0]))
+    height = min(float(box[3]), float(other[3])) - max(float(box[1]), float(other[1]))
+    return max(width, 0.0) * max(height, 0.0)
+
+
+def reference_area(box: np.array) -> float:
+    return (float(box[2]) - float(box[0])) * (float(box[3]) - float(box[1]))
+
+
+def reference_average_precision(labels: List[bool], n_positives: int) -> float:
+    """ The area under the precision/recall curve, with the precision made monotonic from the right. """
+    if n_positives == 0:
+        return float("nan")
+
+    precision = [0.0]
+    recall = [0.0]
+    n_true_positives = 0
+    for i, label in enumerate(labels):
+        n_true_positives += int(label)
+        precision.append(n_true_positives / (i + 1))
+        recall.append(n_true_positives / n_positives)
+    precision.append(0.0)
+    recall.append(1.0)
+
+    for i in range(len(precision) - 2, -1, -1):
+        precision[i] = max(precision[i], precision[i + 1])
+
+    return sum((recall[i] - recall[i - 1]) * precision[i] for i in range(1, len(recall)) if recall[i] != recall[i - 1])
+
+
+def reference_match_class(detections: np.array, ground_truth: np.array, iou_threshold: float):
+    """ Match the detections (sorted by confidence) one at a time. """
+    is_group_of = ground_truth[:, BOX_IS_GROUP_OF] > 0
+    regular = ground_truth[~is_group_of]
+    groups = ground_truth[is_group_of]
+    is_true_positive = [False] * len(detections)
+    is_box_detected = [False] * len(regular)
+    group_scores: Dict[int, float] = {}
+    counted_scores: List[float] = []
+    counted_labels: List[bool] = []
+
+    for i, detection in enumerate(detections):
+        if len(regular) > 0:
+            iou = [reference_iou(detection[:4], box[:4]) for box in regular]
+            best = int(np.argmax(iou))
+            if iou[best] >= iou_threshold and not is_box_detected[best]:
+                is_box_detected[best] = True
+                is_true_positive[i] = True
+
+    for i, detection in enumerate(detections):
+        if not is_true_positive[i] and len(groups) > 0:
+            ioa = [reference_ioa(detection[:4], box[:4]) for box in groups]
+            best = int(np.argmax(ioa))
+            if ioa[best] >= iou_threshold:
+                group_scores[best] = max(group_scores.get(best, 0.0), float(detection[BOX_CONFIDENCE]))
+                continue
+        counted_scores.append(float(detection[BOX_CONFIDENCE]))
+        counted_labels.append(is_true_positive[i])
+
+    return counted_scores + list(group_scores.values()), counted_labels + [True] * len(group_scores)
+
+
+def reference_evaluate(ground_truth: Dict[str, np.array], predictions: Dict[str, np.array], n_classes: int,
+                       iou_threshold: float = evaluation.IOU_THRESHOLD) -> np.array:
+    scored = [([], []) for _ in range(n_classes)]
+    n_positives = np.zeros(n_classes, dtype=np.int64)
+    for key, gt in ground_truth.items():
+        for class_code in gt[:, BOX_CLASS].astype(np.int64):
+            n_positives[class_code] += 1
+        pred = predictions[key]
+        for class_code in np.unique(pred[:, BOX_CLASS].astype(np.int64)):
+            detections = pred[pred[:, BOX_CLASS] == class_code]
+            detections = detections[np.argsort(-detections[:, BOX_CONFIDENCE], kind="stable")]
+            scores, labels = reference_match_class(detections, gt[gt[:, BOX_CLASS] == class_code], iou_threshold)
+            scored[class_code][0].extend(scores)
+            scored[class_code][1].extend(labels)
+
+    aps = []
+    for c in range(n_classes):
+        scores, labels = np.array(scored[c][0]), np.array(scored[c][1], dtype=bool)
+        labels = labels[np.argsort(-scores, kind="stable")]
+        aps.append(reference_average_precision(list(labels), int(n_positives[c])))
+    return np.array(aps)
+
+
+if __name__ == "__main__":
+
+    args = get_args()
+    Logger.log_special("Running Evaluation Benchmark", with_gap=True)
+    ground_truth, predictions = create_dataset(args.n_images, args.n_classes, args.boxes_per_image)
+    Logger.log_field("Images", args.n_images)
+    Logger.log_field("Ground Truth Boxes", sum(len(gt) for gt in ground_truth.values()))
+    Logger.log_field("Predictions", sum(len(p) for p in predictions.values()))
+
+    start = time.perf_counter()
+    expected = reference_evaluate(ground_truth, predictions, args.n_classes)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single_aps, _ = evaluation.evaluate(ground_truth, predictions, args.n_classes, n_workers=1)
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel_aps, _ = evaluation.evaluate(ground_truth, predictions, args.n_classes, n_workers=args.n_workers)
+    parallel_time = time.perf_counter() - start
+
+    # Check that the class APs are the same.
+    assert np.allclose(expected, single_aps, equal_nan=True)
+    assert np.allclose(expected, parallel_aps, equal_nan=True)
+
+    Logger.log_special("Results", with_gap=True)
+    Logger.log_field("mAP", "{:.4f}".format(evaluation.get_mean_ap(parallel_aps)))
+    for name, seconds in [("Reference", reference_time), ("Vectorized", single_time),
+                          (f"Vectorized ({args.n_workers} Workers)", parallel_time)]:
+        Logger.log_field(name, "{:.2f}s ({:.1f}x)".format(seconds, reference_time / seconds))
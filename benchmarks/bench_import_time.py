@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measure how long it takes to import the modules that the commands start with, each in a fresh interpreter
+(so nothing is cached), and check which of the heavy libraries they pull in. Short jobs pay this on every
+launch, so cv2, PIL and matplotlib should only be loaded by the code that actually uses them.
+
+Run from the project root:
+    python -m benchmarks.bench_import_time -t 10
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+MODULES = [
+    "modules.settings",
+    "modules.detect_region",
+    "modules.sample",
+    "modules.loader",
+    "modules.render",
+]
+
+HEAVY_MODULES = ["numpy", "cv2", "PIL", "matplotlib", "tools.util.visual", "tools.util.text"]
+
+# Print the import time (in microseconds) and the heavy modules that were loaded.
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(int(elapsed * 1e6), ",".join(heavy))
+"""
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--trials", default=10, type=int, help="Fresh interpreters per module.")
+    return parser.parse_args()
+
+
+def measure(module: str, trials: int) -> Tuple[float, List[str]]:
+    """ The median import time in ms, and the heavy modules that were loaded. """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    times = []
+    heavy = []
+    for _ in range(trials):
+        output = subprocess.check_output([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                         cwd=root, text=True)
+        microseconds, loaded = output.strip().split(" ") if " " in output.strip() else (output.strip(), "")
+        times.append(int(microseconds) / 1000)
+        heavy = [m for m in loaded.split(",") if m]
+    times.sort()
+    return times[len(times) // 2], heavy
+
+
+if __name__ == "__main__":
+
+    args = get_args()
+    Logger.log_special("Running Import Time Benchmark", with_gap=True)
+
+    for module in MODULES:
+        median_ms, heavy = measure(module, args.trials)
+        Logger.log_field(module, "{:.1f} ms  [{}]".format(median_ms, ", ".join(heavy)))
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Generate a synthetic Open Images style dataset, for benchmarks and tests that can't use the real files.
+The labels, image URL and bounding box CSVs have the same columns as the challenge files (as read by
+Loader), at any scale, and the classes follow a Zipf distribution like the real ones (a few classes
+have most of the boxes). The image URLs point to a local HTTP server, which serves a small pool of
+tiny JPEGs in place of the real images.
+
+Run from the project root, to write a dataset and serve its images until interrupted:
+    python -m benchmarks.synthetic -o /tmp/synthetic -n 20000 -c 500 --serve
+"""
+
+import argparse
+import os
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import numpy as np
+
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+LABELS_FILE = "class-descriptions.csv"
+IMAGE_URL_FILE = "images-boxable.csv"
+GROUND_TRUTH_FILE = "annotations-bbox.csv"
+
+# Headers of the challenge files (the labels file has none).
+IMAGE_URL_HEADER = ["image_name", "image_url"]
+GROUND_TRUTH_HEADER = ["ImageID", "Source", "LabelName", "Confidence", "XMin", "XMax", "YMin", "YMax",
+                      "IsOccluded", "IsTruncated", "IsGroupOf", "IsDepiction", "IsInside"]
+
+
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", required=True, type=str, help="Directory to write the dataset into.")
+    parser.add_argument("-n", "--n_images", default=10000, type=int, help="Number of images.")
+    parser.add_argument("-c", "--n_classes", default=100, type=int, help="Number of classes.")
+    parser.add_argument("-b", "--boxes_per_image", default=4.0, type=float, help="Average boxes per image.")
+    parser.add_argument("-k", "--class_skew", default=1.0, type=float,
+                        help="Zipf exponent of the class frequencies (0 for uniform).")
+    parser.add_argument("-p", "--port", default=0, type=int, help="Port of the image server (0 for any free one).")
+    parser.add_argument("--serve", action="store_true", help="Keep serving the images until interrupted.")
+    return parser.parse_args()
+
+
+# ===================================================================================================
+# Dataset Files.
+# ===================================================================================================
+
+
+def get_class_ids(n_classes: int) -> List[str]:
+    return [f"/m/synthetic_{i}" for i in range(n_classes)]
+
+
+def get_class_weights(n_classes: int, class_skew: float) -> np.array:
+    """ Zipf weights: class k is drawn in proportion to 1 / (k + 1)^skew. """
+    weights = 1.0 / np.power(np.arange(1, n_classes + 1, dtype=np.float64), class_skew)
+    return weights / weights.sum()
+
+
+def write_dataset(root: str, base_url: str, n_images: int, n_classes: int, boxes_per_image: float = 4.0,
+                  class_skew: float = 1.0, seed: int = 0):
+    """ Write the three CSV files into the root directory. The image URLs start with the base URL. """
+    os.makedirs(root, exist_ok=True)
+    random_state = np.random.RandomState(seed)
+    class_ids = get_class_ids(n_classes)
+
+    with open(os.path.join(root, LABELS_FILE), "w") as f:
+        f.writelines(f"{class_id},Synthetic Class {i}\n" for i, class_id in enumerate(class_ids))
+
+    image_ids = [f"{i:016x}" for i in range(n_images)]
+    with open(os.path.join(root, IMAGE_URL_FILE), "w") as f:
+        f.write(",".join(IMAGE_URL_HEADER) + "\n")
+        f.writelines(f"{image_id}.jpg,{base_url}/{image_id}.jpg\n" for image_id in image_ids)
+
+    # Draw all the boxes at once: the image, class and corners of each box.
+    n_boxes_per_image = random_state.poisson(boxes_per_image, n_images)
+    box_images = np.repeat(np.arange(n_images), n_boxes_per_image)
+    n_boxes = len(box_images)
+    box_classes = random_state.choice(n_classes, n_boxes, p=get_class_weights(n_classes, class_skew))
+    x = np.sort(random_state.uniform(0.0, 1.0, (n_boxes, 2)), axis=1)
+    y = np.sort(random_state.uniform(0.0, 1.0, (n_boxes, 2)), axis=1)
+    flags = (random_state.uniform(0.0, 1.0, (n_boxes, 5)) < [0.5, 0.3, 0.05, 0.05, 0.02]).astype(np.int64)
+
+    with open(os.path.join(root, GROUND_TRUTH_FILE), "w") as f:
+        f.write(",".join(GROUND_TRUTH_HEADER) + "\n")
+        for i in range(n_boxes):
+            f.write("{},xclick,{},1,{:.6f},{:.6f},{:.6f},{:.6f},{},{},{},{},{}\n".format(
+                image_ids[box_images[i]], class_ids[box_classes[i]], x[i, 0], x[i, 1], y[i, 0], y[i, 1],
+                *flags[i]))
+
+    return n_boxes
+
+
+def write_settings(root: str, extra_lines: List[str] = None) -> str:
+    """ Write a settings file that points the project at the dataset in the root directory. """
+    path = os.path.join(root, "settings.yaml")
+    with open(path, "w") as f:
+        f.write(f"LABELS_FILE: \"{os.path.join(root, LABELS_FILE)}\"\n")
+        f.write(f"GROUND_TRUTH_FILE: \"{os.path.join(root, GROUND_TRUTH_FILE)}\"\n")
+        f.write(f"IMAGE_URL_FILE: \"{os.path.join(root, IMAGE_URL_FILE)}\"\n")
+        f.write(f"OUTPUT_DIRECTORY: \"{os.path.join(root, 'output')}\"\n")
+        f.write(f"SAMPLES_DIRECTORY: \"{os.path.join(root, 'samples')}\"\n")
+        f.write(f"STORAGE_DIRECTORY: \"{os.path.join(root, 'storage')}\"\n")
+        for line in extra_lines or []:
+            f.write(line + "\n")
+    return path
+
+
+# ===================================================================================================
+# Image Server.
+# ===================================================================================================
+
+
+def create_images(n_images: int = 16, width: int = 96, height: int = 72, seed: int = 0) -> List[bytes]:
+    """ A pool of tiny, distinct JPEG images. """
+    import cv2
+    random_state = np.random.RandomState(seed)
+    images = []
+    for _ in range(n_images):
+        noise = random_state.randint(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+        image = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+        images.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes())
+    return images
+
+
+def start_image_server(images: List[bytes], port: int = 0) -> (ThreadingHTTPServer, str):
+    """ Serve the images on a background thread. Any path gets one of the images (picked by a hash of
+    the path, so the same URL always gets the same image). Returns the server and its base URL. """
+
+    class ImageHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            data = images[zlib.crc32(self.path.encode("utf-8")) % len(images)]
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), ImageHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/images"
+
+
+if __name__ == "__main__":
+
+    args = get_args()
+    Logger.log_special("Running Synthetic Dataset Generator", with_gap=True)
+
+    server, base_url = start_image_server(create_images(), args.port)
+    root = os.path.abspath(args.output)
+    n_boxes = write_dataset(root, base_url, args.n_images, args.n_classes, args.boxes_per_image, args.class_skew)
+    settings_path = write_settings(root)
+
+    Logger.log_field("Images", args.n_images)
+    Logger.log_field("Boxes", n_boxes)
+    Logger.log_field("Classes", args.n_classes)
+    Logger.log_field("Settings File", settings_path)
+    Logger.log_field("Image Server", base_url)
+
+    if args.serve:
+        Logger.log_header("Serving Images (Ctrl+C to stop)", with_gap=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+    server.shutdown()
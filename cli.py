@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+A single entry point for all the cmd_* scripts, as subcommands:
+
+    python cli.py visualize -r 0:10 -q person
+    python cli.py -s other-settings.yaml read_sizes -i 3
+
+The batch command runs a sequence of jobs (one command line per line) in this one process, so the
+settings, labels, sample sets and caches are only loaded once and then reused by every job. Jobs are
+read from a file, or from stdin as they arrive, so it can also be kept running as a worker:
+
+    python cli.py batch -f jobs.txt
+    some_scheduler | python cli.py batch
+"""
+
+import argparse
+import importlib
+import shlex
+import sys
+import time
+from typing import List
+
+from modules import profiling
+from modules.session import Session
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+# Subcommand name: the script that implements it (with get_args(argv) and run(args) functions).
+COMMANDS = {
+    "create": "cmd_create_samples",
+    "load": "cmd_load_sample_images",
+    "read_sizes": "cmd_read_image_sizes",
+    "transcode": "cmd_transcode_sample_images",
+    "pack": "cmd_pack_sample_images",
+    "extract_crops": "cmd_extract_crops",
+    "visualize": "cmd_visualize_samples",
+    "analyze": "cmd_sample_analysis",
+    "evaluate": "cmd_evaluate_predictions",
+    "ingest": "cmd_ingest_predictions",
+}
+
+BATCH_COMMAND = "batch"
+
+
+def get_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Run one of the commands, or a batch of them.")
+    parser.add_argument("-s", "--settings", default="settings.yaml", type=str, help="The settings file to use.")
+    parser.add_argument("-j", "--log_json", default=None, type=str,
+                        help="Log JSON records (one per line) to this file instead (- for stdout).")
+    parser.add_argument("-b", "--buffer_logs", default=0.0, type=float,
+                        help="Write the log output at most once per this many seconds.")
+    parser.add_argument("command", choices=list(COMMANDS.keys()) + [BATCH_COMMAND], help="The command to run.")
+    parser.add_argument("command_args", nargs=argparse.REMAINDER, help="Arguments for the command.")
+    return parser.parse_args(argv)
+
+
+def get_batch_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(prog=f"cli.py {BATCH_COMMAND}")
+    parser.add_argument("-f", "--file", default="-", type=str, help="File with one job per line (- for stdin).")
+    parser.add_argument("-x", "--stop_on_error", action="store_true", help="Stop at the first job that fails.")
+    return parser.parse_args(argv)
+
+
+def run_command(command: str, argv: List[str]):
+    """ Parse the arguments for the command, and run it. The script is only imported when it is used. """
+    module = importlib.import_module(COMMANDS[command])
+    profiling.run(module.run, module.get_args(argv), command)
+
+
+def run_batch(args):
+    """ Run each job line in turn. Empty lines and lines starting with # are skipped. """
+    source = sys.stdin if args.file == "-" else open(args.file, "r")
+    n_jobs = 0
+    n_failed = 0
+    batch_start = time.time()
+
+    try:
+        # Read with readline, so jobs from a pipe start as soon as their line arrives.
+        for line in iter(source.readline, ""):
+            line = line.strip()
+            if len(line) == 0 or line.startswith("#"):
+                continue
+
+            job = shlex.split(line)
+            n_jobs += 1
+            Logger.log_special(f"Job {n_jobs}: {line}", with_gap=True)
+            job_start = time.time()
+
+            try:
+                if job[0] not in COMMANDS:
+                    raise ValueError(f"Unknown command '{job[0]}'. Choose from: {', '.join(COMMANDS.keys())}")
+                run_command(job[0], job[1:])
+                Logger.log_field(f"Job {n_jobs} Completed", "{:.2f}s".format(time.time() - job_start))
+
+            except (Exception, SystemExit) as e:
+                # Argument errors and commands that give up raise SystemExit, which shouldn't end the batch.
+                if isinstance(e, SystemExit) and not e.code:
+                    Logger.log_field(f"Job {n_jobs} Completed", "{:.2f}s".format(time.time() - job_start))
+                    continue
+                n_failed += 1
+                Logger.log_field_red(f"Job {n_jobs} Failed", repr(e))
+                if args.stop_on_error:
+                    break
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    Logger.log_special("Batch Completed", with_gap=True)
+    Logger.log_field("Jobs", n_jobs)
+    Logger.log_field("Failed", n_failed)
+    Logger.log_field("Time", "{:.2f}s".format(time.time() - batch_start))
+    if n_failed > 0:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+
+    args = get_args()
+    if args.log_json is not None:
+        Logger.enable_json_mode(args.log_json)
+    elif args.buffer_logs > 0:
+        Logger.enable_buffering(args.buffer_logs)
+    Session(args.settings)
+
+    if args.command == BATCH_COMMAND:
+        run_batch(get_batch_args(args.command_args))
+    else:
+        run_command(args.command, args.command_args)
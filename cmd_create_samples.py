@@ -10,8 +10,11 @@ of each set will contain 'MAX_SAMPLE_SET_SIZE' images. The Samples will be store
 in the desired directory, and we can finally start experimenting with a smaller set of data.
 """
 
+import argparse
+from typing import List
+from modules import profiling
 from modules.loader import Loader
-from modules.settings import ProjectSettings
+from modules.session import Session
 from tools.util import pather
 from tools.util.logger import Logger
 
@@ -28,11 +31,18 @@ REMOTE_GROUND_TRUTH_FILE = "https://requestor-proxy.figure-eight.com/figure_eigh
                            "-annotations-bbox.csv "
 
 
-if __name__ == "__main__":
+def get_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser()
+    profiling.add_argument(parser)
+    return parser.parse_args(argv)
+
+
+def run(args):
 
     # Load the project settings and required modules.
     Logger.log_special("Running Sample Creator", with_gap=True)
-    settings = ProjectSettings("settings.yaml")
+    session = Session.instance()
+    settings = session.settings
     loader: Loader = Loader()
 
     # Read in the source data, and create our own sample data.
@@ -49,7 +59,11 @@ if __name__ == "__main__":
     Logger.log_special("Begin Sample Export", with_gap=True)
     pather.create(settings.SAMPLES_DIRECTORY)
     loader.export_samples(samples, path=settings.SAMPLES_DIRECTORY, size=5000)
+    session.clear_sample_sets()
 
     # All done.
     Logger.log_header("Sample Creation Completed", with_gap=True)
 
+
+if __name__ == "__main__":
+    profiling.run(run, get_args(), "create_samples")
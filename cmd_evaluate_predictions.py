@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Score a submission file (ImageId,PredictionString) against the ground truth boxes of one or more sample
+sets, with the Open Images challenge metric (see modules/evaluation.py). The AP of every class is
+written to a CSV in the evaluation folder of the output directory, and the mAP is logged. With the
+class hierarchy, the parent classes are scored as well.
+
+Pass the image-level labels (-l) to score as the challenge does: detections of classes that weren't
+verified for an image are then ignored. Without them, every image is taken as exhaustively labelled,
+so those detections count as false positives and the mAP comes out lower.
+"""
+
+import argparse
+import csv
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from modules import evaluation, profiling
+from modules.detect_region import BOX_COLUMNS
+from modules.hierarchy import ClassHierarchy
+from modules.loader import Loader
+from modules.prediction_store import PredictionStore
+from modules.session import Session
+from tools.util.args import get_set_indices
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+# How many of the best and worst classes to log.
+N_DISPLAY = 10
+
+
+def get_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--predictions", required=True, type=str,
+                        help="The submission CSV to score, or a prediction store (by path or name).")
+    parser.add_argument("-i", "--set_index", default=0, type=int, help="The index of the set to score against.")
+    parser.add_argument("-r", "--set_range", default=None, type=str,
+                        help="A range of sets to use instead, like 0:10 (end not included).")
+    parser.add_argument("-t", "--iou_threshold", default=evaluation.IOU_THRESHOLD, type=float,
+                        help="The overlap needed for a detection to match a box.")
+    parser.add_argument("-l", "--image_labels", default=None, type=str,
+                        help="The verified image-level labels CSV. Without it, detections of classes that "
+                             "weren't verified for an image are false positives, unlike in the challenge.")
+    parser.add_argument("-w", "--n_workers", default=4, type=int, help="Number of matching processes.")
+    parser.add_argument("-x", "--expand_hierarchy", action="store_true",
+                        help="Expand each ground truth box to its ancestor classes too, as the challenge does.")
+    parser.add_argument("-X", "--expand_predictions", action="store_true",
+                        help="Expand the predictions as well (for models that only predict the leaf classes).")
+    profiling.add_argument(parser)
+    return parser.parse_args(argv)
+
+
+def load_predictions(path: str, loader: Loader):
+    """ The box arrays by image key, from a prediction store if there is one at the path (or with that
+    name), or else from a submission CSV. """
+    store_path = path if os.path.isdir(path) else PredictionStore.get_store_path(path)
+    if os.path.isdir(store_path):
+        store = PredictionStore(store_path)
+        if store.class_ids != loader.class_ids:
+            Logger.log_field_red("Error", "The prediction store was made with different labels.")
+            raise SystemExit(1)
+        return store
+    return evaluation.load_predictions(path, loader.class_codes)
+
+
+def load_verified_labels(path: str, class_codes: Dict[str, int], image_keys: List[str],
+                         hierarchy: ClassHierarchy = None) -> Dict[str, np.array]:
+    """ The verified class codes of each image. With the hierarchy, a class verified as present verifies
+    its ancestors too, and a class verified as absent verifies its descendants. """
+    positives, negatives = evaluation.load_image_labels(path, class_codes, image_keys)
+    if hierarchy is None:
+        return {key: np.concatenate([positives.get(key, []), negatives.get(key, [])]).astype(np.int64)
+                for key in set(positives) | set(negatives)}
+
+    verified_labels = {}
+    for key in set(positives) | set(negatives):
+        codes = [hierarchy.expand(positives.get(key, []))[1]]
+        codes += [hierarchy.get_descendants(code) for code in negatives.get(key, [])]
+        verified_labels[key] = np.unique(np.concatenate(codes))
+    return verified_labels
+
+
+def run(args):
+
+    # Load the project settings and required modules.
+    Logger.log_special("Running Prediction Evaluation", with_gap=True)
+    session = Session.instance()
+    settings = session.settings
+    loader = session.loader
+
+    samples = []
+    for set_index in get_set_indices(args):
+        samples += session.load_sample_set(set_index)
+    ground_truth = evaluation.get_ground_truth(samples, loader.class_codes)
+    predictions = load_predictions(args.predictions, loader)
+    n_scored_images = sum(1 for key in ground_truth if len(predictions.get(key, ())) > 0)
+
+    # Score the parent classes as well, with the class codes of the hierarchy.
+    class_ids = loader.class_ids
+    class_codes = loader.class_codes
+    hierarchy = None
+    if args.expand_hierarchy or args.expand_predictions:
+        hierarchy = session.hierarchy
+        if hierarchy is None:
+            Logger.log_field_red("Error", "Set HIERARCHY_FILE in the settings to expand the classes.")
+            raise SystemExit(1)
+        class_ids = hierarchy.class_ids
+        class_codes = hierarchy.class_codes
+        ground_truth = {key: hierarchy.expand_boxes(boxes) for key, boxes in ground_truth.items()}
+        if args.expand_predictions:
+            predictions = {key: hierarchy.expand_boxes(predictions.get(key, np.zeros((0, BOX_COLUMNS), np.float32)))
+                           for key in ground_truth}
+
+    verified_labels = None
+    if args.image_labels is not None:
+        verified_labels = load_verified_labels(args.image_labels, class_codes, list(ground_truth.keys()), hierarchy)
+
+    Logger.log_field("Images", len(ground_truth))
+    Logger.log_field("Images with Predictions", n_scored_images)
+    if verified_labels is not None:
+        Logger.log_field("Images with Labels", len(verified_labels))
+    if n_scored_images == 0:
+        Logger.log_field_red("Error", "None of the predictions are for images in these sets.")
+        raise SystemExit(1)
+
+    Logger.log_special("Begin Evaluation", with_gap=True)
+    start_time = time.time()
+    class_aps, n_positives = evaluation.evaluate(ground_truth, predictions, len(class_ids),
+                                                 args.iou_threshold, args.n_workers, verified_labels)
+    mean_ap = evaluation.get_mean_ap(class_aps)
+
+    # Write the AP of each class with ground truth boxes.
+    evaluation_path = os.path.join(settings.OUTPUT_DIRECTORY, "evaluation")
+    os.makedirs(evaluation_path, exist_ok=True)
+    name = os.path.splitext(os.path.basename(args.predictions.rstrip("/")))[0]
+    results_path = os.path.join(evaluation_path, f"{name}.csv")
+    scored_codes = sorted((c for c in range(len(class_aps)) if n_positives[c] > 0), key=lambda c: class_aps[c])
+
+    with open(results_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["class_id", "label", "boxes", "ap"])
+        for c in scored_codes:
+            class_id = class_ids[c]
+            writer.writerow([class_id, loader.get_label(class_id, upper=False), n_positives[c],
+                             "{:.6f}".format(class_aps[c])])
+
+    Logger.log_special("Worst Classes", with_gap=True)
+    for c in scored_codes[:N_DISPLAY]:
+        Logger.log_field(loader.get_label(class_ids[c]), "{:.4f}".format(class_aps[c]))
+
+    Logger.log_special("Best Classes", with_gap=True)
+    for c in reversed(scored_codes[-N_DISPLAY:]):
+        Logger.log_field(loader.get_label(class_ids[c]), "{:.4f}".format(class_aps[c]))
+
+    Logger.log_special("Results", with_gap=True)
+    Logger.log_field("Classes Scored", len(scored_codes))
+    Logger.log_field("mAP", "{:.4f}".format(mean_ap))
+    Logger.log_field("Time", "{:.2f}s".format(time.time() - start_time))
+    Logger.log_field("Class APs Saved", results_path)
+    Logger.log_header("Evaluation Completed", with_gap=True)
+
+
+if __name__ == "__main__":
+    profiling.run(run, get_args(), "evaluate")
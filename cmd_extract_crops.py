@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cut every ground truth box out of the downloaded images of a set, and store the crops in a crop store
+(a pack file with a sample key, box index and class index). Each image is decoded once for all of its
+boxes, and the samples are processed in parallel worker processes.
+"""
+
+import argparse
+import multiprocessing
+from typing import List
+import cv2
+import numpy as np
+from modules import profiling
+from modules.crop_store import CropStore
+from modules.detect_region import BOX_BOTTOM, BOX_LEFT, BOX_RIGHT, BOX_TOP, DetectRegion
+from modules.session import Session
+from modules.settings import ProjectSettings
+from tools.util import metrics, visual
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+def get_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--set_index", default=0, type=int, help="The index of the set to use.")
+    parser.add_argument("-s", "--crop_size", default=0, type=int,
+                        help="Resize every crop to this square size (0 keeps the original crop size).")
+    parser.add_argument("-q", "--quality", default=90, type=int, help="JPEG quality of the stored crops.")
+    parser.add_argument("-w", "--n_workers", default=4, type=int, help="Number of worker processes.")
+    profiling.add_argument(parser)
+    return parser.parse_args(argv)
+
+
+def init_worker(settings: ProjectSettings):
+    ProjectSettings._INSTANCE = settings
+
+
+def extract_crops(task):
+    """ Decode the sample image once, and cut out and encode the crops for all of its boxes.
+    A sample whose image can't be decoded has no crops. """
+    sample, crop_size, quality = task
+    image = sample.image
+    if image is None:
+        return sample.key, []
+
+    h, w = image.shape[:2]
+
+    boxes = DetectRegion.to_array(sample.detect_regions)
+    bounds = boxes[:, [BOX_LEFT, BOX_TOP, BOX_RIGHT, BOX_BOTTOM]] * np.array([w, h, w, h], dtype=np.float32)
+    bounds = bounds.astype(np.int64)
+    bounds[:, 2] = np.maximum(bounds[:, 2], bounds[:, 0] + 1)
+    bounds[:, 3] = np.maximum(bounds[:, 3], bounds[:, 1] + 1)
+
+    crops = []
+    for box_index, crop in enumerate(visual.safe_extract_many(image, bounds)):
+        if crop_size > 0:
+            crop = cv2.resize(crop, (crop_size, crop_size), interpolation=cv2.INTER_AREA)
+        _, encoded = cv2.imencode(".jpg", crop, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        crops.append((box_index, sample.detect_regions[box_index].class_id, encoded.tobytes()))
+
+    return sample.key, crops
+
+
+def run(args):
+    set_index = args.set_index
+
+    # Load the project settings and required modules.
+    Logger.log_special("Running Crop Extractor", with_gap=True)
+    session = Session.instance()
+    settings = session.settings
+
+    samples = session.load_sample_set(set_index)
+    crop_store = CropStore.for_set(set_index)
+    Logger.log_field("Crop Store", crop_store.path)
+    Logger.log_field("Crops Stored", len(crop_store))
+
+    # Skip the samples that were already extracted, so an interrupted run can be resumed.
+    pending_samples = [s for s in samples if len(s.detect_regions) > 0 and s.is_locally_loaded and
+                       not crop_store.has_sample(s.key, len(s.detect_regions))]
+    n_pending_samples = len(pending_samples)
+    Logger.log_field("Samples to Extract", n_pending_samples)
+
+    Logger.log_special("Begin Crop Extraction", with_gap=True)
+    tasks = [(s, args.crop_size, args.quality) for s in pending_samples]
+    n_crops = 0
+    n_failed_samples = 0
+
+    with multiprocessing.Pool(args.n_workers, initializer=init_worker, initargs=(settings,)) as pool:
+        for i, (key, crops) in enumerate(pool.imap_unordered(extract_crops, tasks, chunksize=8)):
+
+            if len(crops) == 0:
+                Logger.log_field_red(f"Extraction Failed ({key})", "Could not decode the image.")
+                metrics.count("crops.failed")
+                n_failed_samples += 1
+
+            # Only this process writes to the store.
+            for box_index, class_id, data in crops:
+                crop_store.write(key, box_index, class_id, data)
+            n_crops += len(crops)
+            Logger.log_progress((i + 1) / n_pending_samples, suffix=f"{i + 1}/{n_pending_samples}")
+
+    Logger.log_field("Crops Extracted", n_crops)
+    Logger.log_field("Failed Samples", n_failed_samples)
+    Logger.log_field("Total Crops", len(crop_store))
+    Logger.log_header("Crop Extraction Completed", with_gap=True)
+
+
+if __name__ == "__main__":
+    profiling.run(run, get_args(), "extract_crops")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Read a submission file (ImageId,PredictionString) into a prediction store (see
+modules/prediction_store.py) for the images of one or more sample sets. The store is written to the
+predictions folder of the output directory, and can then be used in place of the CSV, e.g. with
+cmd_evaluate_predictions.py.
+"""
+
+import argparse
+import os
+from typing import List
+
+import numpy as np
+
+from modules import profiling
+from modules.prediction_store import PredictionStore
+from modules.session import Session
+from tools.util.args import get_set_indices
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+def get_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--predictions", required=True, type=str, help="The submission CSV to read.")
+    parser.add_argument("-n", "--name", default=None, type=str,
+                        help="Name of the store (the name of the CSV file by default).")
+    parser.add_argument("-i", "--set_index", default=0, type=int, help="The index of the set to store.")
+    parser.add_argument("-r", "--set_range", default=None, type=str,
+                        help="A range of sets to use instead, like 0:10 (end not included).")
+    profiling.add_argument(parser)
+    return parser.parse_args(argv)
+
+
+def run(args):
+
+    # Load the project settings and required modules.
+    Logger.log_special("Running Prediction Ingestion", with_gap=True)
+    session = Session.instance()
+    loader = session.loader
+
+    # The image codes are the positions of the samples in these sets.
+    image_keys = []
+    for set_index in get_set_indices(args):
+        image_keys += [s.key for s in session.load_sample_set(set_index)]
+
+    name = args.name if args.name is not None else os.path.splitext(os.path.basename(args.predictions))[0]
+    path = PredictionStore.get_store_path(name)
+    Logger.log_field("Images", len(image_keys))
+    Logger.log_field("Store", path)
+
+    Logger.log_special("Begin Ingestion", with_gap=True)
+    store = PredictionStore.ingest(args.predictions, path, image_keys, loader.class_ids)
+    Logger.log_field("Images with Predictions", int(np.count_nonzero(np.diff(store.offsets))))
+    Logger.log_header("Ingestion Completed", with_gap=True)
+
+
+if __name__ == "__main__":
+    profiling.run(run, get_args(), "ingest_predictions")
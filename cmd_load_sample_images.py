@@ -10,54 +10,70 @@ import argparse
 import os
 import threading
 import time
-from modules.loader import Loader
-from modules.settings import ProjectSettings
+from typing import List
+from modules import profiling
+from modules.session import Session
 from tools.util.logger import Logger
 
 __author__ = "Jakrin Juangbhanich"
 __email__ = "juangbhanich.k@gmail.com"
 
 
-def get_args():
+def get_args(argv: List[str] = None):
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--set_index", default=0, type=int, help="The index of the set to use.")
     parser.add_argument("-m", "--max_threads", default=5, type=int, help="Max threads to use for loading.")
-    return parser.parse_args()
+    profiling.add_argument(parser)
+    return parser.parse_args(argv)
 
 
-args = get_args()
-set_index = args.set_index
-max_threads = args.max_threads
-
-
-if __name__ == "__main__":
+def run(args):
+    set_index = args.set_index
+    max_threads = args.max_threads
 
     # Load the project settings and required modules.
     Logger.log_special("Running Sample Loader", with_gap=True)
-    settings = ProjectSettings("settings.yaml")
+    session = Session.instance()
+    settings = session.settings
 
     set_path = os.path.join(settings.SAMPLES_DIRECTORY, f"sample_set_{set_index}.json")
     if not os.path.exists(set_path):
         Logger.log_field("Error", "No file found at {}. Have you created the samples using cmd_create_samples yet?")
-        exit(1)
+        raise SystemExit(1)
 
     Logger.log_special("Begin Sample Image Download", with_gap=True)
-    samples = Loader.load_sample_set_from_file(set_path)
+    samples = session.load_sample_set(set_index)
     unloaded_samples = [s for s in samples if not s.is_locally_loaded]
     n_unloaded_samples = len(unloaded_samples)
     n_samples = len(samples)
     Logger.log_field("Samples Loaded", "{}/{}".format(n_samples - n_unloaded_samples, n_samples))
 
-    i = 0
+    threads = []
+    progress = Logger.create_progress(n_unloaded_samples, header="Samples Downloaded")
+
+    def load(sample):
+        sample.load()
+        progress.update()
 
+    # Only count our own download threads, in case other jobs are running in this process.
     for sample in unloaded_samples:
         while True:
-            if threading.active_count() <= max_threads:
-                thread = threading.Thread(target=sample.load)
+            threads = [t for t in threads if t.is_alive()]
+            if len(threads) < max_threads:
+                thread = threading.Thread(target=load, args=(sample,))
                 thread.start()
+                threads.append(thread)
                 break
             else:
-                time.sleep(1)
+                time.sleep(0.05)
 
-        i += 1
-        Logger.log_field("Loading Sample", f"{i}/{n_unloaded_samples}")
+    # Wait for the last downloads, then save the meta-data they recorded (such as the image sizes).
+    for thread in threads:
+        thread.join()
+
+    session.save_sample_set(samples, set_index)
+    Logger.log_field("Sample Set Saved", set_path)
+
+
+if __name__ == "__main__":
+    profiling.run(run, get_args(), "load_sample_images")
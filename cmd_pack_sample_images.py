@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Move the images of a set between the two storage formats. By default, the loose JPEG files that
+cmd_load_sample_images downloaded into the set directory are appended to the set's pack file.
+With --unpack, the images in the pack are written back out as loose files instead.
+"""
+
+import argparse
+import os
+from typing import List
+from modules import profiling
+from modules.image_pack import ImagePack
+from modules.sample import Sample
+from modules.session import Session
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+def get_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--set_index", default=0, type=int, help="The index of the set to use.")
+    parser.add_argument("-u", "--unpack", action="store_true", help="Write the packed images out as loose files.")
+    parser.add_argument("-r", "--remove", action="store_true", help="Remove the loose files once they are packed.")
+    profiling.add_argument(parser)
+    return parser.parse_args(argv)
+
+
+def pack_set(pack: ImagePack, set_path: str, remove: bool):
+    """ Append all the loose images in the set directory to the pack. """
+    file_names = [f for f in os.listdir(set_path) if f.endswith(".jpg")] if os.path.exists(set_path) else []
+    n_files = len(file_names)
+    n_packed = 0
+
+    for i, file_name in enumerate(file_names):
+        key = file_name.split(".")[0]
+        file_path = os.path.join(set_path, file_name)
+
+        if key not in pack:
+            with open(file_path, "rb") as f:
+                pack.write(key, f.read())
+            n_packed += 1
+
+        if remove:
+            os.remove(file_path)
+
+        Logger.log_progress((i + 1) / n_files, suffix=f"{i + 1}/{n_files}")
+
+    Logger.log_field("Images Packed", n_packed)
+    Logger.log_field("Pack Size", len(pack))
+
+
+def unpack_set(pack: ImagePack, set_path: str):
+    """ Write every image in the pack out as a loose file. """
+    os.makedirs(set_path, exist_ok=True)
+    keys = pack.keys
+    n_keys = len(keys)
+    n_unpacked = 0
+
+    for i, key in enumerate(keys):
+        file_path = os.path.join(set_path, f"{key}.jpg")
+        if not os.path.exists(file_path):
+            with open(file_path, "wb") as f:
+                f.write(pack.read(key))
+            n_unpacked += 1
+
+        Logger.log_progress((i + 1) / n_keys, suffix=f"{i + 1}/{n_keys}")
+
+    Logger.log_field("Images Unpacked", n_unpacked)
+
+
+def run(args):
+    set_index = args.set_index
+
+    # Load the project settings and required modules.
+    Logger.log_special("Running Sample Packer", with_gap=True)
+    Session.instance()
+
+    set_path = Sample.get_set_path(set_index)
+    pack = ImagePack.for_set(set_index)
+    Logger.log_field("Loose Directory", set_path)
+    Logger.log_field("Pack File", pack.data_path)
+
+    if args.unpack:
+        Logger.log_special("Begin Unpacking", with_gap=True)
+        unpack_set(pack, set_path)
+    else:
+        Logger.log_special("Begin Packing", with_gap=True)
+        pack_set(pack, set_path, args.remove)
+
+    Logger.log_header("Packing Completed", with_gap=True)
+
+
+if __name__ == "__main__":
+    profiling.run(run, get_args(), "pack_sample_images")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Read the width and height of every downloaded image in a set from its JPEG header (without decoding
+the pixels), and save them into the sample set file. Jobs that only need the image sizes (like box
+pixel areas or aspect ratios) can then use sample.width and sample.height without touching the images.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from modules import profiling
+from modules.sample import Sample
+from modules.session import Session
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+def get_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--set_index", default=0, type=int, help="The index of the set to use.")
+    parser.add_argument("-m", "--max_threads", default=16, type=int, help="Max threads to use for reading.")
+    parser.add_argument("-f", "--force", action="store_true", help="Re-read sizes that are already known.")
+    profiling.add_argument(parser)
+    return parser.parse_args(argv)
+
+
+def read_size(sample: Sample):
+    try:
+        sample.read_image_size()
+    except Exception as e:
+        Logger.log_field_red(f"Error Reading {sample.key}", e)
+
+
+def run(args):
+    set_index = args.set_index
+    max_threads = args.max_threads
+
+    # Load the project settings and required modules.
+    Logger.log_special("Running Image Size Reader", with_gap=True)
+    session = Session.instance()
+
+    samples = session.load_sample_set(set_index)
+    loaded_samples = [s for s in samples if s.is_locally_loaded]
+    if args.force:
+        for sample in loaded_samples:
+            sample.width = sample.height = None
+
+    unsized_samples = [s for s in loaded_samples if s.width is None]
+    n_unsized_samples = len(unsized_samples)
+    Logger.log_field("Samples with Images", len(loaded_samples))
+    Logger.log_field("Samples to Read", n_unsized_samples)
+
+    # The header reads are tiny and I/O bound, so threads are enough to keep the disk busy.
+    Logger.log_special("Begin Reading Image Sizes", with_gap=True)
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        for i, _ in enumerate(executor.map(read_size, unsized_samples)):
+            Logger.log_progress((i + 1) / n_unsized_samples, suffix=f"{i + 1}/{n_unsized_samples}")
+
+    session.save_sample_set(samples, set_index)
+    Logger.log_header("Image Size Reading Completed", with_gap=True)
+
+
+if __name__ == "__main__":
+    profiling.run(run, get_args(), "read_image_sizes")
@@ -5,24 +5,38 @@
 Run some basic statistical analysis on the samples.
 """
 
+import argparse
 import os
-from typing import Dict
+from typing import Dict, List
 
+from modules import profiling
 from modules.loader import Loader
+from modules.session import Session
 from modules.settings import ProjectSettings
 from tools.util.logger import Logger
-import matplotlib.pyplot as plt
-import numpy as np
 
 __author__ = "Jakrin Juangbhanich"
 __email__ = "juangbhanich.k@gmail.com"
 
 
-def display_stats(instances: Dict[str, int],
+def get_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser()
+    profiling.add_argument(parser)
+    return parser.parse_args(argv)
+
+
+def display_stats(loader: Loader,
+                  settings: ProjectSettings,
+                  n_samples: int,
+                  instances: Dict[str, int],
                   title: str="SOMETHING",
                   file_name: str="graph_name",
                   n_display: int = 20):
 
+    # Only needed for the graphs, so they are not loaded up front.
+    import matplotlib.pyplot as plt
+    import numpy as np
+
     sorted_instances = sorted(instances.items(), key=lambda kv: kv[1])
     sorted_instances.reverse()
 
@@ -52,22 +66,22 @@ def display_stats(instances: Dict[str, int],
     ax.set_yticks(y)
     ax.set_yticklabels(y_label)
     ax.invert_yaxis()
-    ax.set_title(f"{title}: ({len(samples)} Images)")
+    ax.set_title(f"{title}: ({n_samples} Images)")
     ax.set_xlabel("Count")
     ax.set_ylabel("Class Name")
     plt.savefig(f"{settings.OUTPUT_DIRECTORY}/{file_name}.png")
     plt.clf()
 
 
-if __name__ == "__main__":
+def run(args):
 
     # Load the project settings and required modules.
     Logger.log_special("Running Sample Analysis", with_gap=True)
-    settings = ProjectSettings("settings.yaml")
+    session = Session.instance()
+    settings = session.settings
 
     # Load the class labels.
-    loader = Loader()
-    loader.load_labels(settings.LABELS_FILE)
+    loader = session.loader
 
     # Get ALL of the samples in the directory.
     samples = []
@@ -92,7 +106,19 @@ if __name__ == "__main__":
                 classes_in_sample[region.class_id] = True
                 class_appearances[region.class_id] += 1
 
-    display_stats(class_instances, "Instances", "instance_graph", n_display=20)
-    display_stats(class_appearances, "Appearances", "appearance_graph", n_display=20)
+    display_stats(loader, settings, len(samples), class_instances, "Instances", "instance_graph", n_display=20)
+    display_stats(loader, settings, len(samples), class_appearances, "Appearances", "appearance_graph", n_display=20)
+
+    # Count each box for its ancestor classes too, e.g. every kind of Animal for Animal.
+    hierarchy = session.hierarchy
+    if hierarchy is not None:
+        import numpy as np
+        codes = np.array([hierarchy.class_codes.get(r.class_id, -1) for s in samples for r in s.detect_regions])
+        counts = hierarchy.count(codes)
+        family_instances = {class_id: int(counts[i]) for i, class_id in enumerate(hierarchy.class_ids)}
+        display_stats(loader, settings, len(samples), family_instances, "Instances (with Subcategories)",
+                      "family_instance_graph", n_display=20)
 
 
+if __name__ == "__main__":
+    profiling.run(run, get_args(), "sample_analysis")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Shrink the images of a set that has already been downloaded, so that the biggest edge of each image
+is at most the specified size. The original image sizes are saved into the sample set file. The
+detect regions are relative to the image size, so they don't need to change.
+"""
+
+import argparse
+from typing import List
+from modules import profiling
+from modules.image_pack import ImagePack
+from modules.session import Session
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+def get_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--set_index", default=0, type=int, help="The index of the set to use.")
+    parser.add_argument("-e", "--max_edge", default=None, type=int,
+                        help="Max size of the biggest image edge. Defaults to MAX_IMAGE_EDGE from the settings.")
+    parser.add_argument("-q", "--quality", default=None, type=int,
+                        help="JPEG quality to encode with. Defaults to JPEG_QUALITY from the settings.")
+    profiling.add_argument(parser)
+    return parser.parse_args(argv)
+
+
+def run(args):
+    set_index = args.set_index
+
+    # Load the project settings and required modules.
+    Logger.log_special("Running Sample Transcoder", with_gap=True)
+    session = Session.instance()
+    settings = session.settings
+    max_edge = args.max_edge if args.max_edge is not None else settings.MAX_IMAGE_EDGE
+    quality = args.quality if args.quality is not None else settings.JPEG_QUALITY
+
+    if max_edge <= 0:
+        Logger.log_field("Error", "No max edge set. Use --max_edge or set MAX_IMAGE_EDGE in the settings.")
+        raise SystemExit(1)
+
+    Logger.log_field("Max Edge", max_edge)
+    Logger.log_field("JPEG Quality", quality)
+
+    samples = session.load_sample_set(set_index)
+    loaded_samples = [s for s in samples if s.is_locally_loaded]
+    n_loaded_samples = len(loaded_samples)
+    Logger.log_field("Samples with Images", n_loaded_samples)
+
+    Logger.log_special("Begin Transcoding", with_gap=True)
+    samples_by_key = {s.key: s for s in loaded_samples}
+    progress = {"count": 0}
+
+    def transcode(key: str, data: bytes) -> bytes:
+        progress["count"] += 1
+        Logger.log_progress(progress["count"] / n_loaded_samples, suffix=f"{progress['count']}/{n_loaded_samples}")
+
+        # An image that fails to transcode is kept as it is, rather than stopping the whole set.
+        try:
+            return samples_by_key[key].transcode_image_data(data, max_edge, quality)
+        except Exception as e:
+            Logger.log_field_red(f"Transcode Failed ({key})", e)
+            return data
+
+    if settings.USE_IMAGE_PACKS:
+        # Rewrite the whole pack, so the replaced images don't stay behind as dead bytes.
+        ImagePack.for_set(set_index).rewrite(
+            lambda key, data: transcode(key, data) if key in samples_by_key else data)
+    else:
+        for sample in loaded_samples:
+            sample.store_image_data(transcode(sample.key, sample.read_image_data()))
+
+    session.save_sample_set(samples, set_index)
+    Logger.log_header("Transcoding Completed", with_gap=True)
+
+
+if __name__ == "__main__":
+    profiling.run(run, get_args(), "transcode_sample_images")
@@ -2,60 +2,165 @@
 # -*- coding: utf-8 -*-
 
 """
-Draw the labels on a couple of samples.
+Draw the labels on the samples of one or more sets. The rendering (decoding, drawing and encoding) is
+spread across a process pool, and each image is written out as soon as it is done. Images whose boxes,
+labels and style haven't changed since the last run are skipped.
+
+In mosaic mode, the samples are drawn as thumbnails instead, and tiled into contact sheets for browsing
+through a large part of the dataset. Each sheet has a JSON index that maps its cells to the sample keys.
 """
 
 import argparse
 import os
-import cv2
+from typing import List
+from modules import profiling, render
 from modules.loader import Loader
+from modules.sample import Sample
+from modules.session import Session
 from modules.settings import ProjectSettings
+from tools.util.args import get_set_indices
 from tools.util.logger import Logger
 
 __author__ = "Jakrin Juangbhanich"
 __email__ = "juangbhanich.k@gmail.com"
 
 
-def get_args():
+def get_args(argv: List[str] = None):
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--set_index", default=0, type=int, help="The index of the set to use.")
-    parser.add_argument("-n", "--sample_count", default=50, type=int, help="How many do we want to visualize?")
-    return parser.parse_args()
+    parser.add_argument("-r", "--set_range", default=None, type=str,
+                        help="A range of sets to use instead, like 0:10 (end not included).")
+    parser.add_argument("-q", "--query", default=None, type=str,
+                        help="Only visualize samples with a class whose label or ID contains this text.")
+    parser.add_argument("-n", "--sample_count", default=50, type=int,
+                        help="How many do we want to visualize per set? (0 for all of them)")
+    parser.add_argument("-e", "--max_edge", default=None, type=int,
+                        help="Draw on images shrunk so their biggest edge fits this size (for quick previews).")
+    parser.add_argument("-w", "--n_workers", default=4, type=int, help="Number of render processes.")
+    parser.add_argument("-f", "--force", action="store_true", help="Render again, even if nothing has changed.")
+    parser.add_argument("-m", "--mosaic", action="store_true", help="Tile thumbnails into contact sheets instead.")
+    parser.add_argument("-t", "--thumb_size", default=256, type=int, help="Size of each contact sheet cell.")
+    parser.add_argument("-g", "--grid", default="8x6", type=str,
+                        help="Columns and rows of each contact sheet, like 8x6.")
+    profiling.add_argument(parser)
+    return parser.parse_args(argv)
 
 
-args = get_args()
-set_index = args.set_index
-sample_count = args.sample_count
+def get_grid(args) -> (int, int):
+    columns, rows = args.grid.lower().split("x")
+    return int(columns), int(rows)
 
-if __name__ == "__main__":
+
+def matches_query(sample: Sample, loader: Loader, query: str) -> bool:
+    query = query.lower()
+    for region in sample.detect_regions:
+        if query in region.class_id.lower() or query in loader.get_label(region.class_id, upper=False).lower():
+            return True
+    return False
+
+
+def render_mosaic(args, samples: List[Sample], loader: Loader, settings: ProjectSettings):
+    """ Tile all the selected samples into contact sheets. """
+    set_indices = get_set_indices(args)
+    columns, rows = get_grid(args)
+    sheet_size = columns * rows
+    style = {"columns": columns, "rows": rows, "cell_size": args.thumb_size}
+
+    name = f"set_{set_indices[0]}" if len(set_indices) == 1 else f"sets_{set_indices[0]}-{set_indices[-1]}"
+    if args.query is not None:
+        name += f"_{args.query}"
+    mosaic_path = os.path.join(settings.OUTPUT_DIRECTORY, "gt_mosaic", name)
+    os.makedirs(mosaic_path, exist_ok=True)
+
+    if args.force:
+        for file in os.listdir(mosaic_path):
+            if file.endswith(".json"):
+                os.remove(os.path.join(mosaic_path, file))
+
+    sheets = [(samples[i:i + sheet_size], os.path.join(mosaic_path, f"sheet_{i // sheet_size:04d}"))
+              for i in range(0, len(samples), sheet_size)]
+    n_sheets = len(sheets)
+    Logger.log_field("Mosaic Path", mosaic_path)
+    Logger.log_field("Contact Sheets", n_sheets)
+
+    Logger.log_special("Begin Rendering", with_gap=True)
+    n_rendered = 0
+    for i, (path, is_rendered) in enumerate(
+            render.render_contact_sheets(sheets, loader.label_map, style, n_workers=args.n_workers)):
+        n_rendered += int(is_rendered)
+        Logger.log_progress((i + 1) / n_sheets, suffix=f"{i + 1}/{n_sheets}")
+
+    Logger.log_field("Rendered", n_rendered)
+    Logger.log_field("Up to Date", n_sheets - n_rendered)
+    Logger.log_header("Visualization Completed", with_gap=True)
+
+
+def run(args):
+    sample_count = args.sample_count
 
     # Load the project settings and required modules.
-    Logger.log_special("Running Sample Loader", with_gap=True)
-    settings = ProjectSettings("settings.yaml")
+    Logger.log_special("Running Sample Visualizer", with_gap=True)
+    session = Session.instance()
+    settings = session.settings
 
     # Load the label mapping.
-    loader = Loader()
-    loader.load_labels(settings.LABELS_FILE)
+    loader = session.loader
     Logger.log_field("Labels Loaded", len(loader.label_map))
 
-    # Load the samples from the set that we want.
-    samples = Loader.load_sample_set(set_index)
-    loaded_samples = [s for s in samples if (s.is_locally_loaded and len(s.detect_regions) > 0)]
+    style = {"max_edge": args.max_edge}
+    jobs = []
+    mosaic_samples = []
+
+    for set_index in get_set_indices(args):
+
+        # Load the samples from the set that we want.
+        samples = session.load_sample_set(set_index)
+        loaded_samples = [s for s in samples if (s.is_locally_loaded and len(s.detect_regions) > 0)]
+        if args.query is not None:
+            loaded_samples = [s for s in loaded_samples if matches_query(s, loader, args.query)]
+        if sample_count > 0:
+            loaded_samples = loaded_samples[:sample_count]
+
+        if args.mosaic:
+            mosaic_samples += loaded_samples
+            Logger.log_field(f"Set {set_index}", f"{len(loaded_samples)} samples")
+            continue
 
-    # How many samples loaded?
-    n_loaded_samples = len(loaded_samples)
-    Logger.log_field("Samples with Images", n_loaded_samples)
-    if n_loaded_samples == 0:
-        raise Exception("None of the samples in this set have been downloaded! "
-                        "Please run cmd_load_sample_images first for this set.")
-    loaded_samples = loaded_samples[:min(n_loaded_samples - 1, sample_count)]
+        # Create the output folder for this part.
+        set_path = os.path.join(settings.OUTPUT_DIRECTORY, "gt_visualization", f"set_{set_index}")
+        os.makedirs(set_path, exist_ok=True)
 
-    # Create the output folder for this part.
-    set_path = os.path.join(settings.OUTPUT_DIRECTORY, "gt_visualization", f"set_{set_index}")
-    os.makedirs(set_path, exist_ok=True)
+        outdated = render.find_outdated(loaded_samples, set_path, loader, style, force=args.force)
+        jobs += [(sample, render_hash, set_path) for sample, render_hash in outdated]
+        Logger.log_field(f"Set {set_index}", f"{len(outdated)}/{len(loaded_samples)} to render")
 
-    for sample in loaded_samples:
+    if args.mosaic:
+        if len(mosaic_samples) == 0:
+            Logger.log_header("Nothing to Render", with_gap=True)
+            return
+        render_mosaic(args, mosaic_samples, loader, settings)
+        return
 
-        image = sample.get_visualized_image(label_map_function=loader.get_label)
-        file_name = os.path.join(set_path, f"{sample.key}.jpg")
-        cv2.imwrite(file_name, image)
+    n_jobs = len(jobs)
+    if n_jobs == 0:
+        Logger.log_header("Nothing to Render", with_gap=True)
+        return
+
+    Logger.log_special("Begin Rendering", with_gap=True)
+    n_failed = 0
+    for i, (sample, render_hash, set_path) in enumerate(
+            render.render_parallel(jobs, loader.label_map, style, n_workers=args.n_workers)):
+        if render_hash is None:
+            n_failed += 1
+        else:
+            render.append_manifest(set_path, [(sample.key, render_hash)])
+        Logger.log_progress((i + 1) / n_jobs, suffix=f"{i + 1}/{n_jobs}")
+
+    Logger.log_field("Rendered", n_jobs - n_failed)
+    if n_failed > 0:
+        Logger.log_field_red("Failed", n_failed)
+    Logger.log_header("Visualization Completed", with_gap=True)
+
+
+if __name__ == "__main__":
+    profiling.run(run, get_args(), "visualize_samples")
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+Augmentations that transform an image together with its box array (see DetectRegion.to_array). The box
+coordinates are relative to the image, so every box transform is a handful of numpy operations over all the
+boxes of a sample at once. Stages can be chained with Compose, and each call takes a RandomState so that a
+seeded run always produces the same augmentations.
+"""
+
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+from modules.detect_region import BOX_BOTTOM, BOX_IS_TRUNCATED, BOX_LEFT, BOX_RIGHT, BOX_TOP
+from tools.util import visual
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+# Slices of the box array columns.
+_X = [BOX_LEFT, BOX_RIGHT]
+_Y = [BOX_TOP, BOX_BOTTOM]
+
+
+class Augmentation:
+    """ Base class for an augmentation stage. """
+
+    def __call__(self, image: np.array, boxes: np.array, random_state: np.random.RandomState = None) \
+            -> Tuple[np.array, np.array]:
+        if random_state is None:
+            random_state = np.random
+        return self.apply(image, boxes, random_state)
+
+    def apply(self, image: np.array, boxes: np.array, random_state) -> Tuple[np.array, np.array]:
+        raise NotImplementedError
+
+
+class Compose(Augmentation):
+    """ Apply a list of augmentations in order. """
+
+    def __init__(self, augmentations: List[Augmentation]):
+        self.augmentations = augmentations
+
+    def apply(self, image, boxes, random_state):
+        for augmentation in self.augmentations:
+            image, boxes = augmentation.apply(image, boxes, random_state)
+        return image, boxes
+
+
+class Flip(Augmentation):
+    """ Mirror the image horizontally (and optionally vertically) with some probability. """
+
+    def __init__(self, horizontal: float = 0.5, vertical: float = 0.0):
+        self.horizontal = horizontal
+        self.vertical = vertical
+
+    def apply(self, image, boxes, random_state):
+        if random_state.rand() < self.horizontal:
+            image = cv2.flip(image, 1)
+            boxes = boxes.copy()
+            boxes[:, _X] = 1.0 - boxes[:, [BOX_RIGHT, BOX_LEFT]]
+
+        if random_state.rand() < self.vertical:
+            image = cv2.flip(image, 0)
+            boxes = boxes.copy()
+            boxes[:, _Y] = 1.0 - boxes[:, [BOX_BOTTOM, BOX_TOP]]
+
+        return image, boxes
+
+
+class Scale(Augmentation):
+    """ Resize the image by a random factor. The relative boxes don't change. """
+
+    def __init__(self, min_scale: float = 0.5, max_scale: float = 1.5):
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+
+    def apply(self, image, boxes, random_state):
+        scale = random_state.uniform(self.min_scale, self.max_scale)
+        h, w = image.shape[:2]
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+        return cv2.resize(image, size, interpolation=interpolation), boxes
+
+
+class RandomCrop(Augmentation):
+    """ Crop a random area of the image. The boxes are clipped to the crop, and boxes with less than
+    min_visibility of their area left inside it are dropped. Boxes that were cut are marked as truncated. """
+
+    def __init__(self, min_size: float = 0.3, max_size: float = 1.0, min_visibility: float = 0.25,
+                 max_aspect_change: float = 2.0):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.min_visibility = min_visibility
+        self.max_aspect_change = max_aspect_change
+
+    def apply(self, image, boxes, random_state):
+        h, w = image.shape[:2]
+
+        # Relative size and position of the crop.
+        size = random_state.uniform(self.min_size, self.max_size)
+        aspect = np.exp(random_state.uniform(-np.log(self.max_aspect_change), np.log(self.max_aspect_change)))
+        crop_w = min(1.0, size * np.sqrt(aspect))
+        crop_h = min(1.0, size / np.sqrt(aspect))
+        crop_x = random_state.uniform(0.0, 1.0 - crop_w)
+        crop_y = random_state.uniform(0.0, 1.0 - crop_h)
+
+        left, top = int(crop_x * w), int(crop_y * h)
+        right, bottom = max(left + 1, int((crop_x + crop_w) * w)), max(top + 1, int((crop_y + crop_h) * h))
+        image = visual.safe_extract(image, left, right, top, bottom)
+
+        # Map the boxes into the crop, using the exact pixel bounds of the crop.
+        crop_bounds = np.array([left / w, top / h, right / w, bottom / h], dtype=np.float32)
+        return image, crop_boxes(boxes, crop_bounds, self.min_visibility)
+
+
+class Letterbox(Augmentation):
+    """ Resize the image to fit inside a fixed (width, height), keeping its aspect ratio, and pad the rest. """
+
+    def __init__(self, size: Tuple[int, int], color=(114, 114, 114)):
+        self.size = size
+        self.color = color
+
+    def apply(self, image, boxes, random_state):
+        h, w = image.shape[:2]
+        canvas_w, canvas_h = self.size
+        scale = min(canvas_w / w, canvas_h / h)
+        new_w, new_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+        left, top = (canvas_w - new_w) // 2, (canvas_h - new_h) // 2
+
+        resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR)
+        canvas = np.empty((canvas_h, canvas_w, 3), dtype=np.uint8)
+        canvas[:] = self.color
+        canvas = visual.safe_implant(canvas, resized, left, left + new_w, top, top + new_h)
+
+        boxes = boxes.copy()
+        boxes[:, _X] = (boxes[:, _X] * new_w + left) / canvas_w
+        boxes[:, _Y] = (boxes[:, _Y] * new_h + top) / canvas_h
+        return canvas, boxes
+
+
+class ColorJitter(Augmentation):
+    """ Randomly change the brightness, contrast and saturation of the image. Boxes are untouched. """
+
+    def __init__(self, brightness: float = 0.2, contrast: float = 0.2, saturation: float = 0.2):
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+
+    def apply(self, image, boxes, random_state):
+        alpha = 1.0 + random_state.uniform(-self.contrast, self.contrast)
+        beta = 255 * random_state.uniform(-self.brightness, self.brightness)
+
+        # Contrast around the mean, then brightness, in a single uint8 pass that saturates at 0 and 255.
+        mean = float(image.mean())
+        image = cv2.addWeighted(image, alpha, np.zeros_like(image), 0.0, beta + mean * (1.0 - alpha))
+
+        saturation = 1.0 + random_state.uniform(-self.saturation, self.saturation)
+        if saturation != 1.0:
+            gray = cv2.cvtColor(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
+            image = cv2.addWeighted(image, saturation, gray, 1.0 - saturation, 0.0)
+
+        return image, boxes
+
+
+# ===================================================================================================
+# Box Array Functions.
+# ===================================================================================================
+
+
+def crop_boxes(boxes: np.array, crop_bounds: np.array, min_visibility: float = 0.25) -> np.array:
+    """ Map the boxes into the crop (left, top, right, bottom, relative to the image). The boxes are clipped
+    to the crop, and the ones with less than min_visibility of their area left are removed. """
+    crop_w = crop_bounds[2] - crop_bounds[0]
+    crop_h = crop_bounds[3] - crop_bounds[1]
+
+    coordinates = boxes[:, [BOX_LEFT, BOX_TOP, BOX_RIGHT, BOX_BOTTOM]]
+    clipped = np.clip(coordinates, crop_bounds[[0, 1, 0, 1]], crop_bounds[[2, 3, 2, 3]])
+
+    area = (coordinates[:, 2] - coordinates[:, 0]) * (coordinates[:, 3] - coordinates[:, 1])
+    clipped_area = (clipped[:, 2] - clipped[:, 0]) * (clipped[:, 3] - clipped[:, 1])
+    visibility = np.divide(clipped_area, area, out=np.zeros_like(area), where=area > 0)
+    keep = (visibility >= min_visibility) & (clipped_area > 0)
+
+    is_cut = np.any(clipped != coordinates, axis=1)
+
+    cropped = boxes[keep].copy()
+    cropped[:, [BOX_LEFT, BOX_TOP, BOX_RIGHT, BOX_BOTTOM]] = \
+        (clipped[keep] - crop_bounds[[0, 1, 0, 1]]) / np.array([crop_w, crop_h, crop_w, crop_h], dtype=np.float32)
+    cropped[is_cut[keep], BOX_IS_TRUNCATED] = 1
+    return cropped
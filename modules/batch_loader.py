@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+"""
+Feed batches of decoded images and box arrays to a training or inference job. The images are decoded in
+background worker processes, and a number of batches are kept in flight ahead of the consumer, so that the
+decoding overlaps with whatever the consumer is doing with the previous batch.
+"""
+
+import multiprocessing
+import time
+from collections import deque
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from modules.augment import Augmentation
+from modules.detect_region import DetectRegion
+from modules.loader import Loader
+from modules.sample import Sample
+from modules.settings import ProjectSettings
+from modules.shared_batch import SharedBatchRing
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+class Batch:
+    def __init__(self):
+        self.index: int = 0
+        self.slot: int = None  # Shared memory slot holding this batch, if shared memory is used.
+        self.keys: List[str] = []
+        self.images: List[np.array] = []  # CV2 images (BGR Format).
+        self.boxes: List[np.array] = []  # Box array for each image (see DetectRegion.to_array).
+        self.box_counts: List[int] = []
+        # (x, y) scale factors of each image relative to its full size: the reduced decode times the final
+        # resize to the batch image size (which includes any size change made by the augmentations). They
+        # differ when the batch image size has another aspect ratio than the image.
+        self.scales: List[Tuple[float, float]] = []
+        self.failed_keys: List[str] = []  # Samples left out of the batch, as their image couldn't be decoded.
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class BatchLoader:
+
+    def __init__(self,
+                 set_indices: List[int],
+                 batch_size: int = 16,
+                 n_workers: int = 4,
+                 prefetch: int = 4,
+                 shuffle: bool = True,
+                 seed: int = 0,
+                 drop_last: bool = False,
+                 max_edge: int = None,
+                 class_codes: Dict[str, int] = None,
+                 image_size: Tuple[int, int] = None,
+                 shared_memory: bool = False,
+                 max_boxes: int = 256,
+                 augmentation: Augmentation = None):
+        """ Load batches from all the downloaded samples in the specified sets.
+        prefetch is the number of batches that are decoded ahead of the consumer.
+        With image_size (width, height), every image is resized to that size. This is required for
+        shared_memory, where the workers write the batches into preallocated shared memory slots. Those
+        batches hold views of the slots, which are only valid until the next batch is requested.
+        The augmentation (see modules.augment) runs in the workers, seeded from the seed, epoch and batch. """
+
+        if shared_memory and image_size is None:
+            raise Exception("Shared memory batches need a fixed image_size.")
+
+        self.batch_size = batch_size
+        self.n_workers = n_workers
+        self.prefetch = max(1, prefetch)
+        self.shuffle = shuffle
+        self.seed = seed
+        self.drop_last = drop_last
+        self.max_edge = max_edge
+        self.class_codes = class_codes
+        self.image_size = image_size
+        self.shared_memory = shared_memory and n_workers > 0
+        self.max_boxes = max_boxes
+        self.augmentation = augmentation
+        self.epoch = 0
+
+        # Throughput stats for the last epoch.
+        self.n_images = 0
+        self.total_time = 0.0
+        self.wait_time = 0.0
+
+        self.samples: List[Sample] = []
+        for set_index in set_indices:
+            self.samples += [s for s in Loader.load_sample_set(set_index) if s.is_locally_loaded]
+
+        self._pool = None
+        self._ring: SharedBatchRing = None
+
+    def __len__(self):
+        """ Number of batches per epoch. """
+        if self.drop_last:
+            return len(self.samples) // self.batch_size
+        return (len(self.samples) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        """ Iterate over one epoch. Each epoch is shuffled with its own seed, so runs are reproducible. """
+        order = np.arange(len(self.samples))
+        if self.shuffle:
+            np.random.RandomState(self.seed + self.epoch).shuffle(order)
+
+        tasks = [self._create_task(order[i * self.batch_size:(i + 1) * self.batch_size], i) for i in range(len(self))]
+        pending = deque()
+        self.n_images = 0
+        self.wait_time = 0.0
+        start_time = time.time()
+
+        for task in tasks:
+            pending.append(self._submit(task))
+            if len(pending) < self.prefetch:
+                continue
+
+            yield self._receive(pending.popleft())
+
+        while len(pending) > 0:
+            yield self._receive(pending.popleft())
+
+        self.total_time = time.time() - start_time
+        self.epoch += 1
+
+    @property
+    def images_per_second(self) -> float:
+        return self.n_images / self.total_time if self.total_time > 0 else 0.0
+
+    def log_stats(self):
+        """ Log the throughput of the last epoch, and how long the consumer spent waiting on the workers. """
+        Logger.log_field("Images Loaded", self.n_images)
+        Logger.log_field("Images/s", "{:.1f}".format(self.images_per_second))
+        wait_percent = 100 * self.wait_time / self.total_time if self.total_time > 0 else 0.0
+        Logger.log_field("I/O Wait", "{:.2f}s ({:.1f}%)".format(self.wait_time, wait_percent))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """ Shut down the worker processes, and release the shared memory. """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+
+    # ===================================================================================================
+    # Support Methods.
+    # ===================================================================================================
+
+    def _create_task(self, indices: np.array, batch_index: int) -> dict:
+        return {
+            "index": batch_index,
+            "samples": [self.samples[i] for i in indices],
+            "max_edge": self.max_edge,
+            "class_codes": self.class_codes,
+            "image_size": self.image_size,
+            "slot": batch_index % self._n_slots if self.shared_memory else None,
+            "augmentation": self.augmentation,
+            "seed": (self.seed * 1000003 + self.epoch * 10007 + batch_index) % (2 ** 32)
+        }
+
+    @property
+    def _n_slots(self) -> int:
+        """ One slot for each batch in flight, plus the one the consumer is reading. """
+        return self.prefetch + 1
+
+    def _submit(self, task: dict):
+        """ Start loading the batch. Without workers, the batch is loaded when it is received instead. """
+        if self.n_workers <= 0:
+            return task
+
+        if self.shared_memory and self._ring is None:
+            self._ring = SharedBatchRing(self._n_slots, self.batch_size, self.image_size, self.max_boxes)
+
+        if self._pool is None:
+            ring_spec = self._ring.spec if self._ring is not None else None
+            self._pool = multiprocessing.Pool(self.n_workers,
+                                              initializer=_init_worker,
+                                              initargs=(ProjectSettings.instance(), ring_spec))
+        return self._pool.apply_async(load_batch, (task,))
+
+    def _receive(self, pending) -> Batch:
+        wait_start = time.time()
+        batch = load_batch(pending) if self.n_workers <= 0 else pending.get()
+        self.wait_time += time.time() - wait_start
+        self.n_images += len(batch)
+
+        # The pixels and boxes were written into shared memory, so hand out views of the slot.
+        if batch.slot is not None:
+            n = len(batch)
+            batch.images = self._ring.images(batch.slot)[:n]
+            slot_boxes = self._ring.boxes(batch.slot)
+            batch.boxes = [slot_boxes[i, :batch.box_counts[i]] for i in range(n)]
+
+        return batch
+
+
+# ===================================================================================================
+# Worker Functions.
+# ===================================================================================================
+
+
+# The shared memory ring, attached once in each worker process.
+_WORKER_RING: SharedBatchRing = None
+
+
+def _init_worker(settings: ProjectSettings, ring_spec: dict = None):
+    """ Share the parent's settings with the worker, instead of loading them from the file again. """
+    global _WORKER_RING
+    ProjectSettings._INSTANCE = settings
+    if ring_spec is not None:
+        _WORKER_RING = SharedBatchRing.attach(ring_spec)
+
+
+def load_batch(task: dict) -> Batch:
+    """ Decode the images and create the box arrays for a batch of samples.
+    If the task has a slot, the images and boxes are written into the shared memory ring instead.
+    A sample whose image can't be decoded is left out, and its key is added to the failed keys. """
+    batch = Batch()
+    batch.index = task["index"]
+    batch.slot = task["slot"]
+    image_size = task["image_size"]
+    augmentation = task["augmentation"]
+    random_state = np.random.RandomState(task["seed"])
+
+    for sample in task["samples"]:
+        try:
+            image, scale = sample.get_image(max_edge=task["max_edge"])
+        except Exception as e:
+            Logger.log_field_red(f"Loading Failed ({sample.key})", e)
+            image = None
+
+        if image is None:
+            batch.failed_keys.append(sample.key)
+            continue
+
+        i = len(batch)
+        boxes = DetectRegion.to_array(sample.detect_regions, task["class_codes"])
+
+        if augmentation is not None:
+            image, boxes = augmentation(image, boxes, random_state)
+
+        # The boxes are relative, so they stay valid when the image is resized.
+        scale_x, scale_y = scale, scale
+        if image_size is not None:
+            scale_x *= image_size[0] / image.shape[1]
+            scale_y *= image_size[1] / image.shape[0]
+            if batch.slot is not None:
+                image = cv2.resize(image, image_size, dst=_WORKER_RING.images(batch.slot)[i],
+                                   interpolation=cv2.INTER_AREA)
+            else:
+                image = cv2.resize(image, image_size, interpolation=cv2.INTER_AREA)
+
+        if batch.slot is not None:
+            boxes = boxes[:_WORKER_RING.max_boxes]
+            _WORKER_RING.boxes(batch.slot)[i, :len(boxes)] = boxes
+        else:
+            batch.images.append(image)
+            batch.boxes.append(boxes)
+
+        batch.keys.append(sample.key)
+        batch.box_counts.append(len(boxes))
+        batch.scales.append((scale_x, scale_y))
+
+    return batch
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+A store for the object crops cut out of the sample images. The encoded crops are kept in an ImagePack,
+and a CSV index next to it records the sample key, box index and class of every crop, so the crops of a
+sample or a class can be found without reading the pack.
+"""
+
+import csv
+import os
+import threading
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from modules.image_pack import ImagePack
+from modules.settings import ProjectSettings
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+class CropEntry:
+    def __init__(self, sample_key: str, box_index: int, class_id: str):
+        self.sample_key = sample_key
+        self.box_index = box_index
+        self.class_id = class_id
+
+    @property
+    def key(self) -> str:
+        """ The key of this crop in the pack. """
+        return CropStore.get_crop_key(self.sample_key, self.box_index)
+
+
+class CropStore:
+
+    INDEX_EXTENSION = ".csv"
+
+    def __init__(self, path: str):
+        """ The path is the base path of the store, without any extension. """
+        self.path = path
+        self.index_path = path + self.INDEX_EXTENSION
+        self.pack = ImagePack.open(path)
+        self.entries: Dict[str, CropEntry] = {}
+        self._lock = threading.Lock()
+        self._load_index()
+
+    @staticmethod
+    def get_set_store_path(set_index: int) -> str:
+        """ Get the base path of the crop store for the specified set index. """
+        return os.path.join(ProjectSettings.instance().OUTPUT_DIRECTORY, "crops", f"set_{set_index}")
+
+    @staticmethod
+    def for_set(set_index: int) -> 'CropStore':
+        return CropStore(CropStore.get_set_store_path(set_index))
+
+    @staticmethod
+    def get_crop_key(sample_key: str, box_index: int) -> str:
+        return f"{sample_key}_{box_index}"
+
+    # ===================================================================================================
+    # Public Interface.
+    # ===================================================================================================
+
+    def __len__(self):
+        return len(self.entries)
+
+    def has_sample(self, sample_key: str, n_boxes: int) -> bool:
+        """ Have all the crops of this sample been stored? They are written in order, so check the last one. """
+        return self.get_crop_key(sample_key, n_boxes - 1) in self.entries
+
+    def write(self, sample_key: str, box_index: int, class_id: str, data: bytes):
+        """ Store the encoded crop image. """
+        entry = CropEntry(sample_key, box_index, class_id)
+        with self._lock:
+            self.pack.write(entry.key, data)
+            with open(self.index_path, "a", newline="") as f:
+                csv.writer(f).writerow([sample_key, box_index, class_id])
+            self.entries[entry.key] = entry
+
+    def read(self, sample_key: str, box_index: int) -> np.array:
+        """ Read and decode the crop image (BGR Format). """
+        data = self.pack.read(self.get_crop_key(sample_key, box_index))
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def get_entries_for_class(self, class_id: str) -> List[CropEntry]:
+        return [e for e in self.entries.values() if e.class_id == class_id]
+
+    def get_class_counts(self) -> List[Tuple[str, int]]:
+        """ Number of crops for each class, most common first. """
+        counts: Dict[str, int] = {}
+        for entry in self.entries.values():
+            counts[entry.class_id] = counts.get(entry.class_id, 0) + 1
+        return sorted(counts.items(), key=lambda kv: kv[1], reverse=True)
+
+    # ===================================================================================================
+    # Support Methods.
+    # ===================================================================================================
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+
+        with open(self.index_path, "r", newline="") as f:
+            for row in csv.reader(f):
+                if len(row) != 3:
+                    continue
+                entry = CropEntry(row[0], int(row[1]), row[2])
+
+                # Only index crops that actually made it into the pack.
+                if entry.key in self.pack:
+                    self.entries[entry.key] = entry
@@ -4,12 +4,31 @@
 A single instance of a detection for an image.
 """
 
+from typing import TYPE_CHECKING, Dict, List
 from tools.util.region import Region
 
+if TYPE_CHECKING:
+    import numpy as np
+
 __author__ = "Jakrin Juangbhanich"
 __email__ = "juangbhanich.k@gmail.com"
 
 
+# Columns of the box arrays created by DetectRegion.to_array. The coordinates are relative to the image size.
+BOX_LEFT = 0
+BOX_TOP = 1
+BOX_RIGHT = 2
+BOX_BOTTOM = 3
+BOX_CLASS = 4  # Class code, or -1 if the class isn't in the code map.
+BOX_CONFIDENCE = 5
+BOX_IS_OCCLUDED = 6
+BOX_IS_TRUNCATED = 7
+BOX_IS_GROUP_OF = 8
+BOX_IS_DEPICTION = 9
+BOX_IS_INSIDE = 10
+BOX_COLUMNS = 11
+
+
 class DetectRegion(Region):
     def __init__(self, left=0, right=0, top=0, bottom=0, force_int: bool = True):
         super().__init__(left, right, top, bottom, force_int)
@@ -54,3 +73,37 @@ class DetectRegion(Region):
         region.is_depiction = int(data["is_depiction"])
         region.is_inside = int(data["is_inside"])
         return region
+
+    # ===================================================================================================
+    # Box Arrays.
+    # ===================================================================================================
+
+    @staticmethod
+    def to_array(regions: List['DetectRegion'], class_codes: Dict[str, int] = None) -> 'np.array':
+        """ Pack the regions into an (N, BOX_COLUMNS) float32 array, so they can be processed all at once.
+        The class IDs are mapped to integer codes with class_codes (see Loader.class_codes). """
+        import numpy as np
+        boxes = np.zeros((len(regions), BOX_COLUMNS), dtype=np.float32)
+        for i, r in enumerate(regions):
+            class_code = class_codes.get(r.class_id, -1) if class_codes is not None else -1
+            boxes[i] = (r.left, r.top, r.right, r.bottom, class_code, r.confidence, r.is_occluded,
+                        r.is_truncated, r.is_group_of, r.is_depiction, r.is_inside)
+        return boxes
+
+    @staticmethod
+    def from_array(boxes: 'np.array', class_ids: List[str] = None) -> List['DetectRegion']:
+        """ Unpack a box array back into regions. class_ids maps the class codes back to class IDs. """
+        regions = []
+        for box in boxes:
+            region = DetectRegion(force_int=False)
+            region.set_rect(float(box[BOX_LEFT]), float(box[BOX_RIGHT]), float(box[BOX_TOP]), float(box[BOX_BOTTOM]))
+            class_code = int(box[BOX_CLASS])
+            region.class_id = class_ids[class_code] if class_ids is not None and class_code >= 0 else None
+            region.confidence = float(box[BOX_CONFIDENCE])
+            region.is_occluded = int(box[BOX_IS_OCCLUDED])
+            region.is_truncated = int(box[BOX_IS_TRUNCATED])
+            region.is_group_of = int(box[BOX_IS_GROUP_OF])
+            region.is_depiction = int(box[BOX_IS_DEPICTION])
+            region.is_inside = int(box[BOX_IS_INSIDE])
+            regions.append(region)
+        return regions
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+"""
+Score detections against the ground truth boxes with the Open Images challenge metric: the average
+precision of each class at an IoU of 0.5, and their mean (mAP).
+
+Following the challenge rules, a detection that doesn't match a regular box, but mostly lies inside a
+group-of box (intersection over the detection's area of at least 0.5) is not a false positive. Instead,
+each group-of box with detections inside it counts as a single true positive, scored by the most
+confident of them. A group-of box without any detections is a missed box, like any other.
+
+The images aren't exhaustively labelled, so with the image-level labels (see load_image_labels), the
+detections of a class that wasn't verified for the image (as present or as absent), and has no boxes
+in it, are ignored rather than counted as false positives. Without them, every image is treated as
+exhaustively labelled, and all such detections are false positives.
+
+Boxes are handled as the arrays made by DetectRegion.to_array (with the class codes of the loader). The
+images are split into chunks that are matched in a process pool, with the overlaps of all the
+detection and box pairs in a chunk computed at once. Only the scores and true positive labels of the
+detections come back, to be sorted and accumulated per class.
+"""
+
+import multiprocessing
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from modules.detect_region import (BOX_BOTTOM, BOX_CLASS, BOX_COLUMNS, BOX_CONFIDENCE, BOX_IS_GROUP_OF, BOX_LEFT,
+                                   BOX_RIGHT, BOX_TOP, DetectRegion)
+from modules.loader import Loader
+from modules.sample import Sample
+from tools.util import metrics
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+IOU_THRESHOLD = 0.5
+
+# Images per task sent to the pool.
+CHUNK_SIZE = 2000
+
+# The (scored classes, scores, true positive labels) of a set of detections.
+ScoredDetections = Tuple[np.array, np.array, np.array]
+
+
+# ===================================================================================================
+# Inputs.
+# ===================================================================================================
+
+
+def get_ground_truth(samples: List[Sample], class_codes: Dict[str, int]) -> Dict[str, np.array]:
+    """ The box array of each sample, by sample key. """
+    return {s.key: DetectRegion.to_array(s.detect_regions, class_codes) for s in samples}
+
+
+def load_image_labels(path: str, class_codes: Dict[str, int],
+                      image_keys: List[str]) -> Tuple[Dict[str, np.array], Dict[str, np.array]]:
+    """ Read the verified image-level labels (ImageID,Source,LabelName,Confidence) of these images.
+    Returns the class codes verified as present (confidence 1) and as absent (confidence 0), by image key.
+    Labels of classes that aren't in class_codes are dropped. """
+    wanted_keys = set(image_keys)
+    positives: Dict[str, List[int]] = {}
+    negatives: Dict[str, List[int]] = {}
+
+    def action(row):
+        code = class_codes.get(row[2], -1)
+        if row[0] in wanted_keys and code >= 0:
+            labels = positives if float(row[3]) > 0 else negatives
+            labels.setdefault(row[0], []).append(code)
+
+    Loader.execute_on_csv(path, action, skip_first_row=True)
+    return ({key: np.array(codes, dtype=np.int64) for key, codes in positives.items()},
+            {key: np.array(codes, dtype=np.int64) for key, codes in negatives.items()})
+
+
+def load_predictions(path: str, class_codes: Dict[str, int]) -> Dict[str, np.array]:
+    """ Read a submission CSV (ImageId,PredictionString, where the prediction string repeats
+    "LabelName Confidence XMin YMin XMax YMax") into a box array per image. Predictions of classes that
+    aren't in class_codes are dropped, since they can't be scored, and so is the incomplete last box of a
+    row that doesn't end on a whole box. """
+    predictions: Dict[str, np.array] = {}
+
+    def action(row):
+        fields = row[1].split()
+        fields = np.array(fields[:len(fields) - len(fields) % 6], dtype=object).reshape(-1, 6)
+        boxes = np.zeros((len(fields), BOX_COLUMNS), dtype=np.float32)
+        boxes[:, BOX_CLASS] = [class_codes.get(class_id, -1) for class_id in fields[:, 0]]
+        boxes[:, BOX_CONFIDENCE] = fields[:, 1].astype(np.float32)
+        boxes[:, [BOX_LEFT, BOX_TOP, BOX_RIGHT, BOX_BOTTOM]] = fields[:, 2:6].astype(np.float32)
+        predictions[row[0]] = boxes[boxes[:, BOX_CLASS] >= 0]
+
+    Loader.execute_on_csv(path, action, skip_first_row=True)
+    return predictions
+
+
+# ===================================================================================================
+# Matching.
+# ===================================================================================================
+
+
+def compute_iou(boxes_a: np.array, boxes_b: np.array) -> np.array:
+    """ The intersection over union of each pair of (left, top, right, bottom) boxes, row by row (or
+    broadcast against each other). """
+    intersection = _compute_intersection(boxes_a, boxes_b)
+    union = _compute_area(boxes_a) + _compute_area(boxes_b) - intersection
+    return intersection / np.maximum(union, 1e-12)
+
+
+def compute_ioa(boxes_a: np.array, boxes_b: np.array) -> np.array:
+    """ The intersection of each pair of boxes, over the area of the box from boxes_a. """
+    return _compute_intersection(boxes_a, boxes_b) / np.maximum(_compute_area(boxes_a), 1e-12)
+
+
+def match_images(ground_truth: List[np.array], predictions: List[np.array],
+                 iou_threshold: float = IOU_THRESHOLD, verified_labels: List[np.array] = None) -> ScoredDetections:
+    """ Match the predictions of each image to the ground truth boxes of the same image and class.
+    Returns the class, score and true positive label of each detection to count: the detections that
+    weren't absorbed by a group-of box, and one entry per detected group-of box. With the verified class
+    codes of each image, the detections of other classes without boxes in the image are left out.
+
+    All the images are matched at once: every detection is paired with every box of its image and
+    class, and the overlaps of all the pairs are computed together. """
+    gt = np.concatenate(ground_truth + [np.zeros((0, BOX_COLUMNS), dtype=np.float32)])
+    pred = np.concatenate(predictions + [np.zeros((0, BOX_COLUMNS), dtype=np.float32)])
+    gt_images = np.repeat(np.arange(len(ground_truth)), [len(g) for g in ground_truth])
+    pred_images = np.repeat(np.arange(len(predictions)), [len(p) for p in predictions])
+
+    # Group the boxes by image and class, with the detections of each group in order of confidence.
+    labels = np.zeros(0, dtype=np.int64)
+    if verified_labels is not None:
+        labels = np.concatenate(verified_labels + [labels]).astype(np.int64)
+    n_codes = int(max(gt[:, BOX_CLASS].max(initial=0), pred[:, BOX_CLASS].max(initial=0), labels.max(initial=0))) + 2
+    gt_groups = gt_images * n_codes + gt[:, BOX_CLASS].astype(np.int64) + 1
+    pred_groups = pred_images * n_codes + pred[:, BOX_CLASS].astype(np.int64) + 1
+
+    # Only score the detections of the classes that were verified for their image, or have boxes in it.
+    if verified_labels is not None:
+        label_images = np.repeat(np.arange(len(verified_labels)), [len(v) for v in verified_labels])
+        verified_groups = np.concatenate([label_images * n_codes + labels + 1, gt_groups])
+        is_verified = np.isin(pred_groups, verified_groups)
+        pred, pred_groups = pred[is_verified], pred_groups[is_verified]
+    gt_order = np.argsort(gt_groups, kind="stable")
+    gt, gt_groups = gt[gt_order], gt_groups[gt_order]
+    pred_order = np.lexsort((-pred[:, BOX_CONFIDENCE], pred_groups))
+    pred, pred_groups = pred[pred_order], pred_groups[pred_order]
+
+    # Pair each detection with each box of its group.
+    starts = np.searchsorted(gt_groups, pred_groups, side="left")
+    counts = np.searchsorted(gt_groups, pred_groups, side="right") - starts
+    pair_detections = np.repeat(np.arange(len(pred)), counts)
+    pair_offsets = np.arange(len(pair_detections)) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_boxes = starts[pair_detections] + pair_offsets
+
+    detection_boxes = pred[:, [BOX_LEFT, BOX_TOP, BOX_RIGHT, BOX_BOTTOM]]
+    gt_boxes = gt[:, [BOX_LEFT, BOX_TOP, BOX_RIGHT, BOX_BOTTOM]]
+    is_group_of = gt[pair_boxes, BOX_IS_GROUP_OF] > 0
+    scores = pred[:, BOX_CONFIDENCE]
+    is_true_positive = np.zeros(len(pred), dtype=bool)
+
+    # Each detection can only match the regular box it overlaps the most. Of the detections that match
+    # a box, the most confident one is the true positive, and the others are duplicates.
+    regular = ~is_group_of
+    iou = compute_iou(detection_boxes[pair_detections[regular]], gt_boxes[pair_boxes[regular]])
+    best_box, best_iou = _get_best_pairs(pair_detections[regular], pair_boxes[regular], iou, len(pred))
+    matched = np.flatnonzero(best_iou >= iou_threshold)
+    _, first_matches = np.unique(best_box[matched], return_index=True)
+    is_true_positive[matched[first_matches]] = True
+
+    # The rest of the detections (duplicates included) are absorbed by the group-of box they lie in most.
+    ioa = compute_ioa(detection_boxes[pair_detections[is_group_of]], gt_boxes[pair_boxes[is_group_of]])
+    best_group, best_ioa = _get_best_pairs(pair_detections[is_group_of], pair_boxes[is_group_of], ioa, len(pred))
+    is_in_group = ~is_true_positive & (best_ioa >= iou_threshold)
+    in_group = np.flatnonzero(is_in_group)
+    _, first_in_groups = np.unique(best_group[in_group], return_index=True)
+    group_detections = in_group[first_in_groups]
+
+    classes = pred[:, BOX_CLASS].astype(np.int64)
+    is_counted = ~is_in_group
+    return (np.concatenate([classes[is_counted], classes[group_detections]]),
+            np.concatenate([scores[is_counted], scores[group_detections]]),
+            np.concatenate([is_true_positive[is_counted], np.ones(len(group_detections), dtype=bool)]))
+
+
+def _get_best_pairs(pair_detections: np.array, pair_boxes: np.array, overlaps: np.array,
+                    n_detections: int) -> Tuple[np.array, np.array]:
+    """ The box with the highest overlap for each detection (the first box on ties), and the overlap.
+    Detections without any pairs get a box of -1 and an overlap of 0. """
+    best_boxes = np.full(n_detections, -1, dtype=np.int64)
+    best_overlaps = np.zeros(n_detections, dtype=np.float32)
+    order = np.lexsort((pair_boxes, -overlaps, pair_detections))
+    detections, firsts = np.unique(pair_detections[order], return_index=True)
+    best_boxes[detections] = pair_boxes[order[firsts]]
+    best_overlaps[detections] = overlaps[order[firsts]]
+    return best_boxes, best_overlaps
+
+
+def _match_chunk(task) -> ScoredDetections:
+    ground_truth, predictions, iou_threshold, verified_labels = task
+    return match_images(ground_truth, predictions, iou_threshold, verified_labels)
+
+
+def _compute_intersection(boxes_a: np.array, boxes_b: np.array) -> np.array:
+    top_left = np.maximum(boxes_a[..., :2], boxes_b[..., :2])
+    bottom_right = np.minimum(boxes_a[..., 2:], boxes_b[..., 2:])
+    size = np.clip(bottom_right - top_left, 0.0, None)
+    return size[..., 0] * size[..., 1]
+
+
+def _compute_area(boxes: np.array) -> np.array:
+    return (boxes[..., 2] - boxes[..., 0]) * (boxes[..., 3] - boxes[..., 1])
+
+
+# ===================================================================================================
+# Average Precision.
+# ===================================================================================================
+
+
+def compute_average_precision(labels: np.array, n_positives: int) -> float:
+    """ The area under the precision/recall curve (with precision made monotonic, as in the challenge) of
+    the true positive labels, ordered by confidence. """
+    if n_positives == 0:
+        return float("nan")
+    if len(labels) == 0:
+        return 0.0
+
+    true_positives = np.cumsum(labels, dtype=np.float64)
+    precision = true_positives / np.arange(1, len(labels) + 1)
+    recall = true_positives / n_positives
+
+    recall = np.concatenate([[0.0], recall, [1.0]])
+    precision = np.concatenate([[0.0], precision, [0.0]])
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    steps = np.flatnonzero(recall[1:] != recall[:-1]) + 1
+    return float(np.sum((recall[steps] - recall[steps - 1]) * precision[steps]))
+
+
+def compute_class_aps(classes: np.array, scores: np.array, labels: np.array,
+                      n_positives: np.array) -> np.array:
+    """ The AP of each class code, from the scored detections of all the images. NaN for the classes
+    without any ground truth boxes. """
+    order = np.lexsort((-scores, classes))
+    classes = classes[order]
+    labels = labels[order]
+
+    n_classes = len(n_positives)
+    bounds = np.searchsorted(classes, np.arange(n_classes + 1))
+    return np.array([compute_average_precision(labels[bounds[c]:bounds[c + 1]], int(n_positives[c]))
+                     for c in range(n_classes)])
+
+
+# ===================================================================================================
+# Evaluation.
+# ===================================================================================================
+
+
+@metrics.timed("evaluation.evaluate")
+def evaluate(ground_truth: Dict[str, np.array], predictions: Dict[str, np.array], n_classes: int,
+             iou_threshold: float = IOU_THRESHOLD, n_workers: int = 4,
+             verified_labels: Dict[str, np.array] = None) -> Tuple[np.array, np.array]:
+    """ Score the predictions of every image in the ground truth (predictions for other images are
+    ignored). With the verified class codes of each image (the image-level labels), the detections of
+    unverified classes are ignored. Returns the AP of each class code, and the number of ground truth
+    boxes of each. """
+    empty = np.zeros((0, BOX_COLUMNS), dtype=np.float32)
+    no_labels = np.zeros(0, dtype=np.int64)
+    keys = list(ground_truth.keys())
+    tasks = [([ground_truth[k] for k in keys[i:i + CHUNK_SIZE]],
+              [predictions.get(k, empty) for k in keys[i:i + CHUNK_SIZE]], iou_threshold,
+              None if verified_labels is None else [verified_labels.get(k, no_labels) for k in keys[i:i + CHUNK_SIZE]])
+             for i in range(0, len(keys), CHUNK_SIZE)]
+
+    if n_workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(n_workers) as pool:
+            results = list(pool.imap_unordered(_match_chunk, tasks))
+    else:
+        results = [_match_chunk(task) for task in tasks]
+
+    classes, scores, labels = (np.concatenate(parts) for parts in zip(*results)) if len(results) > 0 else \
+        match_images([], [], iou_threshold)
+    metrics.count("evaluation.detections", len(scores))
+
+    gt_classes = np.concatenate([gt[:, BOX_CLASS] for gt in ground_truth.values()] + [np.zeros(0)])
+    gt_classes = gt_classes.astype(np.int64)
+    n_positives = np.bincount(gt_classes[gt_classes >= 0], minlength=n_classes)
+    return compute_class_aps(classes, scores, labels, n_positives), n_positives
+
+
+def get_mean_ap(class_aps: np.array) -> float:
+    """ The mean AP over the classes that have ground truth boxes. """
+    valid = ~np.isnan(class_aps)
+    return float(class_aps[valid].mean()) if valid.any() else 0.0
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+The class hierarchy of the challenge (the label hierarchy JSON file), indexed for array operations.
+
+Each class has a compact integer code: the codes of the loader come first, unchanged, so the box arrays
+of the ground truth can be expanded as they are, and the classes that only appear in the hierarchy get
+the codes after those. For every class, the set of its ancestors and the set of its descendants are
+precomputed as bitsets over the class codes (a class counts as its own ancestor and descendant). Only
+the Subcategory relations are followed: a Part of a class is not a kind of that class.
+
+With these, expanding a box to all of its ancestor classes (as the challenge does with the ground truth),
+or counting every box that is some kind of Animal, is a gather over arrays of class codes.
+"""
+
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from modules.detect_region import BOX_CLASS
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+class ClassHierarchy:
+
+    def __init__(self, class_ids: List[str], parents: Dict[str, List[str]]):
+        """ Index the hierarchy given by the parents of each class ID. class_ids are the existing class
+        codes (see Loader.class_ids), which are kept. """
+        known_ids = set(class_ids)
+        self.class_ids: List[str] = list(class_ids) + [c for c in parents if c not in known_ids]
+        self.class_codes: Dict[str, int] = {class_id: i for i, class_id in enumerate(self.class_ids)}
+        self.n_classes = len(self.class_ids)
+
+        # Row i of the ancestor matrix marks the ancestors of class i (and class i itself).
+        ancestor_matrix = np.eye(self.n_classes, dtype=bool)
+        for class_id in self.class_ids:
+            code = self.class_codes[class_id]
+            for ancestor_id in self._get_ancestor_ids(class_id, parents, {}):
+                ancestor_matrix[code, self.class_codes[ancestor_id]] = True
+
+        self.ancestor_bits = np.packbits(ancestor_matrix, axis=1)
+        self.descendant_bits = np.packbits(ancestor_matrix.T, axis=1)
+
+        # The ancestor codes of every class as one flat array, with the start and count of each class in
+        # it. The extra entry at the end is for a code of -1, which "expands" to itself.
+        counts = ancestor_matrix.sum(axis=1)
+        self._ancestor_codes = np.append(np.nonzero(ancestor_matrix)[1], -1)
+        self._ancestor_starts = np.append(np.cumsum(counts) - counts, len(self._ancestor_codes) - 1)
+        self._ancestor_counts = np.append(counts, 1)
+
+    @staticmethod
+    def load(path: str, class_ids: List[str]) -> 'ClassHierarchy':
+        """ Load the hierarchy JSON file. Its root is a placeholder (Entity), not a class. """
+        with open(path, "r") as f:
+            root = json.load(f)
+
+        parents: Dict[str, List[str]] = {}
+
+        def visit(node: dict, parent_id: str):
+            class_id = node["LabelName"]
+            class_parents = parents.setdefault(class_id, [])
+            if parent_id is not None and parent_id not in class_parents:
+                class_parents.append(parent_id)
+            for child in node.get("Subcategory", []):
+                visit(child, class_id)
+
+        for node in root.get("Subcategory", []):
+            visit(node, None)
+        return ClassHierarchy(class_ids, parents)
+
+    @staticmethod
+    def _get_ancestor_ids(class_id: str, parents: Dict[str, List[str]], found: Dict[str, bool]) -> Dict[str, bool]:
+        for parent_id in parents.get(class_id, []):
+            if parent_id not in found:
+                found[parent_id] = True
+                ClassHierarchy._get_ancestor_ids(parent_id, parents, found)
+        return found
+
+    # ===================================================================================================
+    # Single Classes.
+    # ===================================================================================================
+
+    def get_ancestor_mask(self, code: int) -> np.array:
+        """ A bool per class code: is it an ancestor of this class (or the class itself)? """
+        return np.unpackbits(self.ancestor_bits[code], count=self.n_classes).astype(bool)
+
+    def get_descendant_mask(self, code: int) -> np.array:
+        """ A bool per class code: is it a descendant of this class (or the class itself)? """
+        return np.unpackbits(self.descendant_bits[code], count=self.n_classes).astype(bool)
+
+    def get_ancestors(self, code: int) -> np.array:
+        return np.flatnonzero(self.get_ancestor_mask(code))
+
+    def get_descendants(self, code: int) -> np.array:
+        return np.flatnonzero(self.get_descendant_mask(code))
+
+    # ===================================================================================================
+    # Class Code Arrays.
+    # ===================================================================================================
+
+    def is_kind_of(self, codes: np.array, ancestor_code: int) -> np.array:
+        """ For each class code, is it the ancestor class or one of its descendants? Codes of -1 are not. """
+        codes = np.asarray(codes, dtype=np.int64)
+        mask = np.append(self.get_descendant_mask(ancestor_code), False)
+        return mask[codes]
+
+    def expand(self, codes: np.array) -> Tuple[np.array, np.array]:
+        """ Expand each class code into the codes of the class and all of its ancestors. Returns the index
+        of the code each expanded code came from, and the expanded codes. Codes of -1 are kept as they are. """
+        codes = np.asarray(codes, dtype=np.int64)
+        counts = self._ancestor_counts[codes]
+
+        # Each code is repeated once per ancestor, and the repeats read the ancestors in turn.
+        sources = np.repeat(np.arange(len(codes)), counts)
+        positions = np.repeat(self._ancestor_starts[codes] - (np.cumsum(counts) - counts), counts) + \
+            np.arange(len(sources))
+        return sources, self._ancestor_codes[positions]
+
+    def expand_boxes(self, boxes: np.array) -> np.array:
+        """ Copy each row of the box array (see DetectRegion.to_array) once for its class and once for
+        each ancestor class, with the class code changed. """
+        sources, expanded = self.expand(boxes[:, BOX_CLASS])
+        expanded_boxes = boxes[sources]
+        expanded_boxes[:, BOX_CLASS] = expanded
+        return expanded_boxes
+
+    def count(self, codes: np.array) -> np.array:
+        """ The number of codes of each class or any of its descendants (e.g. every box that is some kind
+        of Animal counts for Animal). Codes of -1 aren't counted. """
+        codes = np.asarray(codes, dtype=np.int64)
+        class_counts = np.bincount(codes[codes >= 0], minlength=self.n_classes)
+        descendant_matrix = np.unpackbits(self.descendant_bits, axis=1, count=self.n_classes)
+        return descendant_matrix.astype(np.int64) @ class_counts
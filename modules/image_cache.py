@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+A process-wide cache for decoded sample images. Decoding a JPEG is far more expensive than looking it up,
+so images that are touched repeatedly (visualization, notebooks, training loops) are kept in memory up to
+a byte budget, and the least recently used images are evicted first.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Hashable, Iterable, Set
+
+from modules.settings import ProjectSettings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+class ImageCache:
+
+    # Singleton instance.
+    _INSTANCE = None
+    _INSTANCE_LOCK = threading.Lock()
+
+    @staticmethod
+    def instance() -> 'ImageCache':
+        """ Singleton Access. The budget is read from IMAGE_CACHE_SIZE_MB in the project settings. """
+        if ImageCache._INSTANCE is None:
+            with ImageCache._INSTANCE_LOCK:
+                if ImageCache._INSTANCE is None:
+                    max_bytes = ProjectSettings.instance().IMAGE_CACHE_SIZE_MB * 1024 * 1024
+                    ImageCache._INSTANCE = ImageCache(max_bytes)
+        return ImageCache._INSTANCE
+
+    def __init__(self, max_bytes: int = 0):
+        self.max_bytes: int = max_bytes
+        self.n_bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        self._images: OrderedDict = OrderedDict()
+        self._extensions: Dict[tuple, Set[tuple]] = {}  # The cached tuple keys that extend each shorter tuple.
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def stats(self) -> dict:
+        """ Counters to help tune the size of the cache. """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._images),
+                "bytes": self.n_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+    def get(self, key: Hashable) -> 'np.array':
+        """ Get the cached image for this key, or None if it isn't cached. """
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key: Hashable, image: 'np.array') -> 'np.array':
+        """ Add the image to the cache, evicting the least recently used images until it fits.
+        The cached image is shared by everyone who reads it, so a read-only view of it is cached (the
+        caller's array is left writable, but must not be changed). Returns the cached view, or the image
+        itself if it doesn't fit. """
+        if image is None or image.nbytes > self.max_bytes:
+            return image
+
+        cached_image = image.view()
+        cached_image.flags.writeable = False
+
+        with self._lock:
+            if key in self._images:
+                self._remove(key)
+
+            while self._images and self.n_bytes + image.nbytes > self.max_bytes:
+                self._remove(next(iter(self._images)))
+                self.evictions += 1
+
+            self._images[key] = cached_image
+            self.n_bytes += cached_image.nbytes
+            if isinstance(key, tuple):
+                for n in range(1, len(key)):
+                    self._extensions.setdefault(key[:n], set()).add(key)
+
+        return cached_image
+
+    def evict(self, keys: Iterable[Hashable]):
+        """ Remove the images for these keys, e.g. after the stored image data changed. A tuple key also
+        removes the entries whose keys extend it, so (set_index, key) covers every reduced size of the
+        sample image as well. """
+        with self._lock:
+            for key in keys:
+                if key in self._images:
+                    self._remove(key)
+                for extended_key in list(self._extensions.get(key, ())):
+                    self._remove(extended_key)
+
+    def clear(self):
+        """ Remove all the images from the cache. The counters are kept. """
+        with self._lock:
+            self._images.clear()
+            self._extensions.clear()
+            self.n_bytes = 0
+
+    def _remove(self, key: Hashable):
+        """ Drop the entry for this key, which must be cached. Call with the lock held. """
+        self.n_bytes -= self._images.pop(key).nbytes
+        if isinstance(key, tuple):
+            for n in range(1, len(key)):
+                extensions = self._extensions[key[:n]]
+                extensions.discard(key)
+                if not extensions:
+                    del self._extensions[key[:n]]
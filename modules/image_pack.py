@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+An append-only container for many small encoded images. Instead of storing every sample image as its
+own file (millions of inodes at Open Images scale), the raw bytes are appended to a single '.pack' file
+and their offsets are appended to a plain-text '.index' file next to it. Reading an image back is then
+just one seek and one read.
+"""
+
+import os
+import threading
+from typing import Callable, Dict, List, Tuple
+
+from modules.image_cache import ImageCache
+from modules.settings import ProjectSettings
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+class ImagePack:
+
+    DATA_EXTENSION = ".pack"
+    INDEX_EXTENSION = ".index"
+    INDEX_DELIMITER = "\t"
+
+    # Open packs, shared by every sample (and thread) that uses them.
+    _INSTANCES: Dict[str, 'ImagePack'] = {}
+    _INSTANCES_LOCK = threading.Lock()
+
+    def __init__(self, path: str):
+        """ The path is the base path of the pack, without any extension. """
+        self.path = path
+        self.data_path = path + self.DATA_EXTENSION
+        self.index_path = path + self.INDEX_EXTENSION
+        self.set_index: int = None
+
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._read_fd: int = None
+        self._load_index()
+
+    @staticmethod
+    def get_set_pack_path(set_index: int) -> str:
+        """ Get the base path of the pack for the specified set index. """
+        return os.path.join(
+            ProjectSettings.instance().STORAGE_DIRECTORY,
+            "sample_packs",
+            f"set_{set_index}")
+
+    @staticmethod
+    def for_set(set_index: int) -> 'ImagePack':
+        """ Get the shared pack instance for the specified set index. """
+        pack = ImagePack.open(ImagePack.get_set_pack_path(set_index))
+        pack.set_index = set_index
+        return pack
+
+    @staticmethod
+    def open(path: str) -> 'ImagePack':
+        """ Get the shared pack instance for the specified base path. """
+        with ImagePack._INSTANCES_LOCK:
+            if path not in ImagePack._INSTANCES:
+                ImagePack._INSTANCES[path] = ImagePack(path)
+            return ImagePack._INSTANCES[path]
+
+    # ===================================================================================================
+    # Public Interface.
+    # ===================================================================================================
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @property
+    def keys(self) -> List[str]:
+        return list(self._offsets.keys())
+
+    def read(self, key: str) -> bytes:
+        """ Read the raw bytes stored for this key. The read doesn't use the file position (which a
+        forked process shares with its parent), so the pack can be read from pool workers as well. """
+        with self._lock:
+            offset, length = self._offsets[key]
+            if self._read_fd is None:
+                self._read_fd = os.open(self.data_path, os.O_RDONLY)
+            return os.pread(self._read_fd, length, offset)
+
+    def write(self, key: str, data: bytes):
+        """ Append the data to the pack. If the key already exists, the newer entry will be used. """
+        with self._lock:
+            os.makedirs(os.path.dirname(self.data_path) or ".", exist_ok=True)
+
+            with open(self.data_path, "ab") as f:
+                offset = f.tell()
+                f.write(data)
+
+            # The index is only written once the data is safely in the pack.
+            with open(self.index_path, "a") as f:
+                f.write(f"{key}{self.INDEX_DELIMITER}{offset}{self.INDEX_DELIMITER}{len(data)}\n")
+
+            self._offsets[key] = (offset, len(data))
+
+    def rewrite(self, transform: Callable[[str, bytes], bytes]):
+        """ Rewrite every entry of the pack through the transform function. The new data is written into
+        a fresh pack which then replaces this one, so replaced entries don't leave dead bytes behind.
+        If anything fails, the fresh pack is removed and this one is left as it was. The decoded images of
+        a set's pack are evicted from the image cache, since they may have changed. """
+        new_path = self.path + "_rewrite"
+        self._remove_pack_files(new_path)
+
+        new_pack = ImagePack(new_path)
+        try:
+            for key in self.keys:
+                new_pack.write(key, transform(key, self.read(key)))
+        except BaseException:
+            new_pack.close()
+            self._remove_pack_files(new_path)
+            raise
+
+        # Swap the files and offsets under one lock, so no read can mix the old file with the new offsets.
+        with self._lock:
+            self._close_read_fd()
+            os.replace(new_pack.data_path, self.data_path)
+            os.replace(new_pack.index_path, self.index_path)
+            self._offsets = new_pack._offsets
+
+        if self.set_index is not None:
+            ImageCache.instance().evict((self.set_index, key) for key in self._offsets)
+
+    def close(self):
+        """ Release the read handle. The pack can still be used afterwards. """
+        with self._lock:
+            self._close_read_fd()
+
+    # ===================================================================================================
+    # Support Methods.
+    # ===================================================================================================
+
+    def _close_read_fd(self):
+        if self._read_fd is not None:
+            os.close(self._read_fd)
+            self._read_fd = None
+
+    def _remove_pack_files(self, path: str):
+        for file_path in (path + self.DATA_EXTENSION, path + self.INDEX_EXTENSION):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def _load_index(self):
+        """ Read the offsets of all the entries in this pack. """
+        if not os.path.exists(self.index_path):
+            return
+
+        with open(self.index_path, "r") as f:
+            for line in f:
+
+                # A partially written line (from an interrupted write) is ignored.
+                if not line.endswith("\n"):
+                    continue
+
+                fields = line.rstrip("\n").split(self.INDEX_DELIMITER)
+                if len(fields) != 3:
+                    continue
+
+                self._offsets[fields[0]] = (int(fields[1]), int(fields[2]))
@@ -7,13 +7,12 @@ Use this to load, save, and display images, samples, and labels.
 import csv
 import json
 import os
-import urllib.request
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 from modules.detect_region import DetectRegion
 from modules.sample import Sample
 from modules.settings import ProjectSettings
-from tools.util import pather
+from tools.util import metrics, pather
 from tools.util.logger import Logger
 
 __author__ = "Jakrin Juangbhanich"
@@ -24,6 +23,9 @@ class Loader:
 
     def __init__(self):
         self.label_map: Dict[str, str] = {}
+        self.class_codes: Dict[str, int] = {}  # Compact integer code for each class ID, in label file order.
+        self.class_ids: List[str] = []  # Class ID for each class code.
+        self._palette = None
 
     # ===================================================================================================
     # Labels.
@@ -36,9 +38,26 @@ class Loader:
             label_map[row[0]] = row[1]
 
         self.execute_on_csv(path, action)
-        self.label_map = label_map
+        self.set_labels(label_map)
         return self.label_map
 
+    def set_labels(self, label_map: Dict[str, str]):
+        """ Use this label map, and build the class codes and the color palette from it. """
+        self.label_map = label_map
+        self.class_ids = list(label_map.keys())
+        self.class_codes = {class_id: i for i, class_id in enumerate(self.class_ids)}
+        self._palette = None
+
+    @property
+    def palette(self):
+        """ A (N + 1, 3) uint8 table with the color of each class code. The extra row at the end is the
+        color of a class code of -1 (unknown). Built on first use. """
+        if self._palette is None:
+            from tools.util import visual
+            self._palette = visual.generate_palette(len(self.class_ids) + 1, saturation=0.8, hue_offset=0.35,
+                                                    hue_range=0.5)
+        return self._palette
+
     def get_label(self, key: str, upper: bool=True) -> str:
         if key in self.label_map:
             label = self.label_map[key]
@@ -47,6 +66,10 @@ class Loader:
             return label
         return key
 
+    def get_color(self, key: str) -> Tuple[int, int, int]:
+        """ The palette color of this class ID. The same class always gets the same color. """
+        return tuple(self.palette[self.class_codes.get(key, -1)].tolist())
+
     # ===================================================================================================
     # Samples.
     # ===================================================================================================
@@ -74,6 +97,11 @@ class Loader:
 
         return samples
 
+    @staticmethod
+    def save_sample_set(samples: List[Sample], set_index: int):
+        """ Write the sample set back to its file, e.g. after the samples' meta-data has changed. """
+        Loader._write_samples(samples, ProjectSettings.instance().SAMPLES_DIRECTORY, set_index)
+
     def create_samples(self, path) -> Dict[str, Sample]:
         """ Create samples from the rows in the image URL CSV. """
         samples: Dict[str, Sample] = {}
@@ -88,6 +116,7 @@ class Loader:
         Logger.log_field("Samples Loaded", len(samples))
         return samples
 
+    @metrics.timed("loader.associate_boxes")
     def associate_boxes_with_samples(self, samples: Dict[str, Sample], path: str):
         """ Create the detection meta-data for each sample. """
         def action(row):
@@ -138,14 +167,16 @@ class Loader:
         file_name = f"sample_set_{index}.json"
         file_path = os.path.join(path, file_name)
 
-        sample_objects = [s.encode() for s in samples]
-        sample_data = {
-            "set_index": index,
-            "samples": sample_objects
-        }
+        with metrics.timed("loader.encode_samples"):
+            sample_objects = [s.encode() for s in samples]
+            sample_data = {
+                "set_index": index,
+                "samples": sample_objects
+            }
 
-        with open(file_path, "w") as f:
+        with metrics.timed("loader.write_samples"), open(file_path, "w") as f:
             json.dump(sample_data, f, ensure_ascii=False, indent=2)
+        metrics.count("loader.samples_written", len(samples))
 
     # ===================================================================================================
     # Misc. Support Methods.
@@ -168,6 +199,7 @@ class Loader:
                     if response == "y":
                         print("Loading, please wait! (The file is pretty big so this could take a while...)")
                         pather.create(path)
+                        import urllib.request
                         urllib.request.urlretrieve(remote_url, path)
                         Logger.log_field("Successfully Loaded", path)
 
@@ -181,7 +213,7 @@ class Loader:
     @staticmethod
     def execute_on_csv(path: str, action: classmethod, skip_first_row: bool = False):
         """ Run a specified action on each row of the CSV file. """
-        with open(path) as f:
+        with metrics.timed("loader.csv"), open(path) as f:
 
             row_count = sum(1 for _ in f)
             f.seek(0)
@@ -197,3 +229,5 @@ class Loader:
                     continue
 
                 action(row)
+
+            metrics.count("loader.csv_rows", row_count)
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+"""
+A columnar store for large prediction files. A submission CSV (ImageId,PredictionString) is read in a
+single streaming pass, a chunk of boxes at a time, and its boxes are written as numpy column files: the
+corners, class codes and confidences. The boxes are sorted by image (and by confidence within each
+image), and an offsets column marks where each image starts, so the predictions of any image are a
+slice of the memory-mapped columns.
+
+The image codes are the positions of the samples in the sample sets the store was made for, and the
+class codes are those of the loader, so the boxes line up with the ground truth box arrays (see
+DetectRegion.to_array). Predictions for other images or unknown classes are dropped.
+"""
+
+import json
+import os
+import shutil
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from modules.detect_region import (BOX_BOTTOM, BOX_CLASS, BOX_COLUMNS, BOX_CONFIDENCE, BOX_LEFT, BOX_RIGHT, BOX_TOP,
+                                   DetectRegion)
+from modules.settings import ProjectSettings
+from tools.util import metrics
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+class PredictionStore:
+
+    INDEX_FILE = "index.json"
+
+    # Column name: dtype and number of values per box.
+    COLUMNS = {
+        "images": (np.int32, 1),
+        "classes": (np.int32, 1),
+        "confidences": (np.float32, 1),
+        "boxes": (np.float32, 4),  # Left, top, right, bottom.
+    }
+
+    # Boxes parsed before they are written out.
+    CHUNK_SIZE = 1000000
+
+    def __init__(self, path: str):
+        """ Open the store in the directory at this path. The columns are memory-mapped, not read. """
+        self.path = path
+        with open(os.path.join(path, self.INDEX_FILE), "r") as f:
+            index = json.load(f)
+        self.image_keys: List[str] = index["image_keys"]
+        self.class_ids: List[str] = index["class_ids"]
+        self.image_codes: Dict[str, int] = {key: i for i, key in enumerate(self.image_keys)}
+
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.classes = np.load(os.path.join(path, "classes.npy"), mmap_mode="r")
+        self.confidences = np.load(os.path.join(path, "confidences.npy"), mmap_mode="r")
+        self.boxes = np.load(os.path.join(path, "boxes.npy"), mmap_mode="r")
+
+    @staticmethod
+    def get_store_path(name: str) -> str:
+        """ Get the path of the named store in the output directory. """
+        return os.path.join(ProjectSettings.instance().OUTPUT_DIRECTORY, "predictions", name)
+
+    # ===================================================================================================
+    # Public Interface.
+    # ===================================================================================================
+
+    def __len__(self):
+        """ The number of boxes. """
+        return len(self.classes)
+
+    def __contains__(self, key: str):
+        return key in self.image_codes
+
+    def get_range(self, key: str) -> Tuple[int, int]:
+        """ The start and end of the image's boxes in the columns. """
+        code = self.image_codes.get(key)
+        if code is None:
+            return 0, 0
+        return int(self.offsets[code]), int(self.offsets[code + 1])
+
+    def get_boxes(self, key: str, min_confidence: float = 0.0) -> np.array:
+        """ The predictions for this image as a box array (see DetectRegion.to_array), most confident first. """
+        start, end = self.get_range(key)
+        if min_confidence > 0.0:
+            # The boxes are sorted by confidence, so the ones to keep come first.
+            end = start + int(np.count_nonzero(self.confidences[start:end] >= min_confidence))
+
+        boxes = np.zeros((end - start, BOX_COLUMNS), dtype=np.float32)
+        boxes[:, [BOX_LEFT, BOX_TOP, BOX_RIGHT, BOX_BOTTOM]] = self.boxes[start:end]
+        boxes[:, BOX_CLASS] = self.classes[start:end]
+        boxes[:, BOX_CONFIDENCE] = self.confidences[start:end]
+        return boxes
+
+    def get_regions(self, key: str, min_confidence: float = 0.0) -> List[DetectRegion]:
+        """ The predictions for this image as regions, e.g. to draw with Sample.get_visualized_image. """
+        return DetectRegion.from_array(self.get_boxes(key, min_confidence), self.class_ids)
+
+    def get(self, key: str, default: np.array = None) -> np.array:
+        """ The box array of the image, like a dictionary of box arrays by image key. """
+        return self.get_boxes(key) if key in self.image_codes else default
+
+    # ===================================================================================================
+    # Ingestion.
+    # ===================================================================================================
+
+    @staticmethod
+    @metrics.timed("predictions.ingest")
+    def ingest(csv_path: str, path: str, image_keys: List[str], class_ids: List[str]) -> 'PredictionStore':
+        """ Build a store at the path from the submission CSV. image_keys and class_ids give the codes of
+        the images and classes (the sample keys of the sets, and Loader.class_ids). The store is built in a
+        temporary directory that only replaces any old store at the path once it is complete. """
+        build_path = path + "_build"
+        if os.path.exists(build_path):
+            shutil.rmtree(build_path)
+        os.makedirs(build_path)
+
+        try:
+            n_boxes, n_dropped = PredictionStore._build(csv_path, build_path, image_keys, class_ids)
+        except BaseException:
+            shutil.rmtree(build_path, ignore_errors=True)
+            raise
+
+        # Swap the new store in, and only then delete the old one.
+        old_path = path + "_old"
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(build_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+        metrics.count("predictions.boxes", n_boxes)
+        Logger.log_field("Boxes Stored", n_boxes)
+        Logger.log_field("Boxes Dropped", n_dropped)
+        return PredictionStore(path)
+
+    @staticmethod
+    def _build(csv_path: str, path: str, image_keys: List[str], class_ids: List[str]) -> Tuple[int, int]:
+        """ Write the columns and index of a store into the (empty) directory at the path. Returns the
+        number of boxes stored and dropped. """
+        image_codes = {key: i for i, key in enumerate(image_keys)}
+        class_codes = {class_id: i for i, class_id in enumerate(class_ids)}
+        n_images = len(image_keys)
+
+        # First pass: parse the CSV into unsorted column files, and count the boxes of each image.
+        raw_files = {name: open(PredictionStore._get_raw_path(path, name), "wb") for name in PredictionStore.COLUMNS}
+        counts = np.zeros(n_images, dtype=np.int64)
+        n_dropped = 0
+        progress = Logger.create_progress(os.path.getsize(csv_path), header="Bytes Read")
+
+        try:
+            with open(csv_path, "rb") as f:
+                for images, counts_per_row, labels, values, n_malformed in \
+                        PredictionStore._read_chunks(f, image_codes, progress):
+                    n_dropped += n_malformed
+                    images = np.repeat(np.array(images, dtype=np.int32), counts_per_row)
+                    classes = np.array([class_codes.get(label, -1) for label in labels], dtype=np.int32)
+                    values = np.array(values, dtype=np.float32).reshape(-1, 5)
+
+                    keep = (images >= 0) & (classes >= 0)
+                    n_dropped += len(keep) - int(np.count_nonzero(keep))
+                    images, classes, values = images[keep], classes[keep], values[keep]
+                    counts += np.bincount(images, minlength=n_images)
+
+                    # The values are "Confidence XMin YMin XMax YMax".
+                    images.tofile(raw_files["images"])
+                    classes.tofile(raw_files["classes"])
+                    np.ascontiguousarray(values[:, 0]).tofile(raw_files["confidences"])
+                    np.ascontiguousarray(values[:, 1:]).tofile(raw_files["boxes"])
+        finally:
+            for raw_file in raw_files.values():
+                raw_file.close()
+
+        # Second pass: move each box to its image's place in the final columns, a chunk at a time.
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        PredictionStore._sort_by_image(path, offsets)
+        PredictionStore._sort_by_confidence(path, offsets)
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+
+        with open(os.path.join(path, PredictionStore.INDEX_FILE), "w") as f:
+            json.dump({"image_keys": image_keys, "class_ids": class_ids, "n_dropped": n_dropped}, f)
+        return int(offsets[-1]), n_dropped
+
+    @staticmethod
+    def _read_chunks(f, image_codes: Dict[str, int], progress):
+        """ Yield the rows in chunks of about CHUNK_SIZE boxes, as (image code of each row, number of boxes
+        in each row, class ID of each box, the other values of each box as strings, number of incomplete
+        boxes that were dropped). A row that doesn't end on a whole box has its last, incomplete box
+        dropped, so the labels stay in line with the values. """
+        images, counts, labels, values = [], [], [], []
+        n_malformed = 0
+        n_bytes = 0
+        for line in f:
+            n_bytes += len(line)
+            image_key, _, prediction_string = line.decode("utf-8").rstrip("\r\n").partition(",")
+            fields = prediction_string.split()
+            if len(fields) == 0 or image_key == "ImageId":
+                continue
+
+            if len(fields) % 6 != 0:
+                del fields[len(fields) - len(fields) % 6:]
+                n_malformed += 1
+
+            labels += fields[0::6]
+            del fields[0::6]
+            values += fields
+            images.append(image_codes.get(image_key, -1))
+            counts.append(len(fields) // 5)
+
+            if len(labels) >= PredictionStore.CHUNK_SIZE:
+                progress.update(n_bytes)
+                n_bytes = 0
+                yield images, counts, labels, values, n_malformed
+                images, counts, labels, values = [], [], [], []
+                n_malformed = 0
+
+        progress.update(n_bytes)
+        if len(labels) > 0 or n_malformed > 0:
+            yield images, counts, labels, values, n_malformed
+
+    @staticmethod
+    def _sort_by_image(path: str, offsets: np.array):
+        """ Scatter the unsorted column files into the final column files, so each image's boxes are
+        together. Each image has a counter of how many of its boxes have been placed so far. """
+        n_boxes = int(offsets[-1])
+        raw = {name: PredictionStore._open_column(PredictionStore._get_raw_path(path, name), name, n_boxes, "r")
+               for name in PredictionStore.COLUMNS}
+        columns = {name: PredictionStore._open_column(os.path.join(path, f"{name}.npy"), name, n_boxes, "w+")
+                   for name in PredictionStore.COLUMNS if name != "images"}
+
+        placed = offsets[:-1].copy()
+        for start in range(0, n_boxes, PredictionStore.CHUNK_SIZE):
+            end = min(start + PredictionStore.CHUNK_SIZE, n_boxes)
+            images = np.asarray(raw["images"][start:end])
+            order = np.argsort(images, kind="stable")
+            sorted_images = images[order]
+
+            # The place of each box: after the boxes of its image from earlier chunks and earlier in this one.
+            rank = np.arange(len(order)) - np.searchsorted(sorted_images, sorted_images, side="left")
+            places = placed[sorted_images] + rank
+            for name, column in columns.items():
+                column[places] = np.asarray(raw[name][start:end])[order]
+            placed += np.bincount(images, minlength=len(placed))
+
+        for column in columns.values():
+            if isinstance(column, np.memmap):
+                column.flush()
+        del raw, columns
+        for name in PredictionStore.COLUMNS:
+            os.remove(PredictionStore._get_raw_path(path, name))
+
+    @staticmethod
+    def _sort_by_confidence(path: str, offsets: np.array):
+        """ Sort the boxes of each image by confidence (highest first), a block of whole images at a time. """
+        if offsets[-1] == 0:
+            return
+
+        columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r+")
+                   for name in PredictionStore.COLUMNS if name != "images"}
+        n_images = len(offsets) - 1
+        first_image = 0
+        while first_image < n_images:
+            # Take whole images up to about CHUNK_SIZE boxes (at least one image).
+            last_image = int(np.searchsorted(offsets, offsets[first_image] + PredictionStore.CHUNK_SIZE,
+                                             side="right")) - 1
+            last_image = min(max(last_image, first_image + 1), n_images)
+            start, end = int(offsets[first_image]), int(offsets[last_image])
+
+            images = np.repeat(np.arange(first_image, last_image), np.diff(offsets[first_image:last_image + 1]))
+            order = np.lexsort((-np.asarray(columns["confidences"][start:end]), images))
+            for column in columns.values():
+                column[start:end] = np.asarray(column[start:end])[order]
+            first_image = last_image
+
+        for column in columns.values():
+            column.flush()
+
+    @staticmethod
+    def _open_column(file_path: str, name: str, n_boxes: int, mode: str) -> np.array:
+        """ Memory-map a column file: a raw one (read only) or a new .npy one. Numpy can't map empty
+        files, so an empty column is an ordinary (and for .npy, saved) array. """
+        dtype, width = PredictionStore.COLUMNS[name]
+        shape = (n_boxes, width) if width > 1 else (n_boxes,)
+        if n_boxes == 0:
+            column = np.zeros(shape, dtype=dtype)
+            if mode == "w+":
+                np.save(file_path, column)
+            return column
+        if mode == "r":
+            return np.memmap(file_path, dtype=dtype, mode="r", shape=shape)
+        return np.lib.format.open_memmap(file_path, mode="w+", dtype=dtype, shape=shape)
+
+    @staticmethod
+    def _get_raw_path(path: str, name: str) -> str:
+        return os.path.join(path, f"_{name}.raw")
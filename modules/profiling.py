@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+The --profile option of the commands. With --profile cpu, the command runs under cProfile, and with
+--profile memory, under tracemalloc. The profile is written into the profiles folder of the output
+directory (a .prof file for snakeviz/pstats, or a tracemalloc snapshot), and the top functions or
+allocation sites are logged. Only the main process is profiled, not the pool workers.
+"""
+
+import argparse
+import os
+import time
+from typing import Callable
+
+from modules.settings import ProjectSettings
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+PROFILE_MODES = ["cpu", "memory"]
+
+# How many hotspots or allocation sites to log.
+N_TOP_ENTRIES = 20
+
+# Seconds between checks for a new memory high.
+PEAK_CHECK_INTERVAL = 0.5
+
+
+def add_argument(parser: argparse.ArgumentParser):
+    parser.add_argument("--profile", default=None, choices=PROFILE_MODES,
+                        help="Profile the CPU time or memory allocations of this command.")
+
+
+def run(function: Callable, args, name: str):
+    """ Run the command function with its args, profiled if args.profile is set. """
+    mode = getattr(args, "profile", None)
+    if mode == "cpu":
+        return _run_cpu_profile(function, args, name)
+    if mode == "memory":
+        return _run_memory_profile(function, args, name)
+    return function(args)
+
+
+def get_profile_path(name: str, extension: str) -> str:
+    """ A new file path in the profiles folder of the output directory. """
+    directory = os.path.join(ProjectSettings.instance().OUTPUT_DIRECTORY, "profiles")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, "{}_{}{}".format(name, time.strftime("%Y%m%d_%H%M%S"), extension))
+
+
+# ===================================================================================================
+# Profilers.
+# ===================================================================================================
+
+
+def _run_cpu_profile(function: Callable, args, name: str):
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return function(args)
+    finally:
+        profiler.disable()
+        path = get_profile_path(name, ".prof")
+        profiler.dump_stats(path)
+
+        Logger.log_special("CPU Profile (by cumulative time)", with_gap=True)
+        stats = pstats.Stats(profiler)
+        entries = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)
+        for (file_name, line, function_name), (_, n_calls, total_time, cumulative_time, _) in \
+                entries[:N_TOP_ENTRIES]:
+            location = "{} ({}:{})".format(function_name, os.path.basename(file_name), line)
+            Logger.log_field(location, "{:.3f}s cumulative, {:.3f}s own, {} calls".format(
+                cumulative_time, total_time, n_calls))
+        Logger.log_field("Profile Saved", path)
+
+
+def _run_memory_profile(function: Callable, args, name: str):
+    import threading
+    import tracemalloc
+
+    # Snapshot the allocations whenever the traced memory reaches a new high, so the reported sites
+    # are the ones that make up the peak (by the end of the command, most of it has been freed).
+    largest = {"size": 0, "snapshot": None}
+    is_done = threading.Event()
+
+    def watch():
+        while not is_done.wait(PEAK_CHECK_INTERVAL):
+            size = tracemalloc.get_traced_memory()[0]
+            if size > largest["size"] * 1.1:
+                largest["snapshot"] = tracemalloc.take_snapshot()
+                largest["size"] = size
+
+    tracemalloc.start()
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        return function(args)
+    finally:
+        is_done.set()
+        watcher.join()
+        current_size, peak_size = tracemalloc.get_traced_memory()
+        if largest["snapshot"] is None:
+            largest["snapshot"] = tracemalloc.take_snapshot()
+            largest["size"] = current_size
+        tracemalloc.stop()
+
+        snapshot = largest["snapshot"]
+        path = get_profile_path(name, ".tracemalloc")
+        snapshot.dump(path)
+
+        Logger.log_special("Memory Profile (by allocated size)", with_gap=True)
+        Logger.log_field("Peak Traced Memory", "{:.1f} MB".format(peak_size / 1e6))
+        Logger.log_field("Still Allocated", "{:.1f} MB".format(current_size / 1e6))
+        Logger.log_field("Snapshot Taken At", "{:.1f} MB".format(largest["size"] / 1e6))
+        for stat in snapshot.statistics("lineno")[:N_TOP_ENTRIES]:
+            frame = stat.traceback[0]
+            location = "{}:{}".format(os.path.basename(frame.filename), frame.lineno)
+            Logger.log_field(location, "{:.1f} KB in {} blocks".format(stat.size / 1e3, stat.count))
+        Logger.log_field("Snapshot Saved", path)
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+"""
+Render the visualized sample images in parallel. Each render is identified by a hash of everything that
+goes into the picture (the boxes, their labels and colors, and the drawing style), and the hashes of the finished
+renders are kept in a manifest next to the output images. A render whose hash hasn't changed since
+the last run is skipped, so after a label fix only the affected images are drawn again.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import cv2
+import numpy as np
+
+from modules.loader import Loader
+from modules.sample import Sample
+from modules.settings import ProjectSettings
+from tools.util import metrics, visual
+from tools.util.logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+# Bump this whenever the drawing code changes, so the old renders are replaced.
+STYLE_VERSION = 2
+
+MANIFEST_FILE = ".render_manifest"
+
+# The manifest is rewritten with only the latest hash of each image once it has more than this many
+# lines per image, so re-rendering the same images again and again doesn't keep growing it.
+MANIFEST_MAX_LINES_PER_ENTRY = 2
+
+
+def get_render_hash(sample: Sample, loader: Loader, style: dict) -> str:
+    """ A hash of the boxes, labels, colors and style that make up the sample's visualization. The colors
+    follow the class codes, so a label file with the classes in another order changes them too. """
+    regions = [r.encode() for r in sample.detect_regions]
+    labels = sorted((class_id, loader.label_map.get(class_id, class_id), loader.get_color(class_id))
+                    for class_id in {r.class_id for r in sample.detect_regions})
+    content = json.dumps([STYLE_VERSION, style, sample.width, sample.height, regions, labels], sort_keys=True)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def load_manifest(directory: str) -> Dict[str, str]:
+    """ Read the render hash of every finished image in the directory, and compact the manifest if it
+    has too many replaced lines. """
+    manifest = {}
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return manifest
+
+    n_lines = 0
+    with open(path, "r") as f:
+        for line in f:
+            n_lines += 1
+            fields = line.rstrip("\n").split("\t")
+            if line.endswith("\n") and len(fields) == 2:
+                manifest[fields[0]] = fields[1]
+
+    if n_lines > MANIFEST_MAX_LINES_PER_ENTRY * max(1, len(manifest)):
+        compact_manifest(directory, manifest)
+    return manifest
+
+
+def compact_manifest(directory: str, manifest: Dict[str, str]):
+    """ Replace the manifest with one line per image. The new file is written next to it and then moved
+    into place, so an interrupted compaction never loses the manifest. """
+    path = os.path.join(directory, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        for key, render_hash in manifest.items():
+            f.write(f"{key}\t{render_hash}\n")
+    os.replace(path + ".tmp", path)
+
+
+def append_manifest(directory: str, entries: List[Tuple[str, str]]):
+    """ Record the hashes of newly finished images. Later lines replace earlier ones. """
+    with open(os.path.join(directory, MANIFEST_FILE), "a") as f:
+        for key, render_hash in entries:
+            f.write(f"{key}\t{render_hash}\n")
+
+
+def find_outdated(samples: List[Sample], directory: str, loader: Loader, style: dict,
+                  force: bool = False) -> List[Tuple[Sample, str]]:
+    """ Find the samples whose render is missing or out of date, paired with their new render hash. """
+    manifest = load_manifest(directory)
+    if force:
+        manifest = {}
+    outdated = []
+    for sample in samples:
+        render_hash = get_render_hash(sample, loader, style)
+        image_path = os.path.join(directory, f"{sample.key}.jpg")
+        if manifest.get(sample.key) != render_hash or not os.path.exists(image_path):
+            outdated.append((sample, render_hash))
+    return outdated
+
+
+def render_parallel(jobs: List[Tuple[Sample, str, str]], label_map: Dict[str, str], style: dict,
+                    n_workers: int = 4) -> Iterator[Tuple[Sample, str, str]]:
+    """ Render and write each (sample, render hash, output directory) job in a process pool.
+    The finished jobs are yielded as soon as their image is written, in whatever order they finish.
+    Jobs that failed are yielded with a render hash of None. """
+    with multiprocessing.Pool(n_workers, initializer=_init_worker,
+                              initargs=(ProjectSettings.instance(), label_map, style)) as pool:
+        for job in pool.imap_unordered(_render_job, jobs, chunksize=4):
+            yield job
+
+
+def render_contact_sheets(sheets: List[Tuple[List[Sample], str]], label_map: Dict[str, str], style: dict,
+                          n_workers: int = 4) -> Iterator[Tuple[str, bool]]:
+    """ Render each (samples, sheet path) job into a contact sheet in a process pool. The style needs the
+    'columns', 'rows' and 'cell_size' of the grid. Yields the sheet path, and whether it was rendered
+    (False if it was already up to date). Each sheet is written as a JPEG, with a JSON index next to it
+    that maps the grid cells back to the sample keys. """
+    with multiprocessing.Pool(n_workers, initializer=_init_worker,
+                              initargs=(ProjectSettings.instance(), label_map, style)) as pool:
+        for result in pool.imap_unordered(_render_sheet_job, sheets):
+            yield result
+
+
+def create_contact_sheet(samples: List[Sample], loader: Loader, columns: int, rows: int,
+                         cell_size: int, background=(40, 40, 40)) -> (np.array, List[dict]):
+    """ Tile the visualized samples into a grid of cell_size squares. Each sample is decoded at reduced
+    resolution, and its boxes and labels are drawn at thumbnail scale. Returns the sheet, and an index
+    entry (row, column, key and set index) for each cell. A sample that fails to render leaves its
+    cell empty, and is marked as failed in the index. """
+    sheet = np.empty((rows * cell_size, columns * cell_size, 3), dtype=np.uint8)
+    sheet[:] = background
+    cells = []
+
+    for i, sample in enumerate(samples[:columns * rows]):
+        row, column = divmod(i, columns)
+        cell = {"row": row, "column": column, "key": sample.key, "set_index": sample.set_index}
+        cells.append(cell)
+        try:
+            thumbnail = sample.get_visualized_image(label_map_function=loader.get_label, max_edge=cell_size,
+                                                    color_map_function=loader.get_color)
+        except Exception:
+            cell["failed"] = True
+            continue
+
+        # Center the thumbnail in its cell.
+        h, w = thumbnail.shape[:2]
+        top = row * cell_size + (cell_size - h) // 2
+        left = column * cell_size + (cell_size - w) // 2
+        visual.safe_implant(sheet, thumbnail, left, left + w, top, top + h)
+
+    return sheet, cells
+
+
+# ===================================================================================================
+# Worker Functions.
+# ===================================================================================================
+
+
+_WORKER_LOADER: Loader = None
+_WORKER_STYLE: dict = None
+
+
+def _init_worker(settings: ProjectSettings, label_map: Dict[str, str], style: dict):
+    global _WORKER_LOADER, _WORKER_STYLE
+    ProjectSettings._INSTANCE = settings
+    _WORKER_LOADER = Loader()
+    _WORKER_LOADER.set_labels(label_map)
+    _WORKER_STYLE = style
+
+
+def _render_job(job: Tuple[Sample, str, str]) -> Tuple[Sample, str, str]:
+    """ Render the sample and write it out. The render hash is returned as None if it failed. """
+    sample, render_hash, directory = job
+    try:
+        image = sample.get_visualized_image(label_map_function=_WORKER_LOADER.get_label,
+                                            max_edge=_WORKER_STYLE.get("max_edge"),
+                                            color_map_function=_WORKER_LOADER.get_color)
+        cv2.imwrite(os.path.join(directory, f"{sample.key}.jpg"), image)
+    except Exception as e:
+        Logger.log_field_red(f"Render Failed ({sample.key})", e)
+        metrics.count("render.failed")
+        return sample, None, directory
+    return job
+
+
+def _render_sheet_job(job: Tuple[List[Sample], str]) -> Tuple[str, bool]:
+    """ Render a contact sheet and write it out along with its index, unless the index shows that an
+    identical sheet has already been rendered. A sheet with failed cells gets no hash in its index (only
+    the failure count), so it is rendered again on the next run. """
+    samples, path = job
+    index_path = path + ".json"
+    sheet_hash = hashlib.sha1("".join(s.key + get_render_hash(s, _WORKER_LOADER, _WORKER_STYLE)
+                                      for s in samples).encode("utf-8")).hexdigest()
+
+    # An index that can't be read (e.g. cut short by a crash) just means the sheet is drawn again.
+    if os.path.exists(index_path) and os.path.exists(path + ".jpg"):
+        try:
+            with open(index_path, "r") as f:
+                if json.load(f).get("hash") == sheet_hash:
+                    return path, False
+        except (OSError, ValueError):
+            pass
+
+    columns, rows, cell_size = _WORKER_STYLE["columns"], _WORKER_STYLE["rows"], _WORKER_STYLE["cell_size"]
+    sheet, cells = create_contact_sheet(samples, _WORKER_LOADER, columns, rows, cell_size)
+    cv2.imwrite(path + ".jpg", sheet)
+
+    n_failed = sum(1 for cell in cells if cell.get("failed"))
+    index = {"hash": sheet_hash if n_failed == 0 else None, "n_failed": n_failed,
+             "columns": columns, "rows": rows, "cell_size": cell_size, "cells": cells}
+    with open(index_path, "w") as f:
+        json.dump(index, f, indent=2)
+    return path, True
@@ -2,60 +2,238 @@
 
 """
 A training/testing image sample.
+
+The image libraries (cv2, numpy, PIL) and the drawing modules are only imported by the methods that
+need them, so code that only reads and writes sample meta-data starts up quickly.
 """
 
+import io
 import os
 import shutil
-import urllib.request
-from typing import List
-import cv2
+import zlib
+from typing import TYPE_CHECKING, List
 from modules.detect_region import DetectRegion
+from modules.image_cache import ImageCache
+from modules.image_pack import ImagePack
 from modules.settings import ProjectSettings
-from tools.util import pather, visual
+from tools.util import jpeg, metrics, pather
 from tools.util.logger import Logger
 from tools.util.region import Region
 
+if TYPE_CHECKING:
+    import numpy as np
+
 __author__ = "Jakrin Juangbhanich"
 __email__ = "juangbhanich.k@gmail.com"
 
 
 class Sample:
 
+    # Names of the cv2 decode flags that shrink a JPEG while it is being decoded, by reduce factor.
+    REDUCED_DECODE_FLAGS = {
+        2: "IMREAD_REDUCED_COLOR_2",
+        4: "IMREAD_REDUCED_COLOR_4",
+        8: "IMREAD_REDUCED_COLOR_8"
+    }
+
     def __init__(self):
         self.key: str = ""  # Unique ID for this image.
         self.set_index: int = None  # Index of the set this sample belongs to.
         self.remote_path: str = ""
         self.detect_regions: List[DetectRegion] = []
+        self.width: int = None  # Size of the stored image, read from its header.
+        self.height: int = None
+        self.original_width: int = None  # Size of the image on the server, if it was transcoded.
+        self.original_height: int = None
         self._local_path = None
 
     @property
     def is_locally_loaded(self):
         """ Has the image for this sample been downloaded locally? """
+        if self._is_packed:
+            return self.key in ImagePack.for_set(self.set_index)
         return os.path.exists(self._local_image_path)
 
+    @metrics.timed("sample.load")
     def load(self):
         """ Load the image for this sample into the designated storage file."""
-        Logger.log_field("Loading Image", self.key)
+        import urllib.request
         try:
-            pather.create(self._local_image_path)
-            urllib.request.urlretrieve(self.remote_path, self._local_image_path)
+            with metrics.timed("sample.download"), urllib.request.urlopen(self.remote_path) as response:
+                data = response.read()
+            metrics.count("sample.bytes_downloaded", len(data))
+
+            settings = ProjectSettings.instance()
+            if settings.MAX_IMAGE_EDGE > 0:
+                data = self.transcode_image_data(data, settings.MAX_IMAGE_EDGE, settings.JPEG_QUALITY)
+            else:
+                self._set_size_from_data(data)
+
+            self.store_image_data(data)
         except Exception as e:
-            Logger.log_field("Loading Failed", e)
-        Logger.log_field("Loading Complete", self.key)
+            Logger.log_field_red(f"Loading Failed ({self.key})", e)
+            metrics.count("sample.load_failed")
+
+    def transcode_image_data(self, data: bytes, max_edge: int, quality: int = 90) -> bytes:
+        """ Shrink the encoded image so that its biggest edge is at most max_edge, and record the original
+        size on this sample. Images that already fit are returned untouched, to avoid re-encoding losses,
+        and so is data that can't be decoded. """
+        import cv2
+        import numpy as np
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            Logger.log_field_red(f"Transcode Failed ({self.key})", "Could not decode the image data.")
+            metrics.count("sample.transcode_failed")
+            return data
+
+        h, w = image.shape[:2]
+
+        if self.original_width is None:
+            self.original_width = w
+            self.original_height = h
+
+        self.width = w
+        self.height = h
+        if max(w, h) <= max_edge:
+            return data
+
+        # The detect regions are relative to the image size, so they remain valid after resizing.
+        scale = max_edge / max(w, h)
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        self.width, self.height = size
+        _, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return encoded.tobytes()
+
+    def read_image_data(self) -> bytes:
+        """ Read the encoded image data from the storage for this sample's set. """
+        if self._is_packed:
+            return ImagePack.for_set(self.set_index).read(self.key)
+
+        with open(self._local_image_path, "rb") as f:
+            return f.read()
+
+    def store_image_data(self, data: bytes):
+        """ Write the encoded image data into the storage for this sample's set, and evict the old decoded
+        image from the image cache. """
+        if self._is_packed:
+            ImagePack.for_set(self.set_index).write(self.key, data)
+        else:
+            pather.create(self._local_image_path)
+            with open(self._local_image_path, "wb") as f:
+                f.write(data)
+
+        ImageCache.instance().evict([(self.set_index, self.key)])
 
     @property
+    @metrics.timed("sample.image")
     def image(self):
-        """ Get the CV2 image for this sample (BGR Format). """
+        """ Get the CV2 image for this sample (BGR Format).
+        If the image cache is enabled, the returned image is shared with every other reader and read-only,
+        so copy it before drawing on it (get_visualized_image draws on its own copy). """
+        return self._get_cached_image((self.set_index, self.key), self._decode_image)
+
+    def get_image(self, max_edge: int = None, scale: float = None) -> ('np.array', float):
+        """ Get the CV2 image for this sample, shrunk to the scale or so its biggest edge fits max_edge.
+        JPEG images are decoded at a reduced resolution, so the full image is never decoded.
+        Returns the image and its scale factor relative to the full size image. Like Sample.image, the
+        image is read-only if the image cache is enabled. """
+        if max_edge is None and scale is None:
+            return self.image, 1.0
+
+        width, height = self.read_image_size()
+        target_scale = 1.0 if scale is None else scale
+        if max_edge is not None:
+            target_scale = min(target_scale, max_edge / max(width, height))
+
+        if target_scale >= 1.0:
+            return self.image, 1.0
+
+        target_size = (max(1, int(round(width * target_scale))), max(1, int(round(height * target_scale))))
+
+        def decode_reduced():
+            import cv2
+
+            # Pick the biggest reduction that still decodes at least as many pixels as we need.
+            reduce_factor = 1
+            for factor in self.REDUCED_DECODE_FLAGS:
+                if target_scale <= 1.0 / factor:
+                    reduce_factor = max(reduce_factor, factor)
+
+            reduced_image = self._decode_image(reduce_factor)
+            if (reduced_image.shape[1], reduced_image.shape[0]) != target_size:
+                reduced_image = cv2.resize(reduced_image, target_size, interpolation=cv2.INTER_AREA)
+            return reduced_image
+
+        image = self._get_cached_image((self.set_index, self.key, target_size), decode_reduced)
+        return image, image.shape[1] / width
+
+    def _get_cached_image(self, cache_key: tuple, decode_function: classmethod):
+        """ Get the image from the image cache if it is enabled, otherwise decode it. """
+        cache = ImageCache.instance()
+        if not cache.enabled:
+            return decode_function()
+
+        image = cache.get(cache_key)
+        if image is None:
+            image = cache.put(cache_key, decode_function())
+        return image
+
+    def _decode_image(self, reduce_factor: int = 1):
+        """ Read and decode the image for this sample from its storage.
+        With a reduce factor of 2, 4 or 8, the JPEG is decoded straight to that fraction of its size. """
         if not self.is_locally_loaded:
             self.load()
 
+        import cv2
+        import numpy as np
+        flags = getattr(cv2, self.REDUCED_DECODE_FLAGS.get(reduce_factor, "IMREAD_COLOR"))
+
+        if self._is_packed:
+            data = self.read_image_data()
+            return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
         try:
-            return cv2.imread(self._local_image_path)
+            return cv2.imread(self._local_image_path, flags)
         except Exception as e:
             Logger.log_field(f"Error Loading Image {self.key}", e)
             os.remove(self._local_image_path)
             exit(1)
 
+    def read_image_size(self) -> (int, int):
+        """ Get the (width, height) of the stored image. Unless it is already known, it is read
+        from the JPEG header, without decoding any pixels. """
+        if self.width is None or self.height is None:
+            if not self.is_locally_loaded:
+                self.load()
+
+            if self._is_packed:
+                self._set_size_from_data(self.read_image_data())
+            else:
+                try:
+                    self.width, self.height = jpeg.read_jpeg_size_from_path(self._local_image_path)
+                except ValueError:
+                    from PIL import Image
+                    with Image.open(self._local_image_path) as pil_image:
+                        self.width, self.height = pil_image.size
+
+        return self.width, self.height
+
+    def _set_size_from_data(self, data: bytes):
+        """ Record the image size from the header of the encoded image data. """
+        try:
+            self.width, self.height = jpeg.read_jpeg_size(data)
+        except ValueError:
+            # Not a JPEG (or a damaged one), so let PIL figure out the format.
+            from PIL import Image
+            with Image.open(io.BytesIO(data)) as pil_image:
+                self.width, self.height = pil_image.size
+
+    @property
+    def _is_packed(self) -> bool:
+        """ Is this sample's image stored in a pack file, rather than as a loose file? """
+        return ProjectSettings.instance().USE_IMAGE_PACKS
+
     @property
     def _local_image_path(self):
         """ Get the local image path for this sample. """
@@ -77,11 +255,24 @@ class Sample:
     # Visualization.
     # ===================================================================================================
 
+    @metrics.timed("sample.visualize")
     def get_visualized_image(self,
                              detect_regions: List[DetectRegion]=None,
-                             label_map_function: classmethod=None):
-        """ Draw the bounding boxes and labels for the detected regions."""
-        image = self.image
+                             label_map_function: classmethod=None,
+                             max_edge: int=None,
+                             scale: float=None,
+                             color_map_function: classmethod=None):
+        """ Draw the bounding boxes and labels for the detected regions.
+        Use max_edge or scale to draw onto a reduced resolution image (e.g. for previews).
+        Pass a color_map_function (like Loader.get_color) to color the classes from the loader's palette.
+        Otherwise each class gets a palette color picked by a hash of its class ID, which is the same in every
+        image, but not the loader's color. """
+        from tools.util import text, visual
+
+        if color_map_function is None:
+            color_map_function = Sample._get_class_color
+
+        image, image_scale = self.get_image(max_edge=max_edge, scale=scale)
         w = image.shape[1]
         h = image.shape[0]
 
@@ -95,14 +286,15 @@ class Sample:
         # Create a color map for all the labels.
         for region in detect_regions:
             label = label_map_function(region.class_id) if label_map_function is not None else region.class_id
-            color_map[label] = None
+            color_map[label] = color_map_function(region.class_id)
 
-        colors = visual.generate_colors(len(color_map), saturation=0.8, hue_offset=0.35, hue_range=0.5)
+        # Line and label sizes are scaled along with the image.
+        thickness = max(1, int(round(4 * image_scale)))
+        shadow_thickness = max(1, int(round(10 * image_scale)))
+        font_size = max(8, int(round(20 * image_scale)))
 
-        i = 0
-        for key in color_map.keys():
-            color_map[key] = colors[i]
-            i += 1
+        pixel_regions = []
+        region_colors = []
 
         for region in detect_regions:
 
@@ -118,9 +310,8 @@ class Sample:
             class_label = label_map_function(region.class_id) if label_map_function is not None else region.class_id
             color = color_map[class_label]
 
-            # Draw the bounding boxes.
-            image = visual.draw_regions(image, [pixel_region], color=(0, 0, 0), thickness=10, strength=0.3)
-            image = visual.draw_regions(image, [pixel_region], color=color, thickness=4, overlay=True)
+            pixel_regions.append(pixel_region)
+            region_colors.append(color)
 
             # Tag the label.
             if class_label not in class_label_regions:
@@ -128,15 +319,24 @@ class Sample:
             elif class_label_regions[class_label].width < pixel_region.width:
                 class_label_regions[class_label] = pixel_region
 
-        # Draw the rest of the labels on.
+        # Draw all the bounding boxes (and their shadows) in one pass.
+        image = visual.draw_region_outlines(image, pixel_regions, region_colors, thickness=thickness,
+                                            shadow_thickness=shadow_thickness, shadow_strength=0.3)
+
+        # Draw the rest of the labels on. The image is already our own copy, so they are drawn in place.
         for label, region in class_label_regions.items():
-            label_inside = region.top <= 30
-            from tools.util import text
-            image = text.label_region(image, label, region, color=color_map[label],
-                                      bg_opacity=0.7, overlay=True, font_size=20, inside=label_inside)
+            label_inside = region.top <= font_size + 10
+            image = text.label_region(image, label, region, color=color_map[label], bg_opacity=0.7, overlay=True,
+                                      font_size=font_size, inside=label_inside, in_place=True)
 
         return image
 
+    @staticmethod
+    def _get_class_color(class_id: str) -> (int, int, int):
+        from tools.util import visual
+        return visual.get_palette_color(zlib.crc32(class_id.encode("utf-8")), saturation=0.8, hue_offset=0.35,
+                                        hue_range=0.5)
+
     # ===================================================================================================
     # Serialization.
     # ===================================================================================================
@@ -151,6 +351,14 @@ class Sample:
             "detect_regions": region_data
         }
 
+        if self.width is not None:
+            data["width"] = self.width
+            data["height"] = self.height
+
+        if self.original_width is not None:
+            data["original_width"] = self.original_width
+            data["original_height"] = self.original_height
+
         return data
 
     @staticmethod
@@ -161,4 +369,8 @@ class Sample:
         sample.key = data["key"]
         sample.remote_path = data["remote_path"]
         sample.detect_regions = [DetectRegion.decode(d) for d in data["detect_regions"]]
+        sample.width = data.get("width")
+        sample.height = data.get("height")
+        sample.original_width = data.get("original_width")
+        sample.original_height = data.get("original_height")
         return sample
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+The state that commands share when several of them run in the same process (see cli.py): the project
+settings, the loader with its labels, the class hierarchy, and the sample sets that have already been
+read. Each of these is loaded on first use and then reused by the following jobs. The image packs and
+the image cache are already process-wide, so they are reused as well.
+"""
+
+import os
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from modules.loader import Loader
+from modules.sample import Sample
+from modules.settings import ProjectSettings
+from tools.util import metrics
+from tools.util.logger import Logger
+
+if TYPE_CHECKING:
+    from modules.hierarchy import ClassHierarchy
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+class Session:
+
+    _INSTANCE = None
+
+    @staticmethod
+    def instance() -> 'Session':
+        """ Singleton Access. """
+        if Session._INSTANCE is None:
+            Session("settings.yaml")
+        return Session._INSTANCE
+
+    def __init__(self, settings_path: str):
+        Session._INSTANCE = self
+        self.settings: ProjectSettings = ProjectSettings(settings_path)
+
+        # Log where the time went when the command (or batch) is done.
+        metrics_file = self.settings.METRICS_FILE
+        metrics.Metrics.instance().enable_exit_report(None if metrics_file == "NONE" else metrics_file)
+        self._loader: Loader = None
+        self._hierarchy: 'ClassHierarchy' = None
+        self._sample_sets: Dict[int, Tuple[float, List[Sample]]] = {}  # Set index: (file time, samples).
+
+    @property
+    def loader(self) -> Loader:
+        """ A loader with the labels already loaded. """
+        if self._loader is None:
+            self._loader = Loader()
+            self._loader.load_labels(self.settings.LABELS_FILE)
+        return self._loader
+
+    @property
+    def hierarchy(self) -> 'ClassHierarchy':
+        """ The class hierarchy, with the class codes of the loader. None if there is no hierarchy file. """
+        if self._hierarchy is None and self.settings.HIERARCHY_FILE != "NONE":
+            if not os.path.exists(self.settings.HIERARCHY_FILE):
+                Logger.log_field_red("Hierarchy File Missing", self.settings.HIERARCHY_FILE)
+                return None
+
+            from modules.hierarchy import ClassHierarchy
+            self._hierarchy = ClassHierarchy.load(self.settings.HIERARCHY_FILE, self.loader.class_ids)
+        return self._hierarchy
+
+    def load_sample_set(self, set_index: int) -> List[Sample]:
+        """ Load a sample set by index. It is only read again if its file has changed since. """
+        path = self._get_sample_set_path(set_index)
+        if not os.path.exists(path):
+            return Loader.load_sample_set(set_index)  # Raises the usual error.
+
+        modified_time = os.path.getmtime(path)
+        cached = self._sample_sets.get(set_index)
+        if cached is not None and cached[0] == modified_time:
+            return cached[1]
+
+        samples = Loader.load_sample_set(set_index)
+        self._sample_sets[set_index] = (modified_time, samples)
+        return samples
+
+    def save_sample_set(self, samples: List[Sample], set_index: int):
+        """ Write the sample set back to its file, and keep these samples as the loaded set. """
+        Loader.save_sample_set(samples, set_index)
+        self._sample_sets[set_index] = (os.path.getmtime(self._get_sample_set_path(set_index)), samples)
+
+    def clear_sample_sets(self):
+        """ Forget the loaded sample sets, e.g. after they have been created again. """
+        self._sample_sets.clear()
+
+    def _get_sample_set_path(self, set_index: int) -> str:
+        return os.path.join(self.settings.SAMPLES_DIRECTORY, f"sample_set_{set_index}.json")
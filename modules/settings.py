@@ -28,9 +28,23 @@ class ProjectSettings(Settings):
         self.LABELS_FILE = "NONE"
         self.GROUND_TRUTH_FILE = "NONE"
         self.IMAGE_URL_FILE = "NONE"
+        self.HIERARCHY_FILE = "NONE"  # The label hierarchy JSON file (NONE if it isn't used).
 
         self.OUTPUT_DIRECTORY = "NONE"
         self.SAMPLES_DIRECTORY = "NONE"
         self.STORAGE_DIRECTORY = "NONE"
 
+        # Store the sample images in one pack file per set, instead of one file per image.
+        self.USE_IMAGE_PACKS = False
+
+        # Shrink downloaded images so their biggest edge fits this size (0 keeps the original).
+        self.MAX_IMAGE_EDGE = 0
+        self.JPEG_QUALITY = 90
+
+        # Memory budget for keeping decoded images in memory (0 disables the cache).
+        self.IMAGE_CACHE_SIZE_MB = 0
+
+        # Append the timing metrics of each run to this JSON lines file (NONE only logs them at exit).
+        self.METRICS_FILE = "NONE"
+
         self.load(path)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""
+A ring of preallocated batch slots in shared memory. The decode workers write the pixels and box arrays of
+a batch straight into a slot, and the consumer reads them back as numpy views of the same memory, so the
+decoded images are never pickled and copied between the processes.
+"""
+
+from multiprocessing import shared_memory
+from typing import Dict, Tuple
+
+import numpy as np
+
+from modules.detect_region import BOX_COLUMNS
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+class SharedBatchRing:
+
+    def __init__(self, n_slots: int, batch_size: int, image_size: Tuple[int, int], max_boxes: int,
+                 spec: dict = None):
+        """ Create the ring of n_slots batches, each holding batch_size images of image_size (width, height)
+        with up to max_boxes boxes per image. With a spec (from another ring), attach to its memory instead. """
+        self.n_slots = n_slots
+        self.batch_size = batch_size
+        self.image_size = image_size
+        self.max_boxes = max_boxes
+        self._is_owner = spec is None
+
+        width, height = image_size
+        self._shapes: Dict[str, tuple] = {
+            "images": (n_slots, batch_size, height, width, 3),
+            "boxes": (n_slots, batch_size, max_boxes, BOX_COLUMNS)
+        }
+        self._dtypes: Dict[str, type] = {
+            "images": np.uint8,
+            "boxes": np.float32
+        }
+
+        self._memory: Dict[str, shared_memory.SharedMemory] = {}
+        self._arrays: Dict[str, np.array] = {}
+
+        for name, shape in self._shapes.items():
+            if self._is_owner:
+                n_bytes = int(np.prod(shape)) * np.dtype(self._dtypes[name]).itemsize
+                memory = shared_memory.SharedMemory(create=True, size=n_bytes)
+            else:
+                memory = shared_memory.SharedMemory(name=spec["names"][name])
+
+            self._memory[name] = memory
+            self._arrays[name] = np.ndarray(shape, dtype=self._dtypes[name], buffer=memory.buf)
+
+    @property
+    def spec(self) -> dict:
+        """ Everything another process needs to attach to this ring. """
+        return {
+            "n_slots": self.n_slots,
+            "batch_size": self.batch_size,
+            "image_size": self.image_size,
+            "max_boxes": self.max_boxes,
+            "names": {name: memory.name for name, memory in self._memory.items()}
+        }
+
+    @staticmethod
+    def attach(spec: dict) -> 'SharedBatchRing':
+        """ Attach to a ring created by another process. """
+        return SharedBatchRing(spec["n_slots"], spec["batch_size"], tuple(spec["image_size"]), spec["max_boxes"],
+                               spec=spec)
+
+    def images(self, slot: int) -> np.array:
+        """ View of the (batch_size, height, width, 3) images in the slot. """
+        return self._arrays["images"][slot]
+
+    def boxes(self, slot: int) -> np.array:
+        """ View of the (batch_size, max_boxes, BOX_COLUMNS) box arrays in the slot. """
+        return self._arrays["boxes"][slot]
+
+    def close(self):
+        """ Release the memory. The owner also removes it from the system. """
+        self._arrays.clear()
+        for memory in self._memory.values():
+            memory.close()
+            if self._is_owner:
+                memory.unlink()
+        self._memory.clear()
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+"""
+Helpers for the command line arguments that several commands share.
+"""
+
+from typing import List
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+def get_set_indices(args) -> List[int]:
+    """ The sample sets chosen with --set_index, or with a --set_range like 0:10 (end not included). """
+    if args.set_range is None:
+        return [args.set_index]
+    start, end = args.set_range.split(":")
+    return list(range(int(start), int(end)))
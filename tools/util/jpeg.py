@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""
+Read the size of a JPEG image straight from its header, without decoding any of the pixels.
+The width and height live in the SOF (start of frame) segment, which comes before the image data.
+"""
+
+import struct
+from typing import BinaryIO, Tuple
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+# Every SOFn marker holds the frame size, except these (which share the same range).
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Markers that stand alone, without a length field.
+_STANDALONE_MARKERS = set(range(0xD0, 0xD8)) | {0x01, 0xD8}
+
+
+def read_jpeg_size(data: bytes) -> Tuple[int, int]:
+    """ Get the (width, height) of the encoded JPEG image data. """
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("Data is not a JPEG image.")
+
+    i = 2
+    n = len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            raise ValueError(f"Invalid JPEG marker at byte {i}.")
+
+        marker = data[i + 1]
+
+        # Fill bytes before a marker.
+        if marker == 0xFF:
+            i += 1
+            continue
+
+        if marker in _STANDALONE_MARKERS:
+            i += 2
+            continue
+
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if marker in _SOF_MARKERS:
+            if i + 9 > n:
+                break
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+
+        i += 2 + length
+
+    raise ValueError("No frame header found in the JPEG data.")
+
+
+def read_jpeg_size_from_file(f: BinaryIO) -> Tuple[int, int]:
+    """ Get the (width, height) of a JPEG file, reading only the header segments and seeking past the rest. """
+    if f.read(2) != b"\xff\xd8":
+        raise ValueError("File is not a JPEG image.")
+
+    while True:
+        byte = f.read(1)
+        if not byte:
+            break
+
+        if byte != b"\xff":
+            raise ValueError(f"Invalid JPEG marker at byte {f.tell() - 1}.")
+
+        # Skip any fill bytes before the marker.
+        marker = f.read(1)
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            break
+
+        marker = marker[0]
+        if marker in _STANDALONE_MARKERS:
+            continue
+
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            break
+
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker in _SOF_MARKERS:
+            frame_header = f.read(5)
+            if len(frame_header) < 5:
+                break
+            height, width = struct.unpack(">HH", frame_header[1:5])
+            return width, height
+
+        f.seek(length - 2, 1)
+
+    raise ValueError("No frame header found in the JPEG file.")
+
+
+def read_jpeg_size_from_path(path: str) -> Tuple[int, int]:
+    """ Get the (width, height) of the JPEG file at this path. """
+    with open(path, "rb") as f:
+        return read_jpeg_size_from_file(f)
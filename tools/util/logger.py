@@ -2,8 +2,17 @@
 
 """
 Logger Description.
+
+For long loops, there is a rate-limited progress reporter, a buffered mode that collects the output
+and writes it out on an interval, and a JSON-lines mode where every log call becomes a record that a
+background thread writes out, so logging never waits on the terminal or the disk.
 """
 
+import atexit
+import json
+import os
+import queue
+import threading
 import time
 import sys
 
@@ -11,6 +20,85 @@ __author__ = "Jakrin Juangbhanich"
 __email__ = "juangbhanich.k@gmail.com"
 
 
+class ProgressReporter:
+    """ Counts finished items (from any thread) and shows the progress bar, but at most once per interval. """
+
+    def __init__(self, total: int, header: str = "Progress", min_interval: float = 0.25, extra_indent: int = 1):
+        self.total = total
+        self.header = header
+        self.min_interval = min_interval
+        self.extra_indent = extra_indent
+        self.count = 0
+        self._last_time = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, n: int = 1):
+        with self._lock:
+            self.count += n
+            now = time.time()
+            is_done = self.count >= self.total
+            if not is_done and now - self._last_time < self.min_interval:
+                return
+            self._last_time = now
+            count = self.count
+
+        Logger.log_progress(min(1.0, count / max(1, self.total)), header=self.header,
+                            suffix=f"{count}/{self.total}", extra_indent=self.extra_indent)
+
+
+class _JsonWriter:
+    """ Writes the JSON log records to the file at the path (or stdout if the path is None), from a queue
+    on a background thread. Without the thread, each record is written and flushed right away. """
+
+    def __init__(self, path: str, flush_interval: float, threaded: bool = True):
+        self.path = path
+        self.stream = sys.stdout if path is None else open(path, "a")
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        if threaded:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def write(self, record: dict):
+        if self._thread is None:
+            self.stream.write(json.dumps(record, default=str) + "\n")
+            self.stream.flush()
+            return
+        self._queue.put(record)
+
+    def close(self):
+        if self._thread is None:
+            self._close_stream()
+            return
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        last_flush = time.time()
+        while True:
+            try:
+                record = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                record = False
+
+            if record is None:
+                break
+            if record:
+                self.stream.write(json.dumps(record, default=str) + "\n")
+
+            if time.time() - last_flush >= self.flush_interval:
+                self.stream.flush()
+                last_flush = time.time()
+
+        self._close_stream()
+
+    def _close_stream(self):
+        self.stream.flush()
+        if self.stream not in (sys.stdout, sys.stderr):
+            self.stream.close()
+
+
 def non_minimal(f):
     """ Decorator for a logging function that only executes when the logger is not in minimal mode. """
     def func_wrapper(*args, **kwargs):
@@ -135,6 +223,66 @@ class Logger:
         """ Create an animate a progress bar."""
         Logger.get_instance()._log_progress(percent, header, suffix, extra_indent)
 
+    @staticmethod
+    def create_progress(total: int, header="Progress", min_interval: float = 0.25, extra_indent=1) \
+            -> ProgressReporter:
+        """ Create a progress reporter for a loop of total items. Call update() as each item finishes,
+        and the bar is redrawn at most once every min_interval seconds (and always at the end). """
+        return ProgressReporter(total, header, min_interval, extra_indent)
+
+    @staticmethod
+    def enable_buffering(interval: float = 1.0):
+        """ Collect the normal (not error) output, and write it out at most once per interval. """
+        logger = Logger.get_instance()
+        logger._buffer_interval = interval
+        if logger._flush_thread is None:
+            logger._flush_thread = threading.Thread(target=logger._flush_loop, daemon=True)
+            logger._flush_thread.start()
+            atexit.register(Logger.flush)
+
+    @staticmethod
+    def disable_buffering():
+        Logger.flush()
+        Logger.get_instance()._buffer_interval = None
+
+    @staticmethod
+    def flush():
+        """ Write out any buffered output now. """
+        Logger.get_instance()._flush_buffer()
+
+    @staticmethod
+    def enable_json_mode(path: str = None, flush_interval: float = 1.0):
+        """ Write every log call as a JSON record (one per line) to the file, or stdout if there is no path.
+        The records are written by a background thread, so logging only costs a queue put. In a process
+        forked from this one (like a pool worker) there is no such thread, so its records are written
+        straight to the file (or stdout) instead. """
+        logger = Logger.get_instance()
+        Logger.disable_json_mode()
+        logger._json_writer = _JsonWriter(None if path == "-" else path, flush_interval)
+        if not logger._json_hooks_registered:
+            logger._json_hooks_registered = True
+            atexit.register(Logger.disable_json_mode)
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=Logger._reopen_json_writer)
+
+    @staticmethod
+    def disable_json_mode():
+        """ Finish writing the queued JSON records, and go back to normal output. """
+        logger = Logger.get_instance()
+        if logger._json_writer is not None:
+            logger._json_writer.close()
+            logger._json_writer = None
+
+    @staticmethod
+    def _reopen_json_writer():
+        """ After a fork, give the child its own unthreaded writer. The copied writer is kept but never
+        closed: its stream buffer may hold records of the parent, which would be written twice. """
+        logger = Logger._INSTANCE
+        if logger is not None and logger._json_writer is not None:
+            logger._forked_json_writer = logger._json_writer
+            logger._json_writer = _JsonWriter(logger._json_writer.path, logger._json_writer.flush_interval,
+                                              threaded=False)
+
     @staticmethod
     def enable_colors():
         """ Turn on color tags. """
@@ -163,6 +311,14 @@ class Logger:
         self._indent_level = 0
         self._color_enabled = True
         self.minimal_mode = False  # Minimal mode disables headers, indents, progress, colors.
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._buffer_interval = None  # Seconds between writes of the buffered output (None writes at once).
+        self._last_flush_time = time.time()
+        self._flush_thread = None
+        self._json_writer: _JsonWriter = None
+        self._forked_json_writer: _JsonWriter = None  # The writer copied from the parent process.
+        self._json_hooks_registered = False
         Logger._INSTANCE = self
 
     @property
@@ -175,6 +331,10 @@ class Logger:
         assert percent >= 0.0
         assert percent <= 1.0
 
+        if self._json_writer is not None:
+            self._write_record("progress", header, value=percent, suffix=suffix)
+            return
+
         bar_size = 20
         filled_count = int(percent * bar_size)
         empty_count = bar_size - filled_count
@@ -204,11 +364,16 @@ class Logger:
             message = "{} {} {} {}".format(header, bar, formatted_percent, suffix)
             message = self._add_format(message, extra_indent)
             message = "\r{}".format(message)
-            print(message, end="\r")
             if percent == 1.0:
-                print("")
+                self._print(message)
+            else:
+                self._print(message, end="\r")
 
     def _log_field(self, field_name, value, red=False, extra_indent=1):
+        if self._json_writer is not None:
+            self._write_record("field", field_name, value=value, error=red)
+            return
+
         field_name = self._set_color("{}:".format(field_name), Logger.BLUE)
         if red:
             value = self._set_color(str(value), Logger.RED)
@@ -216,6 +381,11 @@ class Logger:
         self._print(self._add_format(message, extra_indent), False)
 
     def _log(self, message, color, error=False):
+        if self._json_writer is not None:
+            if message != "":
+                self._write_record("message", message, error=error)
+            return
+
         message = self._set_color(message, color)
         self._print(self._add_format(message), error)
 
@@ -252,15 +422,50 @@ class Logger:
         else:
             return text
 
-    @staticmethod
-    def _print(message, error=False):
+    def _write_record(self, record_type, name, value=None, error=False, suffix=None):
+        record = {"time": time.time(), "type": record_type, "name": name}
+        if value is not None:
+            record["value"] = value
+        if suffix is not None:
+            record["suffix"] = suffix
+        if error:
+            record["error"] = True
+        self._json_writer.write(record)
+
+    def _print(self, message, error=False, end="\n"):
         if error:
-            print(message, file=sys.stderr)
+            self._flush_buffer()
+            print(message, file=sys.stderr, end=end)
             sys.stderr.flush()
-        else:
-            print(message)
+            return
+
+        if self._buffer_interval is None:
+            print(message, end=end)
+            if end == "\n":
+                sys.stdout.flush()
+            return
+
+        with self._buffer_lock:
+            self._buffer.append(message + end)
+        if time.time() - self._last_flush_time >= self._buffer_interval:
+            self._flush_buffer()
+
+    def _flush_buffer(self):
+        with self._buffer_lock:
+            output = "".join(self._buffer)
+            self._buffer.clear()
+            self._last_flush_time = time.time()
+        if len(output) > 0:
+            sys.stdout.write(output)
             sys.stdout.flush()
 
+    def _flush_loop(self):
+        """ Write out the buffer on the interval, even when nothing new is being logged. """
+        while True:
+            time.sleep(self._buffer_interval or 1.0)
+            if self._buffer_interval is not None:
+                self._flush_buffer()
+
     @staticmethod
     def _pre_fill(string, length=2, char='0'):
         """ Pad the input string with a fixed amount of chars to the front. """
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+Lightweight timing and counting for the hot paths. Stages are timed with timed("stage"), either as a
+context manager or as a function decorator, and their latencies go into a histogram with power-of-two
+buckets. Counters are plain named totals. Recording only takes a clock read and a short lock, so it can
+stay switched on.
+
+At exit, the registry can log a summary of every stage, and append the whole report as a JSON line
+to a file (see enable_exit_report).
+"""
+
+import atexit
+import functools
+import json
+import math
+import sys
+import threading
+import time
+from typing import Dict
+
+from .logger import Logger
+
+__author__ = "Jakrin Juangbhanich"
+__email__ = "juangbhanich.k@gmail.com"
+
+
+class Histogram:
+    """ Latency histogram (in seconds), with buckets that double in size from 1 microsecond. """
+
+    N_BUCKETS = 40
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * self.N_BUCKETS
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        # Bucket i holds the values up to 2^i microseconds.
+        exponent = math.frexp(value * 1e6)[1] if value > 0 else 0
+        self.buckets[min(self.N_BUCKETS - 1, max(0, exponent))] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """ The upper bound of the bucket that holds this fraction of the values (clipped to the max). """
+        if self.count == 0:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return min(self.max, (2 ** i) * 1e-6)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count > 0 else 0.0,
+            "min": self.min if self.count > 0 else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class Metrics:
+
+    _INSTANCE = None
+
+    @staticmethod
+    def instance() -> 'Metrics':
+        """ Singleton Access. """
+        if Metrics._INSTANCE is None:
+            Metrics()
+        return Metrics._INSTANCE
+
+    def __init__(self):
+        Metrics._INSTANCE = self
+        self.timers: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._start_time = time.time()
+        self._exit_report_path = None
+        self._exit_report_registered = False
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self.timers.get(name)
+            if histogram is None:
+                histogram = self.timers[name] = Histogram()
+            histogram.add(seconds)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+            self._start_time = time.time()
+
+    def get_report(self) -> dict:
+        with self._lock:
+            return {
+                "time": time.time(),
+                "duration": time.time() - self._start_time,
+                "command": " ".join(sys.argv),
+                "timers": {name: h.to_dict() for name, h in self.timers.items()},
+                "counters": dict(self.counters),
+            }
+
+    def log_summary(self):
+        """ Log the count, total and latency of every stage, slowest stage first. """
+        report = self.get_report()
+        if len(report["timers"]) == 0 and len(report["counters"]) == 0:
+            return
+
+        Logger.log_special("Metrics", with_gap=True)
+        for name, t in sorted(report["timers"].items(), key=lambda kv: kv[1]["total"], reverse=True):
+            Logger.log_field(name, "{} calls, {:.3f}s total, {:.2f}ms mean, {:.2f}ms p50, {:.2f}ms p95, "
+                                   "{:.2f}ms max".format(t["count"], t["total"], 1000 * t["mean"],
+                                                         1000 * t["p50"], 1000 * t["p95"], 1000 * t["max"]))
+        for name, value in sorted(report["counters"].items()):
+            Logger.log_field(name, value)
+
+    def dump_json(self, path: str):
+        """ Append the report to the file, as one JSON line per run. """
+        with open(path, "a") as f:
+            f.write(json.dumps(self.get_report()) + "\n")
+
+    def enable_exit_report(self, json_path: str = None):
+        """ Log the summary when the process exits, and append the report to json_path if given. """
+        self._exit_report_path = json_path
+        if not self._exit_report_registered:
+            self._exit_report_registered = True
+            atexit.register(self._exit_report)
+
+    def _exit_report(self):
+        self.log_summary()
+        if self._exit_report_path is not None:
+            self.dump_json(self._exit_report_path)
+
+
+class timed:
+    """ Time a stage, as a context manager (with timed("stage"): ...) or a decorator (@timed("stage")). """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        Metrics.instance().observe(self.name, time.perf_counter() - self._start)
+        return False
+
+    def __call__(self, function):
+        name = self.name
+
+        # Each call gets its own start time, so the decorated function can run in many threads at once.
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                Metrics.instance().observe(name, time.perf_counter() - start)
+        return wrapper
+
+
+def count(name: str, n: int = 1):
+    """ Add n to the named counter. """
+    Metrics.instance().count(name, n)
+
+
+def observe(name: str, seconds: float):
+    """ Record a latency that was measured some other way. """
+    Metrics.instance().observe(name, seconds)
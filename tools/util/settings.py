@@ -32,7 +32,7 @@ class Settings:
 
         # Read YAML file.
         with open(path, 'r') as stream:
-            data = yaml.load(stream)
+            data = yaml.safe_load(stream)
 
         Logger.log_special("Load {}".format(self.__class__.__name__), with_gap=True)
 
@@ -54,7 +54,7 @@ class Settings:
                 setattr(self, attribute, float(env_val))
 
             elif attr_type is bool:
-                setting_value = env_val == "True"
+                setting_value = env_val is True or env_val == "True"
                 setattr(self, attribute, setting_value)
 
             elif attr_type.__name__ == "NoneType":
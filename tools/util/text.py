@@ -7,6 +7,9 @@ and also include support for the FontAwesome icon fonts.
 """
 
 import os
+import string
+from collections import OrderedDict
+from functools import lru_cache
 from typing import List, Tuple, Dict
 import cv2
 import numpy as np
@@ -62,6 +65,16 @@ class TextManager:
             FONT_ICON: 2.0
         }
 
+        # Measured text sizes by (text, font_type, size), least recently used first.
+        self.max_text_sizes: int = 8192
+        self.text_sizes: OrderedDict = OrderedDict()
+        self.text_size_hits: int = 0
+        self.text_size_misses: int = 0
+
+        # Per-glyph (advance, right edge, bottom edge) tables by (font_type, size), see build_glyph_atlas.
+        self.glyph_atlases: Dict[Tuple[str, int], Dict[str, Tuple[float, int, int]]] = {}
+        self.atlas_lookups: int = 0
+
     @staticmethod
     def instance() -> 'TextManager':
         if TextManager.INSTANCE is None:
@@ -79,6 +92,81 @@ class TextManager:
         text_manager = TextManager.instance()
         return text_manager.font_divisor_map[font_type]
 
+    @staticmethod
+    def get_text_size(text: str, font_type: str = FONT_DEFAULT, size: int = 16) -> (int, int):
+        """ Get the (width, height) of the text. Sizes are remembered, and laid out from the glyph atlas
+        if one has been built for this font and size. """
+        text_manager = TextManager.instance()
+        key = (text, font_type, size)
+
+        text_size = text_manager.text_sizes.get(key)
+        if text_size is not None:
+            text_manager.text_sizes.move_to_end(key)
+            text_manager.text_size_hits += 1
+            return text_size
+
+        text_manager.text_size_misses += 1
+        atlas = text_manager.glyph_atlases.get((font_type, size))
+        if atlas is not None and len(text) > 0:
+            text_size = text_manager._get_size_from_atlas(atlas, text, font_type, size)
+        else:
+            text_size = _get_font_extent(TextManager.get_font(font_type, size), text)
+
+        text_manager.text_sizes[key] = text_size
+        if len(text_manager.text_sizes) > text_manager.max_text_sizes:
+            text_manager.text_sizes.popitem(last=False)
+        return text_size
+
+    @staticmethod
+    def build_glyph_atlas(font_type: str = FONT_DEFAULT, size: int = 16, characters: str = string.printable):
+        """ Measure every character of this font and size up-front, so the size of any text made of them
+        is just a table lookup. The layout ignores kerning, which is exact for monospaced fonts. """
+        text_manager = TextManager.instance()
+        font = TextManager.get_font(font_type, size)
+        atlas = text_manager.glyph_atlases.setdefault((font_type, size), {})
+        for character in characters:
+            atlas[character] = text_manager._measure_glyph(font, character)
+
+    @staticmethod
+    def get_cache_stats() -> dict:
+        """ Counters to help tune the text metric caches. """
+        text_manager = TextManager.instance()
+        sprite_info = _get_text_sprite.cache_info()
+        return {
+            "text_sizes": len(text_manager.text_sizes),
+            "text_size_hits": text_manager.text_size_hits,
+            "text_size_misses": text_manager.text_size_misses,
+            "atlas_lookups": text_manager.atlas_lookups,
+            "glyph_atlases": len(text_manager.glyph_atlases),
+            "sprites": sprite_info.currsize,
+            "sprite_hits": sprite_info.hits,
+            "sprite_misses": sprite_info.misses
+        }
+
+    def _get_size_from_atlas(self, atlas: dict, text: str, font_type: str, size: int) -> (int, int):
+        """ Lay out the text from the glyph table. Characters that are missing are measured and added. """
+        font = None
+        width = 0.0
+        height = 0
+        for character in text:
+            glyph = atlas.get(character)
+            if glyph is None:
+                font = font or TextManager.get_font(font_type, size)
+                glyph = atlas[character] = self._measure_glyph(font, character)
+            width += glyph[0]
+            height = max(height, glyph[2])
+
+        # The last glyph ends at its right edge, rather than at its advance.
+        self.atlas_lookups += 1
+        last_glyph = atlas[text[-1]]
+        return int(round(width - last_glyph[0])) + last_glyph[1], height
+
+    @staticmethod
+    def _measure_glyph(font: ImageFont, character: str) -> (float, int, int):
+        right, bottom = _get_font_extent(font, character)
+        advance = font.getlength(character) if hasattr(font, "getlength") else right
+        return advance, right, bottom
+
     def _load_font(self, font_type: str = FONT_DEFAULT, size: int = 18):
         if size not in self.fonts_by_size:
             self.fonts_by_size[size] = {}
@@ -104,23 +192,7 @@ def raw_text(
         color=(255, 255, 255)
 ):
     """ Draw the specified text into the image at the point of the region. """
-
-    # Convert image from CV2 to PIL.
-    pil_image, pil_draw = _cv2_to_pil(image)
-
-    # Prepare the font.
-    font = TextManager.get_font(font_type=font_type, font_size_id=font_size)
-
-    # Prepare the anchors.
-    anchor_x = x
-    anchor_y = y
-
-    # Draw the text straight into the region.
-    pil_draw.text((anchor_x, anchor_y), text, font=font, fill=(color[2], color[1], color[0]))
-
-    # Convert image from PIL back to CV2.
-    final_image = _pil_to_cv2(pil_image)
-    return final_image
+    return _draw_text(np.copy(image), text, x, y, font_type=font_type, font_size=font_size, color=color)
 
 
 def raw_icon(
@@ -164,24 +236,19 @@ def write_into_region(
         bg_opacity=1.0,
         show_region_outline: bool = False,
         fixed_width: bool = False,  # If the width of the region was fixed from outside. Used to align the icon.
-        overlay: bool = False
+        overlay: bool = False,
+        in_place: bool = False  # Draw onto the image itself instead of a copy (unless it is read-only).
 ):
     """ The text will be written into this specified region.
-    The y position will be centered. The x position will depend on the align type. """
+    The y position will be centered. The x position will depend on the align type.
+    Only the pixels around the region are touched. """
+
+    if not in_place or not image.flags.writeable:
+        image = np.copy(image)
 
     # Draw the BG into position.
     image = _fill_region(image, region, bg_color=bg_color, bg_opacity=bg_opacity)
 
-    # If it is overlay, recursive call.
-    if overlay:
-        sub_sample = np.zeros((image.shape[0], image.shape[1], 3), dtype=np.uint8)
-        overlay_image = \
-            write_into_region(image=sub_sample, text=text, region=region, icon=icon, pad=pad, h_align=h_align,
-                              font_type=font_type, font_size=font_size, color=color, bg_color=(0, 0, 0),
-                              bg_opacity=1.0, show_region_outline=False, fixed_width=fixed_width)
-        final_image = cv2.addWeighted(image, 1, overlay_image, 1, 0)
-        return final_image
-
     # Use the region to find the position.
     t_width, t_height, i_width, i_height, b_width, b_height = \
         _get_text_and_icon_size(text, icon, pad, font_type, font_size)
@@ -205,12 +272,12 @@ def write_into_region(
         ix = region.right - b_width - pad
         tx = ix + i_width + pad if icon is not None else ix
 
-    # Write the text.
-    image = raw_text(image=image, text=text, x=tx, y=ty, font_type=font_type, font_size=font_size,
-                     color=color)
+    # Write the text. In overlay mode, the text is added onto the background rather than painted over it.
+    image = _draw_text(image, text, tx, ty, font_type=font_type, font_size=font_size, color=color, additive=overlay)
 
     if icon is not None:
-        image = raw_icon(image=image, text=icon, x=ix, y=iy, font_size=font_size, color=color)
+        image = _draw_text(image, icon, ix, iy, font_type=FONT_ICON, font_size=font_size, color=color,
+                           additive=overlay)
 
     # Show an outline around the region.
     if show_region_outline:
@@ -226,18 +293,20 @@ def write_into_region(
 
 def center_at_position(image: np.array, text: str, x: int = 0, y: int = 0, width: int = None, height: int = None,
                        icon: str = None, pad: int = DEFAULT_PAD, font_type: str = FONT_DEFAULT, font_size: int = 18,
-                       color=(255, 255, 255), bg_color=(0, 0, 0), bg_opacity=0.5, overlay: bool=False):
+                       color=(255, 255, 255), bg_color=(0, 0, 0), bg_opacity=0.5, overlay: bool=False,
+                       in_place: bool = False):
     return write_at_position(image=image, text=text, x=x, y=y, width=width, height=height, icon=icon, pad=pad,
                              h_align=ALIGN_CENTER, font_type=font_type, font_size=font_size, color=color,
-                             bg_color=bg_color, bg_opacity=bg_opacity, overlay=overlay)
+                             bg_color=bg_color, bg_opacity=bg_opacity, overlay=overlay, in_place=in_place)
 
 
 def left_at_position(image: np.array, text: str, x: int = 0, y: int = 0, width: int = None, height: int = None,
                      icon: str = None, pad: int = DEFAULT_PAD, font_type: str = FONT_DEFAULT, font_size: int = 18,
-                     color=(255, 255, 255), bg_color=(0, 0, 0), bg_opacity=0.5, overlay: bool=False):
+                     color=(255, 255, 255), bg_color=(0, 0, 0), bg_opacity=0.5, overlay: bool=False,
+                     in_place: bool = False):
     return write_at_position(image=image, text=text, x=x, y=y, width=width, height=height, icon=icon, pad=pad,
                              h_align=ALIGN_LEFT, font_type=font_type, font_size=font_size, color=color,
-                             bg_color=bg_color, bg_opacity=bg_opacity, overlay=overlay)
+                             bg_color=bg_color, bg_opacity=bg_opacity, overlay=overlay, in_place=in_place)
 
 
 def write_at_position(
@@ -255,7 +324,8 @@ def write_at_position(
         color=(255, 255, 255),
         bg_color=None,
         bg_opacity=1.0,
-        overlay: bool=False
+        overlay: bool=False,
+        in_place: bool = False
 ):
     """ Create a center-locked region, with the specified width and height. """
     region: Region = Region(0, 10, 0, 10)
@@ -287,14 +357,15 @@ def write_at_position(
     image = write_into_region(image=image, text=text, region=region, icon=icon, pad=pad, h_align=h_align,
                               font_type=font_type, font_size=font_size, color=color, bg_color=bg_color,
                               bg_opacity=bg_opacity, show_region_outline=False, fixed_width=is_fixed_width,
-                              overlay=overlay)
+                              overlay=overlay, in_place=in_place)
 
     return image
 
 
 def write_anchored(image: np.array, text: str, h_anchor: int = ALIGN_CENTER, v_anchor: int = ALIGN_CENTER,
                    icon: str = None, pad: int = DEFAULT_PAD, font_type: str = FONT_DEFAULT, font_size: int = 18,
-                   color=(255, 255, 255), bg_color=(0, 0, 0), bg_opacity=1.0, overlay: bool = False):
+                   color=(255, 255, 255), bg_color=(0, 0, 0), bg_opacity=1.0, overlay: bool = False,
+                   in_place: bool = False):
     """ Find the anchored region and create a text box there. """
 
     image_width = image.shape[1]
@@ -320,13 +391,13 @@ def write_anchored(image: np.array, text: str, h_anchor: int = ALIGN_CENTER, v_a
 
     return write_at_position(image=image, text=text, x=x, y=y, width=None, height=None, icon=icon, pad=pad,
                              h_align=h_anchor, font_type=font_type, font_size=font_size, color=color,
-                             bg_color=bg_color, bg_opacity=bg_opacity, overlay=overlay)
+                             bg_color=bg_color, bg_opacity=bg_opacity, overlay=overlay, in_place=in_place)
 
 
 def label_region(image: np.array, text: str, region: Region, icon: str = None, pad: int = 5, gap: int = 5,
                  font_type: str = FONT_DEFAULT, font_size: int = 14, show_at_bottom: bool=False,
                  color=(255, 255, 255), bg_color=(0, 0, 0), bg_opacity: float = 0.7, overlay: bool = False,
-                 inside: bool=False):
+                 inside: bool=False, in_place: bool = False):
 
     # Find the text, icon and box positions.
     t_width, t_height, i_width, i_height, b_width, b_height = \
@@ -354,7 +425,8 @@ def label_region(image: np.array, text: str, region: Region, icon: str = None, p
 
     return write_into_region(image=image, text=text, region=draw_region, icon=icon, pad=pad, h_align=ALIGN_CENTER,
                              font_type=font_type, font_size=font_size, color=color, bg_color=bg_color,
-                             bg_opacity=bg_opacity, show_region_outline=False, fixed_width=True, overlay=overlay)
+                             bg_opacity=bg_opacity, show_region_outline=False, fixed_width=True, overlay=overlay,
+                             in_place=in_place)
 
 
 # ===================================================================================================
@@ -364,7 +436,14 @@ def label_region(image: np.array, text: str, region: Region, icon: str = None, p
 
 def get_text_size(text: str, font_type: str = FONT_DEFAULT, font_size: int = 16):
     """ Returns the width and height for this text, font and size. """
-    font = TextManager.get_font(font_type=font_type, font_size_id=font_size)
+    return TextManager.get_text_size(text, font_type, font_size)
+
+
+def _get_font_extent(font: ImageFont, text: str) -> (int, int):
+    """ Width and height of the text drawn from the origin (newer versions of PIL dropped getsize). """
+    if hasattr(font, "getbbox"):
+        _, _, right, bottom = font.getbbox(text)
+        return right, bottom
     return font.getsize(text)
 
 
@@ -388,10 +467,63 @@ def _fill_region(image: np.array, region: Region, bg_color=None, bg_opacity: flo
         cv2.rectangle(image, (region.left, region.top), (region.right, region.bottom), color=bg_color, thickness=-1)
         return image
 
-    # Opacity is semi-clear. Draw it in a different image and overlay it on.
-    overlay_image = np.copy(image)
-    cv2.rectangle(overlay_image, (region.left, region.top), (region.right, region.bottom), color=bg_color, thickness=-1)
-    return cv2.addWeighted(image, 1.0 - bg_opacity, overlay_image, bg_opacity, 0.0)
+    # Opacity is semi-clear. Blend the color into just the area of the region (which includes its far edges).
+    left, right, _, _ = visual._get_safe_bounds(region.left, region.right + 1, image.shape[1])
+    top, bottom, _, _ = visual._get_safe_bounds(region.top, region.bottom + 1, image.shape[0])
+    if right <= left or bottom <= top:
+        return image
+
+    roi = image[top:bottom, left:right]
+    fill = np.empty_like(roi)
+    fill[:] = bg_color
+    image[top:bottom, left:right] = cv2.addWeighted(roi, 1.0 - bg_opacity, fill, bg_opacity, 0.0)
+    return image
+
+
+def _draw_text(image: np.array, text: str, x: int, y: int, font_type: str = FONT_DEFAULT, font_size: int = 18,
+               color=(255, 255, 255), additive: bool = False) -> np.array:
+    """ Draw the text onto the image (in place) by blending its cached sprite into the area under it.
+    Additive mode adds the text color onto the image, instead of painting it over. """
+    alpha, colored = _get_text_sprite(text, font_type, font_size, tuple(int(c) for c in color))
+
+    # Clip the sprite to the image.
+    sprite_h, sprite_w = alpha.shape
+    left, right, left_excess, right_excess = visual._get_safe_bounds(x, x + sprite_w, image.shape[1])
+    top, bottom, top_excess, bottom_excess = visual._get_safe_bounds(y, y + sprite_h, image.shape[0])
+    if right <= left or bottom <= top:
+        return image
+
+    roi = image[top:bottom, left:right]
+    sprite_alpha = alpha[top_excess:sprite_h - bottom_excess, left_excess:sprite_w - right_excess]
+    sprite_colored = colored[top_excess:sprite_h - bottom_excess, left_excess:sprite_w - right_excess]
+
+    if additive:
+        image[top:bottom, left:right] = cv2.add(roi, sprite_colored)
+    else:
+        weight = sprite_alpha[:, :, np.newaxis].astype(np.float32) / 255.0
+        image[top:bottom, left:right] = (roi * (1.0 - weight) + sprite_colored + 0.5).astype(np.uint8)
+
+    return image
+
+
+@lru_cache(maxsize=2048)
+def _get_text_sprite(text: str, font_type: str, font_size: int, color: tuple) -> (np.array, np.array):
+    """ Render the text once into a small sprite, and keep it for the next time the same label is drawn.
+    Returns the alpha mask, and the text color pre-multiplied by that alpha (both uint8). """
+    font = TextManager.get_font(font_type=font_type, font_size_id=font_size)
+    width, height = _get_font_extent(font, text)
+
+    mask_image = Image.new("L", (max(1, width), max(1, height)), 0)
+    ImageDraw.Draw(mask_image).text((0, 0), text, font=font, fill=255)
+    alpha = np.array(mask_image)
+
+    colored = (alpha[:, :, np.newaxis].astype(np.float32) * np.array(color, dtype=np.float32) / 255.0 + 0.5)
+    colored = colored.astype(np.uint8)
+
+    # The sprites are shared, so make sure nobody draws into them.
+    alpha.flags.writeable = False
+    colored.flags.writeable = False
+    return alpha, colored
 
 
 def _cv2_to_pil(image: np.array) -> (Image, ImageDraw):
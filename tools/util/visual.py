@@ -38,6 +38,44 @@ def generate_colors(n,
     return colors
 
 
+def generate_palette(n,
+                     saturation: float = 1.0,
+                     brightness: float = 1.0,
+                     hue_offset: float = 0.0,
+                     hue_range: float = 1.0) -> np.array:
+    """ Generate a (N, 3) uint8 table of colors for N classes. The hues are stepped by the golden ratio,
+    so neighbouring entries are far apart, and adding classes to the end doesn't change the earlier colors. """
+    return _get_palette_colors(np.arange(n), saturation, brightness, hue_offset, hue_range)
+
+
+def get_palette_color(index: int,
+                      saturation: float = 1.0,
+                      brightness: float = 1.0,
+                      hue_offset: float = 0.0,
+                      hue_range: float = 1.0) -> (int, int, int):
+    """ The color of one entry of the palette (see generate_palette), for any index, without the table. """
+    return tuple(_get_palette_colors(np.array([index]), saturation, brightness, hue_offset, hue_range)[0].tolist())
+
+
+def _get_palette_colors(indices: np.array, saturation: float, brightness: float, hue_offset: float,
+                        hue_range: float) -> np.array:
+    n = len(indices)
+    golden_ratio = (np.sqrt(5.0) - 1.0) / 2.0
+    hue = (hue_offset + hue_range * ((indices * golden_ratio) % 1.0)) % 1.0
+
+    # Vectorized HSV to RGB.
+    sector = np.floor(hue * 6.0).astype(np.int64) % 6
+    f = hue * 6.0 - np.floor(hue * 6.0)
+    v = np.full(n, brightness)
+    p = v * (1.0 - saturation)
+    q = v * (1.0 - saturation * f)
+    t = v * (1.0 - saturation * (1.0 - f))
+
+    choices = np.array([[v, t, p], [q, v, p], [p, v, t], [p, q, v], [t, p, v], [v, p, q]])  # (6, 3, N)
+    rgb = choices[sector, :, np.arange(n)]
+    return (rgb * 255).astype(np.uint8)
+
+
 # TODO: Wish list - Create a colormap system like in CV2, or adapt it so I can create my own color maps.
 
 # ======================================================================================================================
@@ -68,6 +106,33 @@ def draw_regions(image: np.array,
     return image
 
 
+def draw_region_outlines(image: np.array,
+                         regions: List[Region],
+                         colors: List[Tuple[int, int, int]],
+                         thickness: int = 4,
+                         shadow_thickness: int = 10,
+                         shadow_strength: float = 0.3):
+    """ Draw the outlines of many regions, each in its own color and with a dark shadow around it.
+    All the shadows are drawn into one mask and all the outlines into one overlay, which are then
+    composited once, so the cost doesn't grow with the number of regions times the image size. """
+
+    # Fade the pixels under the shadows.
+    shadow_mask = np.zeros(image.shape[:2], dtype=np.uint8)
+    for r in regions:
+        cv2.rectangle(shadow_mask, (r.left, r.top), (r.right, r.bottom), color=255, thickness=shadow_thickness)
+
+    image = np.copy(image)
+    shadow_pixels = shadow_mask > 0
+    image[shadow_pixels] = (image[shadow_pixels] * (1.0 - shadow_strength) + 0.5).astype(np.uint8)
+
+    # Add the colored outlines on top.
+    overlay_image = np.zeros_like(image)
+    for r, color in zip(regions, colors):
+        cv2.rectangle(overlay_image, (r.left, r.top), (r.right, r.bottom), color=color, thickness=thickness)
+
+    return cv2.add(image, overlay_image)
+
+
 def pixelate_region(image: np.array, regions: List[Region], blur_factor: float=0.1):
     for r in regions:
         try:
@@ -89,25 +154,79 @@ def pixelate_region(image: np.array, regions: List[Region], blur_factor: float=0
     return image
 
 
-def draw_region_mask(image: np.array, regions: List[Region], strength: float = 1.0):
-    """ Apply a mask to the areas covered by the regions. """
+def draw_region_mask(image: np.array, regions: List[Region], strength: float = 1.0, in_place: bool = False):
+    """ Apply a mask to the areas covered by the regions: everything outside of them is faded.
+    The fade is a uint8 lookup table, applied only to the pixels outside the regions. """
+    return draw_region_masks([image], [regions], strength=strength, in_place=in_place)[0]
 
-    image = image.astype(np.float)
-    pos_mask = np.zeros((image.shape[0], image.shape[1]), dtype=np.bool)
-    neg_mask = np.ones((image.shape[0], image.shape[1]), dtype=np.bool)
 
-    for r in regions:
+def draw_region_masks(images, regions: List[List[Region]], strength: float = 1.0, in_place: bool = False):
+    """ Mask a batch of images at once, each with its own list of regions. The images can be a list, or
+    an (N, H, W, C) array, which is then masked as one tall image. Only the pixels outside the regions go
+    through the fade table, and each output pixel is written once. Returns the masked images (the same
+    images, if in_place). """
+    if len(images) == 0:
+        return images
 
-        safe_left, safe_right, _, _ = _get_safe_bounds(r.left, r.right, image.shape[1])
-        safe_top, safe_bottom, _, _ = _get_safe_bounds(r.top, r.bottom, image.shape[0])
+    lut = _get_fade_table(1.0 - (0.7 * strength))
 
-        pos_mask[safe_top:safe_bottom, safe_left:safe_right] = True
-        neg_mask[safe_top:safe_bottom, safe_left:safe_right] = False
+    # Stack the same-sized images, so they are masked in one go.
+    is_array = isinstance(images, np.ndarray)
+    if is_array:
+        n, h, w = images.shape[:3]
+        stacked = images.reshape((n * h, w) + images.shape[3:])
+        keep_mask = np.zeros((n * h, w), dtype=bool)
+        row_edges = set()
+        for i, image_regions in enumerate(regions):
+            row_edges.add(i * h)
+            row_edges.update(i * h + edge for edge in _fill_region_mask(keep_mask[i * h:(i + 1) * h], image_regions))
+        masked = _apply_region_mask(stacked, keep_mask, row_edges, lut, in_place)
+        return images if in_place else masked.reshape(images.shape)
+
+    masked_images = []
+    for image, image_regions in zip(images, regions):
+        keep_mask = np.zeros(image.shape[:2], dtype=bool)
+        row_edges = _fill_region_mask(keep_mask, image_regions)
+        masked_images.append(_apply_region_mask(image, keep_mask, row_edges, lut, in_place))
+    return masked_images
 
-    fade_factor = 1.0 - (0.7 * strength)
-    image[neg_mask] *= fade_factor
-    image = image.astype(np.uint8)
-    return image
+
+def _get_fade_table(fade_factor: float) -> np.array:
+    """ A uint8 table that multiplies each value by the fade factor (truncating, like a float cast). """
+    return (np.arange(256, dtype=np.float64) * fade_factor).astype(np.uint8)
+
+
+def _fill_region_mask(mask: np.array, regions: List[Region]) -> set:
+    """ Mark the regions in the mask. Returns the rows where a region starts or ends. """
+    row_edges = set()
+    for r in regions:
+        safe_left, safe_right, _, _ = _get_safe_bounds(r.left, r.right, mask.shape[1])
+        safe_top, safe_bottom, _, _ = _get_safe_bounds(r.top, r.bottom, mask.shape[0])
+        mask[safe_top:safe_bottom, safe_left:safe_right] = True
+        row_edges.update((safe_top, safe_bottom))
+    return row_edges
+
+
+def _apply_region_mask(image: np.array, keep_mask: np.array, row_edges: set, lut: np.array,
+                       in_place: bool) -> np.array:
+    """ Between two row edges, every row of the mask is the same, so the pixels to fade are whole column
+    spans of those rows. Each span goes through the lookup table straight into the output. A new output
+    gets the pixels inside the regions copied over as they are. """
+    output = image
+    if not in_place:
+        output = np.empty_like(image)
+        cv2.copyTo(image, keep_mask.view(np.uint8), output)
+
+    height = image.shape[0]
+    edges = sorted({0, height} | {edge for edge in row_edges if 0 < edge < height})
+    for top, bottom in zip(edges[:-1], edges[1:]):
+
+        # The faded spans start and end where the row (with kept pixels added at both ends) changes.
+        row = np.concatenate([[True], keep_mask[top], [True]])
+        changes = np.flatnonzero(row[1:] != row[:-1])
+        for left, right in zip(changes[0::2], changes[1::2]):
+            cv2.LUT(image[top:bottom, left:right], lut, dst=output[top:bottom, left:right])
+    return output
 
 
 # ======================================================================================================================
@@ -185,6 +304,23 @@ def safe_implant(dst_image: np.array, src_image: np.array, left: int, right: int
     return dst_image
 
 
+def safe_extract_many(image: np.array, bounds: np.array) -> List[np.array]:
+    """ Extract many areas from the image at once. Bounds is an (N, 4) array of pixel (left, top, right, bottom).
+    Areas that are fully inside the image are returned as views, without copying. Only the areas that
+    spill over the edge need a padded copy. """
+    bounds = np.asarray(bounds, dtype=np.int64)
+    h, w = image.shape[:2]
+    is_inside = (bounds[:, 0] >= 0) & (bounds[:, 1] >= 0) & (bounds[:, 2] <= w) & (bounds[:, 3] <= h)
+
+    crops = []
+    for (left, top, right, bottom), inside in zip(bounds.tolist(), is_inside.tolist()):
+        if inside:
+            crops.append(image[top:bottom, left:right])
+        else:
+            crops.append(safe_extract(image, left, right, top, bottom))
+    return crops
+
+
 def safe_extract_with_region(image: np.array, region: Region) -> np.array:
     """ Extract the image area specified by the region. """
     return safe_extract(image, region.left, region.right, region.top, region.bottom)